@@ -0,0 +1,158 @@
+"""Adaptive candidate count and round budget, learned from judged rounds.
+
+The chance that a round clears ``MIN_NOVELTY``/``MIN_COHERENCE`` depends heavily
+on wildness, so one fixed ``N_CANDIDATES``/``MAX_ROUNDS`` pair over-spends at some
+settings and under-delivers at others. ``Controller`` records, per wildness bucket
+(the same buckets as the result cache), how many judged candidates passed the bar,
+and plans each request from that. It also keeps a histogram of their composites
+(``_BINS`` equal bins over 0–1). It is exposed in ``snapshot()`` for tuning
+``MIN_NOVELTY``/``MIN_COHERENCE``, but planning does not read it.
+
+Planning treats candidates as independent passes with probability ``p`` (the
+bucket's pass rate under a uniform prior), so a round of ``n`` passes with
+``q = 1 - (1 - p)^n`` and ``r`` rounds with ``1 - (1 - q)^r``. Among the plans that
+reach ``NBT_ADAPTIVE_TARGET`` it picks the lowest expected cost, where a round
+costs ``n`` candidates plus ``NBT_ADAPTIVE_ROUND_COST`` candidate-equivalents of
+per-call overhead (prompt tokens and a round of latency). Until a bucket has
+``NBT_ADAPTIVE_MIN_SAMPLES`` candidates — or with ``NBT_ADAPTIVE=0`` — the fixed
+``N_CANDIDATES``/``MAX_ROUNDS`` are used. Those are also the default ceilings
+(``NBT_ADAPTIVE_MAX_N`` / ``NBT_ADAPTIVE_MAX_ROUNDS``), so unless they are raised
+explicitly adaptive planning only ever spends less than the fixed plan.
+
+With ``NBT_ADAPTIVE_PATH`` set the statistics persist as JSON across restarts.
+"""
+import json
+import os
+import threading
+
+from . import cache, config
+
+log = config.log.getChild("adaptive")
+
+_BINS = 20  # composite histogram resolution
+
+
+class Controller:
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._stats: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if path:
+            self._load()
+
+    def _bucket(self, wildness: int) -> dict:
+        key = cache.wildness_bucket(wildness)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"rounds": 0, "candidates": 0, "passing": 0,
+                                        "composites": [0] * _BINS}
+        return stats
+
+    def record(self, wildness: int, ranked: list[dict], passes) -> None:
+        """Fold one judged round into its bucket; ``passes(candidate)`` is the bar."""
+        with self._lock:
+            stats = self._bucket(wildness)
+            stats["rounds"] += 1
+            for cand in ranked:
+                stats["candidates"] += 1
+                stats["passing"] += bool(passes(cand))
+                idx = min(_BINS - 1, max(0, int(cand["composite"] * _BINS)))
+                stats["composites"][idx] += 1
+            self._unsaved += 1
+        if self.path and self._unsaved >= 20:
+            self.save()
+
+    def pass_rate(self, wildness: int) -> float | None:
+        with self._lock:
+            stats = self._stats.get(cache.wildness_bucket(wildness))
+            if not stats or stats["candidates"] < config.ADAPTIVE_MIN_SAMPLES:
+                return None
+            return (stats["passing"] + 1) / (stats["candidates"] + 2)
+
+    def plan(self, wildness: int) -> tuple[int, int]:
+        """``(candidates per round, max rounds)`` for a request at ``wildness``."""
+        fixed = (config.N_CANDIDATES, config.MAX_ROUNDS)
+        if not config.ADAPTIVE:
+            return fixed
+        p = self.pass_rate(wildness)
+        if p is None:
+            return fixed
+        return choose(p)
+
+    def snapshot(self) -> dict:
+        """Per-bucket statistics and the plan each bucket would get now."""
+        with self._lock:
+            buckets = {k: dict(v, composites=list(v["composites"]))
+                       for k, v in sorted(self._stats.items())}
+        out = {}
+        for key, stats in buckets.items():
+            wildness = key * max(1, config.CACHE_WILDNESS_BUCKET)
+            n, rounds = self.plan(wildness)
+            out[str(wildness)] = {**stats, "pass_rate": self.pass_rate(wildness),
+                                  "plan": {"n_candidates": n, "max_rounds": rounds}}
+        return {"adaptive": config.ADAPTIVE, "target": config.ADAPTIVE_TARGET,
+                "min_samples": config.ADAPTIVE_MIN_SAMPLES,
+                "fixed": {"n_candidates": config.N_CANDIDATES,
+                          "max_rounds": config.MAX_ROUNDS},
+                "buckets": out}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps({str(k): v for k, v in self._stats.items()})
+            self._unsaved = 0
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(data)
+        os.replace(tmp, self.path)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            self._stats = {int(k): _restore(v) for k, v in data.items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, AttributeError, KeyError, TypeError) as exc:
+            log.warning("Ignoring unreadable adaptive stats %s: %s", self.path, exc)
+            return
+        log.info("Loaded pass-rate stats for %d wildness buckets from %s",
+                 len(self._stats), self.path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def _restore(saved: dict) -> dict:
+    stats = {f: int(saved[f]) for f in ("rounds", "candidates", "passing")}
+    composites = saved.get("composites")
+    # Files written without the histogram (or at another resolution) start it empty.
+    if isinstance(composites, list) and len(composites) == _BINS:
+        stats["composites"] = [int(c) for c in composites]
+    else:
+        stats["composites"] = [0] * _BINS
+    return stats
+
+
+def choose(p: float) -> tuple[int, int]:
+    """Cheapest ``(n, rounds)`` whose pass probability reaches the target, given a
+    per-candidate pass probability ``p``; the most generous plan if none does."""
+    best, best_cost = None, float("inf")
+    for n in range(config.ADAPTIVE_MIN_N, config.ADAPTIVE_MAX_N + 1):
+        q = 1 - (1 - p) ** n
+        for rounds in range(1, config.ADAPTIVE_MAX_ROUNDS + 1):
+            if 1 - (1 - q) ** rounds < config.ADAPTIVE_TARGET:
+                continue
+            # Round r runs only if rounds 0..r-1 all failed.
+            expected_rounds = sum((1 - q) ** r for r in range(rounds))
+            cost = expected_rounds * (n + config.ADAPTIVE_ROUND_COST)
+            if cost < best_cost:
+                best, best_cost = (n, rounds), cost
+            break  # more rounds at this n only costs more
+    return best or (config.ADAPTIVE_MAX_N, config.ADAPTIVE_MAX_ROUNDS)
+
+
+controller = Controller(config.ADAPTIVE_PATH)
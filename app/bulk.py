@@ -0,0 +1,172 @@
+"""Resumable bulk generation: JSONL of topics in, JSONL of judged ideas out.
+
+    python -m app.bulk topics.jsonl --out ideas.jsonl --workers 8 --rpm 60
+    cat topics.jsonl | python -m app.bulk - --out ideas.jsonl
+
+Each input line is ``{"topic": "...", "wildness": 50}`` (``wildness`` and ``id`` are
+optional) or a bare JSON string; a line that is neither gets an error record of its
+own and the rest of the file still runs. Rows run through ``pipeline.agenerate_idea``
+on a bounded async worker pool, paced to a requests-per-minute ceiling, and each result
+is appended to ``--out`` and flushed as soon as it completes. The output file is the
+checkpoint: re-running the same command skips every row that already has a result
+there, so a crashed run resumes without regenerating finished rows (rows that
+errored are retried). Rows are matched by ``id``, which defaults to
+``"<topic>@<wildness>"`` so that editing the input file doesn't shift it.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from . import config, pipeline
+
+log = config.log.getChild("bulk")
+
+
+def _row(item, default_wildness: int) -> dict:
+    if isinstance(item, str):
+        item = {"topic": item}
+    if not isinstance(item, dict):
+        raise ValueError(f"expected an object or a string, got {type(item).__name__}")
+    topic = str(item.get("topic", "")).strip()
+    try:
+        wildness = max(0, min(int(item.get("wildness", default_wildness)), 100))
+    except (TypeError, ValueError):
+        raise ValueError(f"wildness must be an integer, got {item.get('wildness')!r}") from None
+    return {"id": item.get("id", f"{topic}@{wildness}"), "topic": topic, "wildness": wildness}
+
+
+def _read_rows(lines, default_wildness: int) -> list[dict]:
+    rows = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            item = line  # tolerate a plain-text topic per line
+        try:
+            rows.append(_row(item, default_wildness))
+        except ValueError as exc:
+            rows.append({"id": f"line {line_no}", "topic": "", "wildness": default_wildness,
+                         "error": f"line {line_no}: {exc}"})
+    return rows
+
+
+def _finished_ids(out_path: str) -> set:
+    """Ids that already have a successful result in the output file."""
+    done = set()
+    try:
+        with open(out_path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a torn final line from a crash
+                if "error" not in row:
+                    done.add(row.get("id"))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class _Pacer:
+    """Spaces request starts at least ``60 / rpm`` seconds apart (0 = unpaced)."""
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        slot = max(self._next, loop.time())
+        self._next = slot + self.interval
+        await asyncio.sleep(slot - loop.time())
+
+
+def _progress(done: int, total: int, started: float) -> str:
+    elapsed = max(time.monotonic() - started, 1e-9)
+    rate = done / elapsed
+    eta = (total - done) / rate if rate else float("inf")
+    eta_txt = f"{eta / 60:.1f} min" if eta != float("inf") else "?"
+    return f"{done}/{total} rows · {rate * 60:.1f}/min · ETA {eta_txt}"
+
+
+async def run(rows: list[dict], out_path: str, *, workers: int = 8, rpm: float = 0,
+              fresh: bool = False, progress_every: float = 10.0) -> dict:
+    """Generate every row not already finished in ``out_path``; returns counts."""
+    finished = _finished_ids(out_path)
+    todo = [r for r in rows if r["id"] not in finished]
+    print(f"{len(rows)} rows, {len(rows) - len(todo)} already done, {len(todo)} to go",
+          file=sys.stderr)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for row in todo:
+        queue.put_nowait(row)
+    pacer = _Pacer(rpm)
+    counts = {"ok": 0, "error": 0}
+    started = last_report = time.monotonic()
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        async def worker():
+            nonlocal last_report
+            while not queue.empty():
+                row = queue.get_nowait()
+                if "error" in row:
+                    record = row  # unreadable input line
+                elif not row["topic"] or len(row["topic"]) > config.MAX_TOPIC_LEN:
+                    record = {**row, "error": "invalid topic"}
+                else:
+                    await pacer.wait()
+                    try:
+                        result = await pipeline.agenerate_idea(row["topic"], row["wildness"],
+                                                               fresh=fresh)
+                        record = {**row, **result}
+                    except Exception as exc:
+                        log.warning("Row %s failed: %s", row["id"], exc)
+                        record = {**row, "error": str(exc)}
+                counts["error" if "error" in record else "ok"] += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                now = time.monotonic()
+                if now - last_report >= progress_every:
+                    last_report = now
+                    print(_progress(sum(counts.values()), len(todo), started), file=sys.stderr)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+    print(_progress(sum(counts.values()), len(todo), started), file=sys.stderr)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate ideas for a JSONL file of topics.")
+    parser.add_argument("input", help="JSONL of topics, or - for stdin.")
+    parser.add_argument("--out", "-o", required=True,
+                        help="JSONL results file (appended to; doubles as the checkpoint).")
+    parser.add_argument("--workers", "-w", type=int, default=8,
+                        help="Concurrent generations (default 8).")
+    parser.add_argument("--rpm", type=float, default=0,
+                        help="Max generations started per minute (default unlimited).")
+    parser.add_argument("--wildness", type=int, default=50,
+                        help="Wildness for rows that don't set one (default 50).")
+    parser.add_argument("--fresh", action="store_true", help="Bypass the result cache.")
+    args = parser.parse_args(argv)
+
+    if args.input == "-":
+        rows = _read_rows(sys.stdin, args.wildness)
+    else:
+        with open(args.input, encoding="utf-8") as fh:
+            rows = _read_rows(fh, args.wildness)
+    counts = asyncio.run(run(rows, args.out, workers=args.workers, rpm=args.rpm,
+                             fresh=args.fresh))
+    if counts["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Bounded in-process caches for NBT-Gen.
+
+``TTLCache`` is a small thread-safe LRU map with per-entry expiry and hit / miss /
+eviction counters. ``ideas`` is the shared instance that sits in front of the
+pipeline: keyed by ``topic_key`` (normalized topic + wildness bucket), each entry
+holds several ranked ideas so repeat requests rotate through them instead of
+serving the same paragraph every time. ``inventory`` holds, per key, the passing
+ideas no one has been served yet, best-first, for "another one" requests.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import config
+
+
+def normalize_topic(topic: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a topic."""
+    return " ".join(re.sub(r"[^\w\s]", " ", topic.lower()).split())
+
+
+def wildness_bucket(wildness: int) -> int:
+    return max(0, min(int(wildness), 100)) // max(1, config.CACHE_WILDNESS_BUCKET)
+
+
+def topic_key(topic: str, wildness: int) -> tuple[str, int]:
+    return normalize_topic(topic), wildness_bucket(wildness)
+
+
+class TTLCache:
+    """LRU cache bounded by ``max_size`` entries, each expiring ``ttl`` seconds
+    after it was stored. A ``max_size`` of 0 disables it."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key):
+        """``get`` without touching the LRU order or the hit/miss counters."""
+        with self._lock:
+            item = self._data.get(key)
+            return item[1] if item is not None and item[0] > time.monotonic() else None
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+ideas = TTLCache(config.CACHE_SIZE, config.CACHE_TTL)
+inventory = TTLCache(config.INVENTORY_SIZE, config.INVENTORY_TTL)
@@ -3,18 +3,35 @@
 Every environment read and knob lives here so the pipeline modules stay focused on
 logic. Import from this module instead of calling ``os.getenv`` in each file.
 
+Provider SDKs (``google.genai``, ``requests``, ``httpx``) are imported on first use,
+not here: a cold worker serving ``GET /`` or static files never loads them.
+
 Model split (kept intentionally): Gemini *generates* candidate ideas (mine +
 compose in one structured call); Mistral is the independent *judge*.
 """
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import re
+import tempfile
+import threading
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
 
-import requests
 from dotenv import load_dotenv
-from google import genai
-from google.genai import errors as genai_errors
+
+from . import metrics, tracing
+from .hedging import Hedger
+from .ledger import Ledger, new_usage
+from .limits import CircuitBreaker, CircuitOpen, ProviderLimiter
+
+if TYPE_CHECKING:
+    import httpx
+    from google import genai
 
 load_dotenv()
 
@@ -39,16 +56,202 @@ GEMINI_COMPOSER_MODEL = os.getenv("GEMINI_COMPOSER_MODEL", GEMINI_MODEL)
 # Free-tier-friendly judge by default (small is plenty for 0–1 scoring and light on
 # the free token budget). Set to "auto" or mistral-large-latest for max quality.
 MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-small-latest")
-MISTRAL_MODELS_URL = "https://api.mistral.ai/v1/models"
-MISTRAL_CHAT_URL = "https://api.mistral.ai/v1/chat/completions"
+# Provider endpoints. Only overridden to point at stand-ins (see bench/fakes.py).
+GEMINI_BASE_URL = os.getenv("NBT_GEMINI_BASE_URL", "")
+MISTRAL_BASE_URL = os.getenv("NBT_MISTRAL_BASE_URL", "https://api.mistral.ai/v1").rstrip("/")
+MISTRAL_MODELS_URL = f"{MISTRAL_BASE_URL}/models"
+MISTRAL_CHAT_URL = f"{MISTRAL_BASE_URL}/chat/completions"
+MISTRAL_TIMEOUT = float(os.getenv("NBT_MISTRAL_TIMEOUT", "30"))
+# Pooled async HTTP client for the judge: one keep-alive pool per worker, sized for
+# hundreds of concurrent generations rather than one connection per request.
+HTTP_MAX_CONNECTIONS = int(os.getenv("NBT_HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("NBT_HTTP_MAX_KEEPALIVE", "50"))
+# Seconds between SSE keep-alive comments on a quiet /generate-stream, so proxies
+# don't cut long generations; each one also checks whether the client is gone.
+SSE_HEARTBEAT = float(os.getenv("NBT_SSE_HEARTBEAT", "15"))
+# Seconds between client-disconnect checks while a stream is quiet, so a client that
+# leaves mid-run cancels it within about this long rather than at the next heartbeat.
+SSE_DISCONNECT_POLL = float(os.getenv("NBT_SSE_DISCONNECT_POLL", "1"))
 
 # ─── Pipeline tunables ───────────────────────────────────────────────────────────
+def _env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+
 VERSION = "0.4.0"
 N_CANDIDATES = int(os.getenv("NBT_N_CANDIDATES", "5"))      # best-of-N in one call
 MAX_ROUNDS = int(os.getenv("NBT_MAX_ROUNDS", "2"))          # compose+judge rounds
 MIN_COHERENCE = float(os.getenv("NBT_MIN_COHERENCE", "0.5"))
 MIN_NOVELTY = float(os.getenv("NBT_MIN_NOVELTY", "0.55"))
 MAX_TOPIC_LEN = int(os.getenv("NBT_MAX_TOPIC_LEN", "200"))
+# Speculative rounds: start round r+1's generate call while round r is still being
+# judged, and cancel/discard it if round r passes. Trades quota for lower p95.
+SPECULATIVE_ROUNDS = _env_flag("NBT_SPECULATIVE_ROUNDS")
+# Stream the generator's JSON array and surface each candidate as soon as its object
+# closes, instead of waiting for the whole structured response.
+STREAM_CANDIDATES = _env_flag("NBT_STREAM_CANDIDATES")
+
+# Adaptive budget (see app/adaptive.py): once a wildness bucket has enough judged
+# candidates, pick N and the round budget per request from its pass rate instead of
+# the fixed N_CANDIDATES / MAX_ROUNDS above (which NBT_ADAPTIVE=0 restores). Those
+# are also the default ceilings, so the default cost per request never goes up.
+ADAPTIVE = _env_flag("NBT_ADAPTIVE", default=True)
+ADAPTIVE_TARGET = float(os.getenv("NBT_ADAPTIVE_TARGET", "0.9"))  # P(result passes)
+ADAPTIVE_MIN_N = int(os.getenv("NBT_ADAPTIVE_MIN_N", "2"))
+ADAPTIVE_MAX_N = int(os.getenv("NBT_ADAPTIVE_MAX_N", str(N_CANDIDATES)))
+ADAPTIVE_MAX_ROUNDS = int(os.getenv("NBT_ADAPTIVE_MAX_ROUNDS", str(MAX_ROUNDS)))
+ADAPTIVE_ROUND_COST = float(os.getenv("NBT_ADAPTIVE_ROUND_COST", "4"))
+ADAPTIVE_MIN_SAMPLES = int(os.getenv("NBT_ADAPTIVE_MIN_SAMPLES", "50"))
+ADAPTIVE_PATH = os.getenv("NBT_ADAPTIVE_PATH", "")
+
+# Startup prewarm (see prewarm()): resolve models, open the provider connection pools
+# and check both keys before the worker takes traffic. "auto" models are re-resolved
+# every NBT_MODEL_REFRESH seconds (0 = never) and shared between the workers on a
+# host through the NBT_MODEL_CACHE_PATH file ("" = per-process only).
+PREWARM = _env_flag("NBT_PREWARM", True)
+MODEL_REFRESH = float(os.getenv("NBT_MODEL_REFRESH", "3600"))
+MODEL_CACHE_PATH = os.getenv("NBT_MODEL_CACHE_PATH",
+                             os.path.join(tempfile.gettempdir(), "nbtgen-models.json"))
+
+# Per-request time budget in seconds (0 = none). Provider timeouts and retries use
+# what is left of it, and the pipeline won't start a round that can't fit — it
+# returns the best so far flagged ``deadline_truncated``. Requests may ask for their
+# own budget, capped at MAX_DEADLINE.
+DEADLINE = float(os.getenv("NBT_DEADLINE", "60"))
+MAX_DEADLINE = float(os.getenv("NBT_MAX_DEADLINE", "120"))
+
+# Sharded judging (see judge.py): with more than JUDGE_SHARD_SIZE candidates to
+# score (0 = never), they are split into shards of that size judged concurrently.
+# The first JUDGE_ANCHORS candidates are judged in every shard and put the shards'
+# scores on one scale; JUDGE_KNOCKOUT re-judges the shard winners head to head.
+JUDGE_SHARD_SIZE = int(os.getenv("NBT_JUDGE_SHARD_SIZE", "0"))
+JUDGE_ANCHORS = int(os.getenv("NBT_JUDGE_ANCHORS", "2"))
+JUDGE_KNOCKOUT = _env_flag("NBT_JUDGE_KNOCKOUT")
+
+# Batch API: topics packed into one Gemini call (and one judge call), and how many
+# such packed batches run concurrently.
+BATCH_TOPICS_PER_CALL = int(os.getenv("NBT_BATCH_TOPICS_PER_CALL", "5"))
+BATCH_CONCURRENCY = int(os.getenv("NBT_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_TOPICS = int(os.getenv("NBT_BATCH_MAX_TOPICS", "200"))
+
+# ─── Quotas & admission control ─────────────────────────────────────────────────
+# Client-side pacing per provider model, so bursts queue briefly instead of failing
+# on 429s. 0 = unlimited. Set these a little under your plan's quota.
+GEMINI_RPM = float(os.getenv("NBT_GEMINI_RPM", "0"))
+GEMINI_TPM = float(os.getenv("NBT_GEMINI_TPM", "0"))
+MISTRAL_RPM = float(os.getenv("NBT_MISTRAL_RPM", "0"))
+MISTRAL_TPM = float(os.getenv("NBT_MISTRAL_TPM", "0"))
+# Pipeline runs executing at once per worker, and the queue in front of them. When
+# the queue is full (or a request waits longer than MAX_QUEUE_WAIT seconds) the web
+# routes answer 503 + Retry-After. NBT_MAX_INFLIGHT=0 disables admission control.
+MAX_INFLIGHT = int(os.getenv("NBT_MAX_INFLIGHT", "100"))
+MAX_QUEUE = int(os.getenv("NBT_MAX_QUEUE", "200"))
+MAX_QUEUE_WAIT = float(os.getenv("NBT_MAX_QUEUE_WAIT", "20"))
+
+# Circuit breakers per provider model (see limits.CircuitBreaker): once
+# BREAKER_ERROR_RATE of the last BREAKER_WINDOW calls failed, calls fail fast for
+# BREAKER_COOLDOWN seconds — the judge degrades to its heuristic at once and the
+# generator fails over to NBT_GEMINI_FAILOVER_MODEL if set — then one probe call
+# tests recovery. Only outages (transport errors, 5xx, 429) count, plus calls slower
+# than a provider's slow-call threshold where one is set (NBT_BREAKER_SLOW_CALL for
+# both, or NBT_BREAKER_SLOW_CALL_GEMINI / _MISTRAL; 0 = never): a long structured
+# composer call is slow but still a success.
+BREAKER = _env_flag("NBT_BREAKER", default=True)
+BREAKER_ERROR_RATE = float(os.getenv("NBT_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("NBT_BREAKER_SLOW_CALL", "0"))
+BREAKER_SLOW_CALLS = {
+    provider: float(os.getenv(f"NBT_BREAKER_SLOW_CALL_{provider.upper()}",
+                              str(BREAKER_SLOW_CALL)))
+    for provider in ("gemini", "mistral")}
+BREAKER_WINDOW = int(os.getenv("NBT_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("NBT_BREAKER_MIN_CALLS", "10"))
+BREAKER_COOLDOWN = float(os.getenv("NBT_BREAKER_COOLDOWN", "30"))
+GEMINI_FAILOVER_MODEL = os.getenv("NBT_GEMINI_FAILOVER_MODEL", "")
+
+# Hedged requests (see app/hedging.py): a Gemini/Mistral call still running after
+# its model's rolling HEDGE_QUANTILE latency gets a duplicate and the first answer
+# wins. At most HEDGE_BUDGET of calls may hedge. Gemini hedges go to
+# NBT_HEDGE_GEMINI_MODEL (default GEMINI_MODEL, which differs from the composer
+# model only if GEMINI_COMPOSER_MODEL is set); judge hedges reuse the judge model
+# so cached scores stay keyed to it.
+HEDGE = _env_flag("NBT_HEDGE")
+HEDGE_QUANTILE = float(os.getenv("NBT_HEDGE_QUANTILE", "0.9"))
+HEDGE_BUDGET = float(os.getenv("NBT_HEDGE_BUDGET", "0.1"))
+HEDGE_MIN_DELAY = float(os.getenv("NBT_HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_DELAY = float(os.getenv("NBT_HEDGE_MAX_DELAY", "30"))
+HEDGE_GEMINI_MODEL = os.getenv("NBT_HEDGE_GEMINI_MODEL", GEMINI_MODEL)
+
+# Prompt-prefix cache (see cached_prompt()): the generator's system instruction is
+# uploaded once per model as provider-side cached content, and calls reference that
+# handle instead of resending the text. Handles live PROMPT_CACHE_TTL seconds and
+# are renewed while in use; if creating one fails, calls go inline and the create is
+# retried after PROMPT_CACHE_RETRY seconds (never, if the model refused it outright).
+# Gemini refuses cached content under a per-model minimum size, so an instruction
+# estimated (~4 characters a token) below PROMPT_CACHE_MIN_TOKENS is always sent
+# inline without trying. Off by default: the generator's instruction is ~560 tokens,
+# under the 1024 minimum, and the rest of its prompt is the per-request topic, so
+# there is no prefix large enough to cache. Enable it for a model with a lower
+# minimum (lower PROMPT_CACHE_MIN_TOKENS to match) or a longer instruction.
+PROMPT_CACHE = _env_flag("NBT_PROMPT_CACHE", default=False)
+PROMPT_CACHE_TTL = float(os.getenv("NBT_PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_RETRY = float(os.getenv("NBT_PROMPT_CACHE_RETRY", "600"))
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("NBT_PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+# Near-duplicate suppression (see app/modules/dedup.py): candidates whose estimated
+# Jaccard similarity to a recently served idea reaches the threshold are treated as
+# repeats and never sent to the judge. NBT_DEDUP_SIZE=0 disables it; set
+# NBT_DEDUP_PATH to persist the index across restarts.
+DEDUP_SIZE = int(os.getenv("NBT_DEDUP_SIZE", "5000"))
+DEDUP_THRESHOLD = float(os.getenv("NBT_DEDUP_THRESHOLD", "0.6"))
+DEDUP_PERMS = int(os.getenv("NBT_DEDUP_PERMS", "64"))
+DEDUP_BANDS = int(os.getenv("NBT_DEDUP_BANDS", "16"))
+DEDUP_PATH = os.getenv("NBT_DEDUP_PATH", "")
+
+# Judge score cache (see app/modules/score_cache.py). Empty path = in-memory only;
+# point it at a file to keep scores across restarts. 0 rows disables it.
+SCORE_CACHE_PATH = os.getenv("NBT_SCORE_CACHE_PATH", "")
+SCORE_CACHE_MAX_ROWS = int(os.getenv("NBT_SCORE_CACHE_MAX_ROWS", "100000"))
+
+# Result cache in front of the pipeline (see app/cache.py). Keyed on the normalized
+# topic + a wildness bucket; each entry keeps the top few passing ideas and repeat
+# requests rotate through them. NBT_CACHE_SIZE=0 disables it.
+CACHE_SIZE = int(os.getenv("NBT_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("NBT_CACHE_TTL", "3600"))
+CACHE_WILDNESS_BUCKET = int(os.getenv("NBT_CACHE_WILDNESS_BUCKET", "10"))
+CACHE_IDEAS = int(os.getenv("NBT_CACHE_IDEAS", "3"))
+# Runner-up inventory (cache.inventory): the passing ideas a run did not serve, kept
+# per (topic, wildness bucket) for "another one" requests. Up to INVENTORY_PER_TOPIC
+# ideas for INVENTORY_SIZE topics (0 disables), each shelf expiring INVENTORY_TTL
+# seconds after it was last stocked. Once a take leaves INVENTORY_LOW or fewer, a
+# background run restocks it.
+INVENTORY_SIZE = int(os.getenv("NBT_INVENTORY_SIZE", "512"))
+INVENTORY_TTL = float(os.getenv("NBT_INVENTORY_TTL", str(CACHE_TTL)))
+INVENTORY_PER_TOPIC = int(os.getenv("NBT_INVENTORY_PER_TOPIC", "8"))
+INVENTORY_LOW = int(os.getenv("NBT_INVENTORY_LOW", "1"))
+
+# Usage ledger and budgets (see app/ledger.py). Every provider call is booked per
+# model and per UTC day; NBT_PRICES maps a model to its [input, output] USD price per
+# million tokens. With NBT_BUDGET_TOKENS and/or NBT_BUDGET_COST set (per worker; 0 =
+# unlimited) over the calendar day, or the last NBT_BUDGET_WINDOW seconds, requests
+# step down as the budget runs out: fewer candidates from BUDGET_STEP_DOWN of it
+# spent, a single round from BUDGET_SINGLE_ROUND, cached ideas only once it is gone.
+BUDGET_TOKENS = int(os.getenv("NBT_BUDGET_TOKENS", "0"))
+BUDGET_COST = float(os.getenv("NBT_BUDGET_COST", "0"))
+BUDGET_WINDOW = float(os.getenv("NBT_BUDGET_WINDOW", "0"))
+BUDGET_STEP_DOWN = float(os.getenv("NBT_BUDGET_STEP_DOWN", "0.8"))
+BUDGET_SINGLE_ROUND = float(os.getenv("NBT_BUDGET_SINGLE_ROUND", "0.9"))
+PRICES = json.loads(os.getenv("NBT_PRICES") or "{}")
+LEDGER_PATH = os.getenv("NBT_LEDGER_PATH", "")
+
+# Tracing & profiling (see app/tracing.py). NBT_DEBUG_TIMINGS attaches a per-stage
+# timing breakdown to every result; NBT_TRACE_DIR writes each request's spans there
+# as Chrome trace-event JSON. NBT_PROFILE_SAMPLE is the fraction of requests run
+# under the sampling profiler (folded stacks go to NBT_TRACE_DIR, top frames to the log).
+DEBUG_TIMINGS = _env_flag("NBT_DEBUG_TIMINGS")
+TRACE_DIR = os.getenv("NBT_TRACE_DIR", "")
+PROFILE_SAMPLE = float(os.getenv("NBT_PROFILE_SAMPLE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("NBT_PROFILE_INTERVAL_MS", "5"))
+tracing.configure(DEBUG_TIMINGS, TRACE_DIR, PROFILE_SAMPLE, PROFILE_INTERVAL_MS)
 
 # Composer sampling temperature: wildness 0→100 maps to TEMP_MIN→TEMP_MAX.
 # Capped well below 2.0 — past ~1.4 Gemini output degrades into incoherence and
@@ -63,24 +266,57 @@ def wildness_to_temperature(wildness: int) -> float:
     return round(TEMP_MIN + (w / 100.0) * (TEMP_MAX - TEMP_MIN), 3)
 
 
-# Shared Gemini client. Stays ``None`` when no key is set (or init fails) so
-# importing this module under tests/CI never crashes; creative stages call
-# ``require_gemini()``, which raises only when the client is actually needed.
-try:
-    gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
-except Exception as exc:  # pragma: no cover - defensive
-    log.warning("Could not initialise Gemini client: %s", exc)
-    gemini_client = None
+# Shared Gemini client, built (and the SDK imported) by the first ``require_gemini()``
+# call, which raises only when the client is actually needed and no key is set.
+gemini_client: "genai.Client | None" = None
 
 
-def require_gemini() -> genai.Client:
+def require_gemini() -> "genai.Client":
+    global gemini_client
     if gemini_client is None:
-        raise RuntimeError("GEMINI_API_KEY is not set")
+        if not GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+        from google import genai
+        gemini_client = genai.Client(
+            api_key=GEMINI_API_KEY,
+            http_options={"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None,
+        )
     return gemini_client
 
 
+def _api_error() -> type[Exception]:
+    """The genai SDK's ``APIError`` (the SDK is loaded by then: ``require_gemini``)."""
+    from google.genai.errors import APIError
+    return APIError
+
+
+# Shared async HTTP pool for Mistral. Created on first use (it must be built inside
+# a running event loop) and closed by the app's lifespan on shutdown.
+_mistral_http: "httpx.AsyncClient | None" = None
+
+
+def mistral_http() -> "httpx.AsyncClient":
+    global _mistral_http
+    if _mistral_http is None or _mistral_http.is_closed:
+        import httpx
+        _mistral_http = httpx.AsyncClient(
+            timeout=MISTRAL_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        )
+    return _mistral_http
+
+
+async def aclose_http() -> None:
+    global _mistral_http
+    if _mistral_http is not None:
+        await _mistral_http.aclose()
+        _mistral_http = None
+
+
 # ─── Dynamic model resolution (only when a model is set to "auto") ─────────────────
-# Cache so discovery's metadata call happens at most once per process.
+# Cache so discovery's metadata call happens at most once per process; the on-disk
+# copy at MODEL_CACHE_PATH lets sibling workers skip it too.
 _resolved: dict[str, str] = {}
 
 # Variants that aren't the general text "flash" chat model we want.
@@ -116,18 +352,88 @@ def _pick_mistral_chat(chat_ids) -> str | None:
     return next((p for p in _MISTRAL_PREF if p in available), None)
 
 
+def _discover_gemini() -> str:
+    pick = _pick_gemini_flash(require_gemini().models.list())
+    if not pick:
+        raise RuntimeError("Could not auto-discover a Gemini flash model")
+    return pick
+
+
+def _discover_mistral() -> str:
+    import requests
+    resp = requests.get(
+        MISTRAL_MODELS_URL,
+        headers={"Authorization": f"Bearer {MISTRAL_API_KEY}"},
+        timeout=30,
+    )
+    resp.raise_for_status()
+    chat_ids = [m["id"] for m in resp.json().get("data", [])
+                if m.get("capabilities", {}).get("completion_chat")]
+    pick = _pick_mistral_chat(chat_ids)
+    if not pick:
+        raise RuntimeError("Could not auto-discover a Mistral chat model")
+    return pick
+
+
+_DISCOVER = {"gemini": _discover_gemini, "mistral": _discover_mistral}
+
+
+def _read_model_cache(key: str) -> str | None:
+    """A sibling worker's resolution of ``key``, if one is on disk and still fresh."""
+    if not MODEL_CACHE_PATH:
+        return None
+    try:
+        with open(MODEL_CACHE_PATH, encoding="utf-8") as fh:
+            entry = json.load(fh).get(key) or {}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, AttributeError) as exc:
+        log.warning("Ignoring unreadable model cache %s: %s", MODEL_CACHE_PATH, exc)
+        return None
+    age = time.time() - entry.get("at", 0)
+    if MODEL_REFRESH > 0 and age > MODEL_REFRESH:
+        return None
+    return entry.get("model")
+
+
+def _write_model_cache(key: str, model: str) -> None:
+    if not MODEL_CACHE_PATH:
+        return
+    try:
+        with open(MODEL_CACHE_PATH, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    data[key] = {"model": model, "at": time.time()}
+    tmp = f"{MODEL_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, MODEL_CACHE_PATH)
+    except OSError as exc:
+        log.warning("Could not write model cache %s: %s", MODEL_CACHE_PATH, exc)
+
+
+def _resolve(key: str) -> str:
+    """Adopt a fresh on-disk resolution of ``key`` or run discovery (and publish it)."""
+    pick = _read_model_cache(key)
+    if pick is None:
+        pick = _DISCOVER[key]()
+        _write_model_cache(key, pick)
+    if _resolved.get(key) != pick:
+        log.info("Auto-resolved %s model: %s", key.capitalize(), pick)
+    _resolved[key] = pick
+    return pick
+
+
 def resolve_gemini_model(configured: str) -> str:
     """Return ``configured`` unless it is ``"auto"``, in which case discover and
     cache the newest stable flash model from the Gemini API."""
     if configured != "auto":
         return configured
-    if "gemini" not in _resolved:
-        pick = _pick_gemini_flash(require_gemini().models.list())
-        if not pick:
-            raise RuntimeError("Could not auto-discover a Gemini flash model")
-        _resolved["gemini"] = pick
-        log.info("Auto-resolved Gemini model: %s", pick)
-    return _resolved["gemini"]
+    return _resolved.get("gemini") or _resolve("gemini")
 
 
 def resolve_mistral_model(configured: str) -> str:
@@ -135,21 +441,461 @@ def resolve_mistral_model(configured: str) -> str:
     cache the best general chat model from the Mistral API."""
     if configured != "auto":
         return configured
-    if "mistral" not in _resolved:
-        resp = requests.get(
-            MISTRAL_MODELS_URL,
-            headers={"Authorization": f"Bearer {MISTRAL_API_KEY}"},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        chat_ids = [m["id"] for m in resp.json().get("data", [])
-                    if m.get("capabilities", {}).get("completion_chat")]
-        pick = _pick_mistral_chat(chat_ids)
-        if not pick:
-            raise RuntimeError("Could not auto-discover a Mistral chat model")
-        _resolved["mistral"] = pick
-        log.info("Auto-resolved Mistral model: %s", pick)
-    return _resolved["mistral"]
+    return _resolved.get("mistral") or _resolve("mistral")
+
+
+async def _aresolve(resolver, configured: str, key: str) -> str:
+    # Only discovery touches the network; once cached (or not "auto") stay on-loop.
+    if configured == "auto" and key not in _resolved:
+        return await asyncio.to_thread(resolver, configured)
+    return resolver(configured)
+
+
+async def aresolve_gemini_model(configured: str) -> str:
+    return await _aresolve(resolve_gemini_model, configured, "gemini")
+
+
+async def aresolve_mistral_model(configured: str) -> str:
+    return await _aresolve(resolve_mistral_model, configured, "mistral")
+
+
+def auto_models() -> list[str]:
+    """Providers with at least one model set to ``"auto"``."""
+    configured = {"gemini": (GEMINI_MODEL, GEMINI_COMPOSER_MODEL, HEDGE_GEMINI_MODEL,
+                             GEMINI_FAILOVER_MODEL),
+                  "mistral": (MISTRAL_MODEL,)}
+    return [key for key, models in configured.items() if "auto" in models]
+
+
+def refresh_models() -> None:
+    """Re-resolve every ``"auto"`` model, keeping the current pick if discovery fails."""
+    for key in auto_models():
+        try:
+            _resolve(key)
+        except Exception as exc:
+            log.warning("Could not refresh the %s model (keeping %s): %s",
+                        key, _resolved.get(key), exc)
+
+
+async def arefresh_models_forever(interval: float) -> None:
+    """Background task: ``refresh_models()`` every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(refresh_models)
+
+
+async def _warm_gemini() -> str:
+    if "gemini" in auto_models():  # also covers an "auto" hedge/failover model
+        await aresolve_gemini_model("auto")
+    model = await aresolve_gemini_model(GEMINI_COMPOSER_MODEL)
+    # A metadata read checks the key and the model, and leaves a warm TLS connection
+    # in the SDK's pool for the first generation.
+    await require_gemini().aio.models.get(model=model)
+    return model
+
+
+async def _warm_mistral() -> str:
+    model = await aresolve_mistral_model(MISTRAL_MODEL)
+    resp = await mistral_http().get(MISTRAL_MODELS_URL,
+                                    headers={"Authorization": f"Bearer {MISTRAL_API_KEY}"})
+    resp.raise_for_status()
+    return model
+
+
+async def prewarm() -> dict[str, dict]:
+    """Resolve models, validate keys and open both providers' connection pools.
+    Failures are logged and reported, not raised: the worker still starts, and
+    the first requests pay for whatever could not be warmed."""
+    async def warm(name: str, step) -> tuple[str, dict]:
+        started = time.perf_counter()
+        try:
+            model = await step()
+        except Exception as exc:
+            log.warning("Prewarm: %s not ready: %s", name, exc)
+            return name, {"ok": False, "error": str(exc)}
+        ms = round((time.perf_counter() - started) * 1000, 1)
+        log.info("Prewarm: %s ready (%s, %.0f ms)", name, model, ms)
+        return name, {"ok": True, "model": model, "ms": ms}
+
+    return dict(await asyncio.gather(warm("gemini", _warm_gemini),
+                                     warm("mistral", _warm_mistral)))
+
+
+_limiters: dict[tuple[str, str], ProviderLimiter] = {}
+
+
+def limiter(provider: str, model: str) -> ProviderLimiter:
+    """Shared RPM/TPM limiter for one ``"gemini"`` / ``"mistral"`` model."""
+    key = (provider, model)
+    if key not in _limiters:
+        rpm, tpm = ((GEMINI_RPM, GEMINI_TPM) if provider == "gemini"
+                    else (MISTRAL_RPM, MISTRAL_TPM))
+        _limiters[key] = ProviderLimiter(rpm, tpm)
+    return _limiters[key]
+
+
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def breaker(provider: str, model: str) -> CircuitBreaker:
+    """Shared circuit breaker for one ``"gemini"`` / ``"mistral"`` model."""
+    key = (provider, model)
+    if key not in _breakers:
+        slow_call = BREAKER_SLOW_CALLS.get(provider, BREAKER_SLOW_CALL)
+        _breakers[key] = CircuitBreaker(
+            f"{provider}:{model}", BREAKER_ERROR_RATE,
+            slow_call if BREAKER and slow_call > 0 else float("inf"), BREAKER_WINDOW,
+            BREAKER_MIN_CALLS if BREAKER else 1 << 62, BREAKER_COOLDOWN)
+    return _breakers[key]
+
+
+def is_outage(exc: Exception) -> bool:
+    """Whether a failed provider call says something about provider health. Client
+    errors (bad request, auth) don't; 429 quota exhaustion does. Neither does our
+    own request deadline running out."""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return not (isinstance(code, int) and 400 <= code < 500 and code != 429)
+
+
+def breaker_states() -> dict[str, dict]:
+    return {f"{p}:{m}": b.snapshot() for (p, m), b in sorted(_breakers.items())}
+
+
+_STATE_CODES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+metrics.register(metrics.Gauge(
+    "nbt_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    ("provider", "model"), fn=lambda: {k: _STATE_CODES[b.state] for k, b in _breakers.items()}))
+metrics.register(metrics.Gauge(
+    "nbt_breaker_rejected", "Calls refused by an open circuit breaker since start.",
+    ("provider", "model"), fn=lambda: {k: b.rejected for k, b in _breakers.items()}))
+
+
+def _route_gemini(model: str) -> str:
+    """``model`` unless its breaker is open, in which case the failover model if that
+    one is healthy; otherwise ``model`` (and its breaker will fail the call fast)."""
+    if breaker("gemini", model).allow() or not GEMINI_FAILOVER_MODEL:
+        return model
+    failover = (_resolved.get("gemini", model) if GEMINI_FAILOVER_MODEL == "auto"
+                else GEMINI_FAILOVER_MODEL)
+    if failover != model and breaker("gemini", failover).allow():
+        log.warning("Gemini %s circuit open; failing over to %s", model, failover)
+        return failover
+    return model
+
+
+hedger = Hedger(HEDGE, HEDGE_QUANTILE, HEDGE_BUDGET, HEDGE_MIN_DELAY, HEDGE_MAX_DELAY)
+
+
+def hedge_counter(provider: str, model: str):
+    """``on_hedge`` callback feeding the hedges fired/won counters."""
+    def count(event: str, backup_model: str) -> None:
+        counter = metrics.HEDGES_FIRED if event == "fired" else metrics.HEDGES_WON
+        counter.inc(provider=provider, model=model, backup=backup_model)
+    return count
+
+
+def _usage_tokens(response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return (getattr(usage, "total_token_count", 0) or 0) if usage is not None else 0
+
+
+# Per-context provider token tally. Callers that need to know what a block of calls
+# cost (e.g. a speculative round that may be thrown away) set a fresh dict here;
+# asyncio tasks and worker threads each get their own copy of the context.
+token_tally: ContextVar[dict | None] = ContextVar("nbt_token_tally", default=None)
+
+ledger = Ledger(BUDGET_TOKENS, BUDGET_COST, BUDGET_WINDOW, PRICES, LEDGER_PATH)
+metrics.register(metrics.Gauge(
+    "nbt_budget", "Tokens and USD spent in the current budget window, and the fraction "
+    "of the tightest budget that is.", ("stat",),
+    fn=lambda: {**dict(zip((("spent_tokens",), ("spent_cost_usd",)), ledger.spent())),
+                ("pressure",): ledger.pressure()}))
+
+# The usage record of the request this context serves, if any (see ``usage_scope``).
+request_usage: ContextVar[dict | None] = ContextVar("nbt_request_usage", default=None)
+
+
+def _record_usage(model: str, response, cached_tokens: int = 0) -> None:
+    """Charge a call's tokens, and count the input tokens a prompt cache spared it:
+    the provider's ``cached_content_token_count`` when reported, else the size of
+    the cached prefix the call referenced (``cached_tokens``)."""
+    limiter("gemini", model).charge(_usage_tokens(response))
+    count_usage("gemini", model, *gemini_usage(response))
+    usage = getattr(response, "usage_metadata", None)
+    saved = getattr(usage, "cached_content_token_count", None) if usage is not None else None
+    saved = cached_tokens if saved is None else saved
+    if saved:
+        metrics.PROMPT_TOKENS_SAVED.inc(saved, provider="gemini", model=model)
+
+
+def count_tokens(tokens: int) -> None:
+    """Add ``tokens`` to the tally of the run this context serves, if it keeps one."""
+    tally = token_tally.get()
+    if tally is not None:
+        tally["tokens"] = tally.get("tokens", 0) + tokens
+
+
+def count_usage(provider: str, model: str, input_tokens: int, output_tokens: int) -> None:
+    """Book one call's tokens: the run's tally, the ledger, and the request's usage."""
+    count_tokens(input_tokens + output_tokens)
+    ledger.record(provider, model, input_tokens, output_tokens, request_usage.get())
+
+
+def gemini_usage(response) -> tuple[int, int]:
+    """``(input, output)`` tokens of a Gemini response. Whatever is not prompt
+    (candidates and any thinking) is billed as output."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt = (getattr(usage, "prompt_token_count", 0) or 0) if usage is not None else 0
+    return prompt, max(0, _usage_tokens(response) - prompt)
+
+
+def mistral_usage(data) -> tuple[int, int]:
+    """``(input, output)`` tokens of a Mistral chat response."""
+    usage = (data.get("usage") or {}) if isinstance(data, dict) else {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def book_cancelled(provider: str):
+    """``on_cancel`` callback for ``hedger.arun``: a racer cancelled once another won
+    may already have been billed, so book the winner's usage for it as an estimate."""
+    estimate = gemini_usage if provider == "gemini" else mistral_usage
+
+    def book(model: str, winner) -> None:
+        count_usage(provider, model, *estimate(winner))
+    return book
+
+
+@contextmanager
+def usage_scope():
+    """Book the enclosed block's provider calls into a fresh usage record, yielded.
+    An enclosing scope's record does not see them."""
+    token = request_usage.set(usage := new_usage())
+    try:
+        yield usage
+    finally:
+        request_usage.reset(token)
+
+
+def run_hedged(provider: str, model: str, call, secondary: str | None = None):
+    """``hedger.run`` for a blocking call that books its own usage. Each racer books
+    into a record of its own, and only the winner's is added to the request's: a
+    losing thread that finishes after the request settled reaches the day totals
+    but not a usage record already sent to the client."""
+    def racer(m: str):
+        with usage_scope() as usage:
+            return call(m), usage
+
+    result, usage = hedger.run(provider, model, racer, secondary=secondary,
+                               on_hedge=hedge_counter(provider, model))
+    ledger.merge(usage, request_usage.get())
+    return result
+
+
+# ─── Prompt-prefix cache ────────────────────────────────────────────────────────
+class _CachedPrompt:
+    """One model's provider-side copy of one system instruction."""
+
+    def __init__(self):
+        self.name: str | None = None   # cachedContents/… handle, None = send inline
+        self.tokens = 0                # size of the cached prefix, per the provider
+        self.expires = 0.0             # time.monotonic() at which the handle lapses
+        self.retry_at = 0.0            # no new create before this after a failure
+        self.busy = False              # a create/renew call is in flight
+
+
+_prompt_caches: dict[tuple[str, str], _CachedPrompt] = {}
+_prompt_lock = threading.Lock()
+
+
+def _cacheable(gen_config) -> str | None:
+    instruction = getattr(gen_config, "system_instruction", None)
+    if not (PROMPT_CACHE and isinstance(instruction, str) and instruction.strip()):
+        return None
+    # Too small for the provider to cache: a create would only come back a 4xx.
+    return instruction if len(instruction) / 4 >= PROMPT_CACHE_MIN_TOKENS else None
+
+
+def _claim_prompt(model: str, instruction: str) -> tuple[_CachedPrompt, bool]:
+    """The cache entry for ``instruction`` on ``model``, and whether this caller
+    should create (or renew) its handle now. One caller at a time does; the rest
+    use the current handle, or go inline while there is none."""
+    key = (model, hashlib.sha256(instruction.encode()).hexdigest()[:16])
+    now = time.monotonic()
+    with _prompt_lock:
+        entry = _prompt_caches.setdefault(key, _CachedPrompt())
+        if entry.busy:
+            return entry, False
+        if entry.name is not None:
+            due = entry.expires - now < PROMPT_CACHE_TTL / 4   # renew well before it lapses
+        else:
+            due = now >= entry.retry_at
+        entry.busy = due
+        return entry, due
+
+
+def _settle_prompt(entry: _CachedPrompt, model: str, handle, exc: Exception | None) -> None:
+    """Record how a create/renew call went. Neither ``handle`` nor ``exc`` means it
+    was interrupted (cancelled, or the request ran out of time first)."""
+    with _prompt_lock:
+        entry.busy = False
+        if isinstance(exc, DeadlineExceeded) or (handle is None and exc is None):
+            return
+        if exc is None:
+            if entry.name is None:
+                log.info("Cached the system instruction for %s as %s", model, handle.name)
+            usage = getattr(handle, "usage_metadata", None)
+            entry.name = handle.name
+            entry.tokens = getattr(usage, "total_token_count", None) or entry.tokens
+            entry.expires = time.monotonic() + PROMPT_CACHE_TTL
+            return
+        entry.name = None
+        code = getattr(exc, "code", None)
+        refused = isinstance(code, int) and 400 <= code < 500 and code != 429
+        # A 4xx (instruction under the model's minimum size, caching unsupported)
+        # won't change by asking again; anything else might.
+        entry.retry_at = float("inf") if refused else time.monotonic() + PROMPT_CACHE_RETRY
+        log.warning("Prompt cache unavailable for %s (%s); sending the system instruction "
+                    "inline%s", model, exc, "" if refused else
+                    f", retrying in {PROMPT_CACHE_RETRY:.0f}s")
+
+
+def _prompt_call_config(entry: _CachedPrompt, instruction: str | None = None):
+    from google.genai import types
+    timeout = time_budget(10.0)
+    http = types.HttpOptions(timeout=int(timeout * 1000))
+    ttl = f"{int(PROMPT_CACHE_TTL)}s"
+    if entry.name is not None:
+        return types.UpdateCachedContentConfig(ttl=ttl, http_options=http)
+    return types.CreateCachedContentConfig(system_instruction=instruction, ttl=ttl,
+                                           display_name="nbtgen-system", http_options=http)
+
+
+def _use_prompt(gen_config, entry: _CachedPrompt):
+    name = entry.name
+    if name is None or time.monotonic() >= entry.expires:
+        return gen_config, 0
+    return (gen_config.model_copy(update={"system_instruction": None, "cached_content": name}),
+            entry.tokens)
+
+
+def cached_prompt(client, model: str, gen_config):
+    """``gen_config`` with its system instruction swapped for ``model``'s cached copy
+    (created or renewed here when due), and that copy's token count. Returns
+    ``(gen_config, 0)`` unchanged when there is nothing to cache or no handle."""
+    instruction = _cacheable(gen_config)
+    if instruction is None:
+        return gen_config, 0
+    entry, due = _claim_prompt(model, instruction)
+    if due:
+        handle = error = None
+        try:
+            call_config = _prompt_call_config(entry, instruction)
+            handle = (client.caches.update(name=entry.name, config=call_config)
+                      if entry.name else client.caches.create(model=model, config=call_config))
+        except Exception as exc:
+            error = exc
+        finally:
+            _settle_prompt(entry, model, handle, error)
+    return _use_prompt(gen_config, entry)
+
+
+async def acached_prompt(client, model: str, gen_config):
+    """Async ``cached_prompt`` on the genai async client."""
+    instruction = _cacheable(gen_config)
+    if instruction is None:
+        return gen_config, 0
+    entry, due = _claim_prompt(model, instruction)
+    if due:
+        handle = error = None
+        try:
+            call_config = _prompt_call_config(entry, instruction)
+            handle = await (client.aio.caches.update(name=entry.name, config=call_config)
+                            if entry.name else
+                            client.aio.caches.create(model=model, config=call_config))
+        except Exception as exc:
+            error = exc
+        finally:
+            _settle_prompt(entry, model, handle, error)
+    return _use_prompt(gen_config, entry)
+
+
+def forget_stale_prompts(exc: Exception) -> bool:
+    """Drop every cached-prompt handle if ``exc`` says a referenced one is gone
+    (expired or deleted provider-side), so the retry recreates it or goes inline."""
+    if getattr(exc, "code", None) not in (400, 403, 404):
+        return False
+    if "cachedcontent" not in str(exc).lower().replace(" ", ""):
+        return False
+    with _prompt_lock:
+        stale = [entry for entry in _prompt_caches.values() if entry.name is not None]
+        for entry in stale:
+            entry.name = None
+    return bool(stale)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before (or during) a provider call."""
+
+
+# Absolute ``time.monotonic()`` deadline of the request this context serves.
+_deadline: ContextVar[float | None] = ContextVar("nbt_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float | None = None):
+    """Give the enclosed block a time budget: ``seconds`` (capped at MAX_DEADLINE)
+    or the DEADLINE default. An enclosing, earlier deadline still wins."""
+    seconds = DEADLINE if seconds is None else min(seconds, MAX_DEADLINE)
+    deadline = time.monotonic() + seconds if seconds > 0 else None
+    outer = _deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current request's budget, or ``None`` if unbounded."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def time_budget(limit: float | None = None) -> float | None:
+    """``limit`` shortened to the remaining budget; raises ``DeadlineExceeded`` when
+    nothing is left."""
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if limit is None else min(limit, left)
+
+
+# Extra HTTP timeout over the budget on the async path, so the ``wait_for`` on the
+# budget always fires first and the caller sees ``DeadlineExceeded``.
+_TIMEOUT_MARGIN = 0.5
+
+
+def _timed_out(exc: Exception) -> bool:
+    """Whether ``exc`` is the SDK's HTTP timeout firing on an exhausted budget."""
+    import httpx  # already loaded by the SDK that raised it
+    left = remaining()
+    return (left is not None and left <= _TIMEOUT_MARGIN
+            and isinstance(exc, (TimeoutError, httpx.TimeoutException)))
+
+
+def _with_timeout(gen_config, seconds: float | None):
+    if seconds is None or gen_config is None:
+        return gen_config
+    from google.genai.types import HttpOptions
+    return gen_config.model_copy(update={"http_options": HttpOptions(timeout=int(seconds * 1000))})
 
 
 # Transient server-side codes worth retrying. 429 (quota) is intentionally NOT
@@ -157,25 +903,180 @@ def resolve_mistral_model(configured: str) -> str:
 _RETRYABLE = {500, 503}
 
 
+def _retry_wait(exc: Exception, model: str, attempt: int,
+                max_attempts: int) -> float | None:
+    """Backoff before the next attempt, or ``None`` if ``exc`` should propagate."""
+    code = getattr(exc, "code", None)
+    if code == 429:
+        metrics.QUOTA_ERRORS.inc(provider="gemini", model=model,
+                                 wildness=metrics.wildness_label.get())
+    if code not in _RETRYABLE or attempt >= max_attempts - 1:
+        return None
+    wait = 1.5 * (2 ** attempt)
+    left = remaining()
+    if left is not None and left < wait + 1.0:
+        log.warning("Gemini %s on %s; no budget left to retry", code, model)
+        return None
+    metrics.RETRIES.inc(provider="gemini", model=model, code=code,
+                        wildness=metrics.wildness_label.get())
+    log.warning("Gemini %s on %s; retry %d/%d in %.1fs",
+                code, model, attempt + 1, max_attempts, wait)
+    return wait
+
+
+def _hedge_model(model: str) -> str:
+    """Secondary model for a hedged Gemini call; "auto" reuses the discovered model."""
+    if HEDGE_GEMINI_MODEL == "auto":
+        return _resolved.get("gemini", model)
+    return HEDGE_GEMINI_MODEL or model
+
+
+def _span_attrs(model: str, contents, gen_config, attempt: int) -> dict:
+    return {"model": model, "attempt": attempt, "prompt_chars": len(str(contents)),
+            "temperature": getattr(gen_config, "temperature", None)}
+
+
 def gemini_generate(model: str, contents, gen_config, *, max_attempts: int = 3):
     """``generate_content`` with short exponential backoff on transient 5xx errors.
     ``model`` may be ``"auto"`` to auto-discover the newest flash model."""
     client = require_gemini()
-    model = resolve_gemini_model(model)
+    model = _route_gemini(resolve_gemini_model(model))
+    with metrics.GENERATE_SECONDS.time(model=model, wildness=metrics.wildness_label.get()):
+        return _gemini_attempts(client, model, contents, gen_config, max_attempts)
+
+
+def _gemini_once(client, model: str, contents, gen_config, attempt: int):
+    limiter("gemini", model).acquire_sync()
+    gen_config, cached_tokens = cached_prompt(client, model, gen_config)
+    with (breaker("gemini", model).guard(is_outage),
+          tracing.span("gemini.attempt",
+                       **_span_attrs(model, contents, gen_config, attempt)) as span):
+        try:
+            response = client.models.generate_content(
+                model=model, contents=contents,
+                config=_with_timeout(gen_config, time_budget()),
+            )
+        except Exception as exc:
+            # Threads can't be interrupted, so the HTTP timeout is the deadline here.
+            if _timed_out(exc):
+                raise DeadlineExceeded(f"Gemini {model} call outlived the request "
+                                       "deadline") from None
+            raise
+        span.set(response_chars=len(getattr(response, "text", None) or ""))
+    _record_usage(model, response, cached_tokens)
+    return response
+
+
+def _gemini_attempts(client, model: str, contents, gen_config, max_attempts: int):
     last_exc = None
     for attempt in range(max_attempts):
         try:
-            return client.models.generate_content(
-                model=model, contents=contents, config=gen_config
-            )
-        except genai_errors.APIError as exc:
+            return run_hedged(
+                "gemini", model,
+                lambda m, a=attempt: _gemini_once(client, m, contents, gen_config, a),
+                secondary=_hedge_model(model))
+        except _api_error() as exc:
             last_exc = exc
-            code = getattr(exc, "code", None)
-            if code in _RETRYABLE and attempt < max_attempts - 1:
-                wait = 1.5 * (2 ** attempt)
-                log.warning("Gemini %s on %s; retry %d/%d in %.1fs",
-                            code, model, attempt + 1, max_attempts, wait)
-                time.sleep(wait)
+            if forget_stale_prompts(exc):
                 continue
-            raise
+            wait = _retry_wait(exc, model, attempt, max_attempts)
+            if wait is None:
+                raise
+            time.sleep(wait)
     raise last_exc
+
+
+async def agemini_generate(model: str, contents, gen_config, *, max_attempts: int = 3):
+    """Async ``gemini_generate`` on the genai async client; backoff never blocks
+    the event loop."""
+    client = require_gemini()
+    model = _route_gemini(await aresolve_gemini_model(model))
+    with metrics.GENERATE_SECONDS.time(model=model, wildness=metrics.wildness_label.get()):
+        return await _agemini_attempts(client, model, contents, gen_config, max_attempts)
+
+
+async def _agemini_once(client, model: str, contents, gen_config, attempt: int):
+    await limiter("gemini", model).acquire()
+    gen_config, cached_tokens = await acached_prompt(client, model, gen_config)
+    with (breaker("gemini", model).guard(is_outage),
+          tracing.span("gemini.attempt",
+                       **_span_attrs(model, contents, gen_config, attempt)) as span):
+        budget = time_budget()
+        call = client.aio.models.generate_content(
+            model=model, contents=contents,
+            config=_with_timeout(gen_config, budget and budget + _TIMEOUT_MARGIN),
+        )
+        try:
+            response = await asyncio.wait_for(call, budget)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Gemini {model} call outlived the request deadline") from None
+        span.set(response_chars=len(getattr(response, "text", None) or ""))
+    _record_usage(model, response, cached_tokens)
+    return response
+
+
+async def _agemini_attempts(client, model: str, contents, gen_config, max_attempts: int):
+    last_exc = None
+    for attempt in range(max_attempts):
+        try:
+            return await hedger.arun(
+                "gemini", model,
+                lambda m, a=attempt: _agemini_once(client, m, contents, gen_config, a),
+                secondary=_hedge_model(model), on_hedge=hedge_counter("gemini", model),
+                on_cancel=book_cancelled("gemini"))
+        except _api_error() as exc:
+            last_exc = exc
+            if forget_stale_prompts(exc):
+                continue
+            wait = _retry_wait(exc, model, attempt, max_attempts)
+            if wait is None:
+                raise
+            await asyncio.sleep(wait)
+    raise last_exc
+
+
+async def agemini_generate_stream(model: str, contents, gen_config, *, max_attempts: int = 3):
+    """Streaming ``agemini_generate``: yields response chunks as Gemini produces them.
+    Transient 5xx errors are retried only before the first chunk arrives — once text
+    has been handed to the caller a restart would duplicate it. For the same reason
+    streamed calls are never hedged."""
+    client = require_gemini()
+    model = _route_gemini(await aresolve_gemini_model(model))
+    timer = metrics.GENERATE_SECONDS.time(model=model, wildness=metrics.wildness_label.get())
+    with timer:
+        async for chunk in _agemini_stream_attempts(client, model, contents, gen_config,
+                                                    max_attempts):
+            yield chunk
+
+
+async def _agemini_stream_attempts(client, model: str, contents, gen_config, max_attempts: int):
+    for attempt in range(max_attempts):
+        started = False
+        await limiter("gemini", model).acquire()
+        call_config, cached_tokens = await acached_prompt(client, model, gen_config)
+        try:
+            with (breaker("gemini", model).guard(is_outage),
+                  tracing.span("gemini.attempt", stream=True,
+                               **_span_attrs(model, contents, gen_config, attempt)) as span):
+                stream = await client.aio.models.generate_content_stream(
+                    model=model, contents=contents,
+                    config=_with_timeout(call_config, time_budget()),
+                )
+                last, size = None, 0
+                async for chunk in stream:
+                    started = True
+                    last = chunk
+                    size += len(getattr(chunk, "text", None) or "")
+                    yield chunk
+                span.set(response_chars=size)
+            if last is not None:
+                # usage_metadata is cumulative on the final chunk
+                _record_usage(model, last, cached_tokens)
+            return
+        except _api_error() as exc:
+            if not started and forget_stale_prompts(exc):
+                continue
+            wait = None if started else _retry_wait(exc, model, attempt, max_attempts)
+            if wait is None:
+                raise
+            await asyncio.sleep(wait)
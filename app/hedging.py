@@ -0,0 +1,165 @@
+"""Hedged provider requests: cut tail latency by racing a late call with a duplicate.
+
+``Hedger`` tracks a rolling window of successful call latencies per (provider, model).
+Once a model has enough samples, a call that is still running after that model's
+rolling ``quantile`` (p90 by default, clamped to ``[min_delay, max_delay]``) gets a
+duplicate — possibly to a secondary model — and whichever finishes first wins; the
+other is cancelled (async) or left to finish and discarded (threads can't be
+interrupted). If the first to finish fails, the other is still awaited, so a hedge
+never turns a success into a failure. A cancelled racer may already have been billed
+by the provider, so ``on_cancel(model, winner)`` lets the caller book an estimate for
+it. A hedge's latency is measured from when it was launched, not from the original
+call.
+
+Hedges are capped by ``budget``: at most that fraction of calls may fire one, so a
+provider-wide slowdown can't double the load on it.
+
+Kept free of ``config`` imports, like ``limits``; ``config`` builds the instance.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Hedger:
+    def __init__(self, enabled: bool = False, quantile: float = 0.9, budget: float = 0.1,
+                 min_delay: float = 0.5, max_delay: float = 30.0, window: int = 200,
+                 min_samples: int = 20):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedged = 0
+        self._latency: dict[tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+
+    def observe(self, provider: str, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._latency.get((provider, model))
+            if samples is None:
+                samples = self._latency[(provider, model)] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def threshold(self, provider: str, model: str) -> float | None:
+        """Seconds to wait before hedging, or ``None`` while the model is unmeasured."""
+        with self._lock:
+            samples = sorted(self._latency.get((provider, model), ()))
+        if len(samples) < self.min_samples:
+            return None
+        rank = samples[min(len(samples) - 1, math.ceil(self.quantile * len(samples)) - 1)]
+        return min(self.max_delay, max(self.min_delay, rank))
+
+    def _delay(self, provider: str, model: str) -> float | None:
+        with self._lock:
+            self.calls += 1
+        return self.threshold(provider, model) if self.enabled else None
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "hedged": self.hedged,
+                    "models": {f"{p}:{m}": len(s) for (p, m), s in self._latency.items()}}
+
+    # ── async ────────────────────────────────────────────────────────────────────
+    async def arun(self, provider: str, model: str, call, secondary: str | None = None,
+                   on_hedge=None, on_cancel=None):
+        """Await ``call(model)``, hedging with ``call(secondary or model)`` if it runs
+        past the threshold. ``on_hedge(event, model)`` sees ``"fired"`` / ``"won"``;
+        ``on_cancel(model, winner)`` sees each racer cancelled because another won."""
+        delay = self._delay(provider, model)
+        started = time.perf_counter()
+        if delay is None:
+            result = await call(model)
+            self.observe(provider, model, time.perf_counter() - started)
+            return result
+
+        primary = asyncio.ensure_future(call(model))
+        racers = {primary: model}
+        launched = {primary: started}
+        pending = {primary}
+        error: BaseException | None = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and self._take_budget():
+                backup_model = secondary or model
+                if on_hedge:
+                    on_hedge("fired", backup_model)
+                backup = asyncio.ensure_future(call(backup_model))
+                racers[backup] = backup_model
+                launched[backup] = time.perf_counter()
+                pending.add(backup)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is not primary and on_hedge:
+                        on_hedge("won", racers[task])
+                    self.observe(provider, racers[task], time.perf_counter() - launched[task])
+                    for loser in pending:
+                        loser.cancel()
+                        if on_cancel:
+                            on_cancel(racers[loser], task.result())
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # ── sync ─────────────────────────────────────────────────────────────────────
+    def run(self, provider: str, model: str, call, secondary: str | None = None,
+            on_hedge=None):
+        """Blocking ``arun``: the racers run on a small thread pool. Nothing is
+        cancelled (the loser finishes and is billed as usual), so there's no
+        ``on_cancel``; ``config.run_hedged`` keeps a late loser's booking out of the
+        request's usage."""
+        delay = self._delay(provider, model)
+        started = time.perf_counter()
+        if delay is None:
+            result = call(model)
+            self.observe(provider, model, time.perf_counter() - started)
+            return result
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(thread_name_prefix="nbt-hedge")
+        primary = self._pool.submit(contextvars.copy_context().run, call, model)
+        done, _ = wait({primary}, timeout=delay)
+        if done or not self._take_budget():
+            result = primary.result()
+            self.observe(provider, model, time.perf_counter() - started)
+            return result
+
+        backup_model = secondary or model
+        if on_hedge:
+            on_hedge("fired", backup_model)
+        backup = self._pool.submit(contextvars.copy_context().run, call, backup_model)
+        launched = {primary: started, backup: time.perf_counter()}
+        racers = {primary: model, backup: backup_model}
+        pending = set(racers)
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is backup and on_hedge:
+                    on_hedge("won", backup_model)
+                self.observe(provider, racers[future], time.perf_counter() - launched[future])
+                return future.result()  # the loser finishes in the background
+        raise error
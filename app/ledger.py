@@ -0,0 +1,209 @@
+"""Token and cost ledger: what the providers billed us for, and budgets on it.
+
+``Ledger.record`` books one provider call — input and output tokens, plus its cost
+when the model has a price (USD per million input / output tokens) — into per-day
+(UTC), per-model totals and into the usage record of the request it served.
+
+With a token and/or cost budget set, ``pressure()`` is the fraction of the tightest
+budget already spent in the current window: the calendar day by default, or the
+last ``window`` seconds. The pipeline steps down as it nears 1 (see
+``pipeline._plan``) rather than running into the providers' own quotas.
+
+Totals are per worker process. With ``path`` set the daily totals persist as JSON
+across restarts; a rolling window starts empty.
+
+Kept free of ``config`` imports, like ``limits``; ``config`` builds the instance.
+"""
+import copy
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from .limits import Overloaded
+
+log = logging.getLogger("nbtgen.ledger")
+
+_FIELDS = ("calls", "input_tokens", "output_tokens", "tokens", "cost_usd")
+_DAYS_KEPT = 31
+
+
+class BudgetExhausted(Overloaded):
+    """The usage budget is spent and the request could not be served from cache.
+    An ``Overloaded`` so the web routes answer 503 + Retry-After for it too."""
+
+
+def _today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def _totals() -> dict:
+    return {f: 0.0 if f == "cost_usd" else 0 for f in _FIELDS}
+
+
+def _add(totals: dict, input_tokens: int, output_tokens: int, cost: float) -> None:
+    totals["calls"] += 1
+    totals["input_tokens"] += input_tokens
+    totals["output_tokens"] += output_tokens
+    totals["tokens"] += input_tokens + output_tokens
+    totals["cost_usd"] += cost
+
+
+def _merge(totals: dict, other: dict) -> None:
+    for f in _FIELDS:
+        totals[f] += other[f]
+
+
+def new_usage() -> dict:
+    """An empty per-request usage record, as ``record`` fills it."""
+    return {**_totals(), "models": {}}
+
+
+class Ledger:
+    def __init__(self, budget_tokens: int = 0, budget_cost: float = 0.0,
+                 window: float = 0.0, prices: dict | None = None, path: str = ""):
+        self.budget_tokens = budget_tokens
+        self.budget_cost = budget_cost
+        self.window = window
+        self.prices = prices or {}
+        self.path = path
+        self._days: dict[str, dict[str, dict]] = {}   # day -> "provider:model" -> totals
+        self._recent: deque = deque()                 # (monotonic, tokens, cost), rolling
+        self._window_tokens = 0
+        self._window_cost = 0.0
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if path:
+            self._load()
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        price = self.prices.get(model)
+        if not price:
+            return 0.0
+        return (input_tokens * price[0] + output_tokens * price[1]) / 1e6
+
+    def record(self, provider: str, model: str, input_tokens: int, output_tokens: int,
+               request: dict | None = None) -> None:
+        """Book one call into today's totals and, if given, a request's usage."""
+        cost = self.cost(model, input_tokens, output_tokens)
+        key = f"{provider}:{model}"
+        with self._lock:
+            day = self._days.setdefault(_today(), {})
+            _add(day.setdefault(key, _totals()), input_tokens, output_tokens, cost)
+            if request is not None:
+                _add(request, input_tokens, output_tokens, cost)
+                _add(request["models"].setdefault(key, _totals()),
+                     input_tokens, output_tokens, cost)
+            if self.window > 0:
+                self._recent.append((time.monotonic(), input_tokens + output_tokens, cost))
+                self._window_tokens += input_tokens + output_tokens
+                self._window_cost += cost
+            for old in sorted(self._days)[:-_DAYS_KEPT]:
+                del self._days[old]
+            self._unsaved += 1
+        if self.path and self._unsaved >= 50:
+            self.save()
+
+    def merge(self, usage: dict, into: dict | None) -> None:
+        """Add a usage record's totals into another request's record, if given. The
+        day totals already hold them (``record`` booked each call there)."""
+        if into is None:
+            return
+        with self._lock:
+            _merge(into, usage)
+            for key, totals in usage["models"].items():
+                _merge(into["models"].setdefault(key, _totals()), totals)
+
+    def settle(self, usage: dict) -> dict:
+        """A copy of a request's usage record, safe to serialize while calls that
+        outlive the request (a discarded speculative round) keep booking into it."""
+        with self._lock:
+            out = copy.deepcopy(usage)
+        for totals in (out, *out["models"].values()):
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return out
+
+    def spent(self) -> tuple[int, float]:
+        """Tokens and cost booked in the current budget window."""
+        with self._lock:
+            if self.window > 0:
+                horizon = time.monotonic() - self.window
+                while self._recent and self._recent[0][0] < horizon:
+                    _, tokens, cost = self._recent.popleft()
+                    self._window_tokens -= tokens
+                    self._window_cost -= cost
+                return self._window_tokens, self._window_cost
+            day = self._days.get(_today(), {}).values()
+            return sum(t["tokens"] for t in day), sum(t["cost_usd"] for t in day)
+
+    def pressure(self) -> float:
+        """Fraction of the tightest budget spent in the window; 0 without budgets."""
+        if self.budget_tokens <= 0 and self.budget_cost <= 0:
+            return 0.0
+        tokens, cost = self.spent()
+        levels = []
+        if self.budget_tokens > 0:
+            levels.append(tokens / self.budget_tokens)
+        if self.budget_cost > 0:
+            levels.append(cost / self.budget_cost)
+        return max(levels)
+
+    def retry_after(self) -> int:
+        """Seconds until the window next frees budget: the next UTC midnight, or
+        when the oldest call in a rolling window ages out."""
+        if self.window > 0:
+            with self._lock:
+                oldest = self._recent[0][0] if self._recent else time.monotonic()
+            return max(1, int(oldest + self.window - time.monotonic()) + 1)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                             datetime.time(), tzinfo=datetime.timezone.utc)
+        return max(1, int((midnight - now).total_seconds()) + 1)
+
+    def snapshot(self) -> dict:
+        """The budget state and per-day, per-model totals, newest day first."""
+        tokens, cost = self.spent()
+        with self._lock:
+            days = {d: copy.deepcopy(self._days[d]) for d in sorted(self._days, reverse=True)}
+        for models in days.values():
+            for totals in models.values():
+                totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return {"budget": {"tokens": self.budget_tokens, "cost_usd": self.budget_cost,
+                           "window": self.window or "day", "spent_tokens": tokens,
+                           "spent_cost_usd": round(cost, 6),
+                           "pressure": round(self.pressure(), 4)},
+                "days": days}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self._days)
+            self._unsaved = 0
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(data)
+        os.replace(tmp, self.path)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            self._days = {day: {key: {**_totals(), **totals} for key, totals in models.items()}
+                          for day, models in data.items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, AttributeError) as exc:
+            log.warning("Ignoring unreadable usage ledger %s: %s", self.path, exc)
+            return
+        log.info("Loaded usage for %d day(s) from %s", len(self._days), self.path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+            self._recent.clear()
+            self._window_tokens = 0
+            self._window_cost = 0.0
@@ -0,0 +1,253 @@
+"""Client-side rate limiting and admission control.
+
+- ``TokenBucket`` / ``ProviderLimiter`` pace calls to one provider model so bursts
+  stay under its requests-per-minute and tokens-per-minute quotas instead of
+  tripping 429s (which ``config._RETRYABLE`` deliberately does not retry). Token
+  usage is only known after a call, so it is charged afterwards and the bucket may
+  go into debt; later callers then wait for it to refill.
+- ``Admission`` bounds how many pipeline runs execute at once, with a FIFO queue of
+  limited depth and wait in front. When the queue is full or a caller waits too
+  long it raises ``Overloaded`` carrying a Retry-After hint.
+- ``CircuitBreaker`` stops calling a provider model that keeps failing or crawling:
+  once the rolling failure rate (errors plus calls slower than ``slow_call``) trips
+  it, calls raise ``CircuitOpen`` immediately for ``cooldown`` seconds, then a single
+  half-open probe decides whether to close it again or re-open.
+
+Kept free of ``config`` imports; ``config`` and ``pipeline`` build the instances.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Overloaded(RuntimeError):
+    """The server is at capacity; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Overloaded):
+    """A provider model's circuit breaker is open; the call was not attempted.
+    An ``Overloaded`` so the web routes answer 503 + Retry-After for it too."""
+
+
+class TokenBucket:
+    """``per_minute`` units refilling continuously, up to a burst of ``burst``."""
+
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take ``amount`` now (possibly into debt) and return how long the caller
+        must wait before the bucket is back out of debt. FIFO by construction."""
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+
+class ProviderLimiter:
+    """RPM + TPM pacing for one provider model; a limit of 0 means unlimited."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def _delay(self) -> float:
+        delay = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(0))  # wait out any token debt
+        return delay
+
+    async def acquire(self) -> None:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self) -> None:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+
+    def charge(self, tokens: int) -> None:
+        if self.tokens and tokens:
+            self.tokens.reserve(tokens)
+
+
+class Admission:
+    """At most ``max_inflight`` concurrent runs; up to ``max_queue`` more wait in
+    FIFO order for at most ``max_wait`` seconds. ``max_inflight`` 0 disables it.
+    Lives on one event loop."""
+
+    def __init__(self, max_inflight: int, max_queue: int, max_wait: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.inflight = 0
+        self._waiters: deque = deque()  # (future, on_position)
+        self._avg_run = 10.0  # EMA of run seconds, for Retry-After hints
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def full(self) -> bool:
+        return (self.max_inflight > 0 and self.inflight >= self.max_inflight
+                and len(self._waiters) >= self.max_queue)
+
+    def retry_after(self) -> int:
+        ahead = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_run * ahead / max(1, self.max_inflight)))
+
+    def _announce(self) -> None:
+        for pos, (_, on_position) in enumerate(self._waiters, 1):
+            if on_position:
+                on_position(pos)
+
+    def _release(self) -> None:
+        while self._waiters:
+            fut, _ = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # hand our slot straight to the next waiter
+                self._announce()
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self, on_position=None):
+        """Hold one run slot for the duration of the block. ``on_position(n)`` is
+        called with the caller's 1-based queue position whenever it changes."""
+        if self.max_inflight <= 0:
+            yield
+            return
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise Overloaded("Server is busy; please retry shortly.", self.retry_after())
+            fut = asyncio.get_running_loop().create_future()
+            entry = (fut, on_position)
+            self._waiters.append(entry)
+            if on_position:
+                on_position(len(self._waiters))
+            try:
+                await asyncio.wait_for(fut, self.max_wait)
+            except asyncio.TimeoutError:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    self._announce()
+                raise Overloaded("Timed out waiting for capacity; please retry.",
+                                 self.retry_after()) from None
+            except asyncio.CancelledError:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    self._announce()
+                elif fut.done() and not fut.cancelled():
+                    self._release()  # the slot reached us just as we were cancelled
+                raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_run = 0.8 * self._avg_run + 0.2 * (time.monotonic() - started)
+            self._release()
+
+
+class CircuitBreaker:
+    """Closed → open → half-open breaker over the last ``window`` call outcomes."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, error_rate: float = 0.5, slow_call: float = 15.0,
+                 window: int = 20, min_calls: int = 10, cooldown: float = 30.0):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.rejected = 0
+        self._outcomes: deque = deque(maxlen=window)  # True = failure
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def failure_rate(self) -> float:
+        with self._lock:
+            return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _admit(self) -> bool:
+        """Whether a call may go ahead; ``True`` also means it is the half-open probe."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            wait = max(1, math.ceil(self.cooldown - (time.monotonic() - self._opened_at)))
+        raise CircuitOpen(f"{self.name} is unavailable; retry in {wait}s", wait)
+
+    def _record(self, failed: bool, probe: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+                if failed:
+                    self._opened_at = time.monotonic()  # back to open for another cooldown
+                else:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                return
+            if self._opened_at is not None:
+                return  # a call that started before the breaker opened
+            self._outcomes.append(failed)
+            if (len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.error_rate):
+                self._opened_at = time.monotonic()
+
+    def allow(self) -> bool:
+        """Non-raising peek: would a call be attempted right now?"""
+        return self.state != self.OPEN and not (self.state == self.HALF_OPEN and self._probing)
+
+    @contextmanager
+    def guard(self, is_failure=None):
+        """Wrap one provider call (sync or async body). Raises ``CircuitOpen`` up
+        front while open; an exception (for which ``is_failure(exc)`` holds, if
+        given) or a call slower than ``slow_call`` counts as a failure. Cancellation
+        counts as neither."""
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as exc:
+            self._record(is_failure is None or is_failure(exc), probe)
+            raise
+        except BaseException:
+            if probe:
+                with self._lock:
+                    self._probing = False
+            raise
+        self._record(time.monotonic() - started >= self.slow_call, probe)
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failure_rate": round(self.failure_rate(), 3),
+                "calls": len(self._outcomes), "rejected": self.rejected}
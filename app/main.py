@@ -3,25 +3,63 @@
 Routes:
 - GET  /                — the form
 - POST /generate        — no-JS fallback: runs the pipeline once, server-renders
-- GET  /generate-stream — SSE: streams status, then the final result in-stream
+- GET  /generate-stream — SSE: streams status and draft candidates, then the final
+                          result in-stream
                           (the browser renders that result directly — it never
                           re-submits, so the pipeline runs exactly once)
+                          Both take ``another=1``: a different idea, served from the
+                          unserved runner-ups with no provider calls when possible
+- POST /generate-batch  — JSON: one idea per topic, several topics per provider call
+- GET  /healthz         — liveness, provider circuit-breaker states and prewarm results
+- GET  /metrics         — Prometheus text-format metrics
+- GET  /adaptive        — pass-rate stats and the N/round plan per wildness bucket
+- GET  /usage           — tokens and cost per model per day, and the budget state
+
+Generation results carry the request's own provider ``usage``.
+
+Both generation routes await the async pipeline directly, so a single worker can
+hold hundreds of concurrent generations without tying up executor threads. Identical
+concurrent requests share one pipeline run, unless they ask for a ``fresh`` one (see
+``pipeline.astream_idea``).
 """
 import asyncio
 import json
 import os
+from contextlib import aclosing, asynccontextmanager
 
 from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel
 
-from . import config
-from .pipeline import generate_idea
+from . import adaptive, config, metrics, pipeline, tracing
+from .modules import dedup
+from .pipeline import agenerate_ideas_batch, astream_idea
 
 log = config.log.getChild("web")
 
-app = FastAPI(title="Never-Before-Thought Generator", version=config.VERSION)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up before the worker accepts traffic, so the first user request doesn't
+    # pay for model discovery and TLS handshakes.
+    if config.PREWARM:
+        app.state.prewarm = await config.prewarm()
+    refresher = None
+    if config.MODEL_REFRESH > 0 and config.auto_models():
+        refresher = asyncio.create_task(config.arefresh_models_forever(config.MODEL_REFRESH))
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    await config.aclose_http()
+    dedup.index.save()
+    adaptive.controller.save()
+    config.ledger.save()
+
+
+app = FastAPI(title="Never-Before-Thought Generator", version=config.VERSION,
+              lifespan=lifespan)
 
 _BASE = os.path.dirname(__file__)
 app.mount("/static", StaticFiles(directory=os.path.join(_BASE, "../static")), name="static")
@@ -45,61 +83,135 @@ def _clamp_wildness(wildness) -> int:
         return 50
 
 
+def _clamp_deadline(deadline: float | None) -> float | None:
+    """A caller's time budget in seconds, capped at ``NBT_MAX_DEADLINE``; ``None``
+    (or a non-positive value) means the server default."""
+    if deadline is None or deadline <= 0:
+        return None
+    return min(deadline, config.MAX_DEADLINE)
+
+
+def _admit():
+    """Refuse up front, before any streaming starts, when the run queue is full."""
+    if pipeline.admission.full():
+        raise HTTPException(status_code=503, detail="Server is busy; please retry shortly.",
+                            headers={"Retry-After": str(pipeline.admission.retry_after())})
+
+
 @app.get("/")
 def read_index(request: Request):
     return templates.TemplateResponse(request, "index.html", {"idea": None})
 
 
 @app.post("/generate")
-def generate(request: Request, topic: str = Form(...), wildness: int = Form(50)):
+async def generate(request: Request, topic: str = Form(...), wildness: int = Form(50),
+                   fresh: bool = Form(False), deadline: float | None = Form(None),
+                   another: bool = Form(False)):
     topic = _clean_topic(topic)
     wildness = _clamp_wildness(wildness)
-    try:
-        data = generate_idea(topic, wildness=wildness)
-    except Exception as exc:
-        log.exception("generation failed")
-        raise HTTPException(status_code=500, detail=str(exc))
+    _admit()
+    with tracing.trace("POST /generate", topic=topic, wildness=wildness):
+        async for event in astream_idea(topic, wildness, fresh=fresh,
+                                        deadline=_clamp_deadline(deadline),
+                                        another=another):
+            pass  # no-JS fallback: only the terminal event matters
+    if "retry_after" in event:
+        raise HTTPException(status_code=503, detail=event["message"],
+                            headers={"Retry-After": str(event["retry_after"])})
+    if event.get("deadline_exceeded"):
+        raise HTTPException(status_code=504, detail=event["message"])
+    if event["type"] == "error":
+        raise HTTPException(status_code=500, detail=event["message"])
     return templates.TemplateResponse(request, "index.html", {
-        "topic": topic, "wildness": wildness, **data,
+        "topic": topic, "wildness": wildness, **event["data"],
     })
 
 
 @app.get("/generate-stream")
-async def generate_stream(topic: str, wildness: int = 50):
-    """Server-Sent Events: status updates followed by the final result."""
+async def generate_stream(request: Request, topic: str, wildness: int = 50,
+                          fresh: bool = False, deadline: float | None = None,
+                          another: bool = False):
+    """Server-Sent Events: status updates followed by the final result.
+    ``fresh=1`` bypasses the result cache; ``another=1`` asks for a different idea,
+    served at once from the unserved runner-ups when there are any; ``deadline``
+    (seconds) sets the request's time budget. While queued for capacity the stream
+    reports the request's position as status events. A quiet stream gets a
+    keep-alive comment every ``NBT_SSE_HEARTBEAT`` seconds. The client is checked
+    every ``NBT_SSE_DISCONNECT_POLL`` seconds of quiet, and at each heartbeat; a client
+    found gone then (or on any write) detaches, which cancels the run unless another
+    client shares it."""
     topic = _clean_topic(topic)
     wildness = _clamp_wildness(wildness)
+    _admit()
 
     async def event_generator():
-        loop = asyncio.get_running_loop()
-        queue: asyncio.Queue = asyncio.Queue()
-
-        def status_callback(message: str):
-            # Called from the worker thread — hop back onto the event loop safely.
-            loop.call_soon_threadsafe(
-                queue.put_nowait, {"type": "status", "message": message}
-            )
-
-        async def run():
-            try:
-                result = await asyncio.to_thread(
-                    generate_idea, topic, wildness, status_callback
-                )
-                await queue.put({"type": "result", "data": result})
-            except Exception as exc:
-                log.exception("streamed generation failed")
-                await queue.put({"type": "error", "message": str(exc)})
-            finally:
-                await queue.put(None)  # sentinel
-
-        task = asyncio.create_task(run())
-        try:
-            while True:
-                event = await queue.get()
-                if event is None:
-                    break
-                yield f"data: {json.dumps(event)}\n\n"
-        finally:
-            await task
+        with tracing.trace("GET /generate-stream", topic=topic, wildness=wildness) as trace:
+            sent = 0
+            events = astream_idea(topic, wildness, fresh=fresh,
+                                  deadline=_clamp_deadline(deadline),
+                                  heartbeat=config.SSE_HEARTBEAT or None, another=another,
+                                  poll=config.SSE_DISCONNECT_POLL or None)
+            async with aclosing(events):  # detach from the run as soon as we stop
+                async for event in events:
+                    if event["type"] in ("heartbeat", "tick"):
+                        if await request.is_disconnected():
+                            log.info("SSE client for %r went away", topic)
+                            return
+                        if event["type"] == "heartbeat":
+                            yield ": keep-alive\n\n"
+                        continue
+                    with tracing.span("sse.send", event=event["type"]):
+                        yield f"data: {json.dumps(event)}\n\n"
+                    sent += 1
+            if trace is not None:
+                trace.root.set(events=sent)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+class BatchRequest(BaseModel):
+    topics: list[str]
+    wildness: int = 50
+    fresh: bool = False
+
+
+@app.post("/generate-batch")
+async def generate_batch(body: BatchRequest):
+    """One idea per topic; results come back in request order, each shaped like a
+    ``/generate`` result plus ``topic`` (or ``topic`` + ``error``). Topics share
+    provider calls, so ``usage`` covers the whole batch."""
+    if not body.topics or len(body.topics) > config.BATCH_MAX_TOPICS:
+        raise HTTPException(status_code=422,
+                            detail=f"Send 1–{config.BATCH_MAX_TOPICS} topics.")
+    topics = [_clean_topic(t) for t in body.topics]
+    _admit()
+    with config.usage_scope() as usage:
+        results = await agenerate_ideas_batch(topics, _clamp_wildness(body.wildness),
+                                              fresh=body.fresh)
+    return {"results": [{"topic": t, **r} for t, r in zip(topics, results)],
+            "usage": config.ledger.settle(usage)}
+
+
+@app.get("/healthz")
+def healthz():
+    """Always 200 while the process serves; ``status`` is ``"degraded"`` while any
+    provider circuit is open or probing, so a dashboard can tell outage from crash."""
+    breakers = config.breaker_states()
+    degraded = any(b["state"] != "closed" for b in breakers.values())
+    return {"status": "degraded" if degraded else "ok", "version": config.VERSION,
+            "breakers": breakers, "prewarm": getattr(app.state, "prewarm", None)}
+
+
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/adaptive")
+def read_adaptive():
+    return adaptive.controller.snapshot()
+
+
+@app.get("/usage")
+def read_usage():
+    return config.ledger.snapshot()
@@ -0,0 +1,207 @@
+"""Dependency-free in-process metrics, rendered in Prometheus text format at
+``GET /metrics``.
+
+Counters and histograms are keyed by label values and guarded by one lock each; an
+observation is a dict lookup plus a bisect, so instrumenting the hot path costs
+microseconds. Provider-level code doesn't know which request it serves, so the
+pipeline sets ``wildness_label`` (a context variable) and provider calls read it.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Wildness bucket of the request the current task/thread is serving ("-" = none).
+wildness_label: ContextVar[str] = ContextVar("nbt_wildness_label", default="-")
+
+_DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return super().render() + [f"{self.name}{_labels(self.label_names, k)} {v:g}"
+                                   for k, v in items]
+
+
+class Gauge(_Metric):
+    """A value read at scrape time from ``fn() -> {label_values_tuple: value}``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), fn=None):
+        super().__init__(name, doc, labels)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        items = self.fn().items() if self.fn else ()
+        return super().render() + [f"{self.name}{_labels(self.label_names, k)} {v:g}"
+                                   for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets=_DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        lines = super().render()
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _labels(self.label_names, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+
+def register(metric: _Metric) -> _Metric:
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Zero every series (tests)."""
+    for metric in _registry:
+        metric.clear()
+
+
+# ─── The metrics NBT-Gen records ─────────────────────────────────────────────────
+GENERATE_SECONDS = register(Histogram(
+    "nbt_generate_seconds", "Gemini generate call latency, retries included.",
+    ("model", "wildness")))
+JUDGE_SECONDS = register(Histogram(
+    "nbt_judge_seconds", "Mistral judge call latency.", ("model", "wildness")))
+REQUEST_SECONDS = register(Histogram(
+    "nbt_request_seconds", "End-to-end pipeline latency for uncached requests.",
+    ("model", "wildness")))
+REQUESTS = register(Counter(
+    "nbt_requests_total", "Uncached pipeline runs.", ("model", "wildness")))
+ROUNDS = register(Counter(
+    "nbt_rounds_total", "Generate+judge rounds (divide by nbt_requests_total for "
+    "rounds per request).", ("model", "wildness")))
+RETRIES = register(Counter(
+    "nbt_provider_retries_total", "Provider calls retried after a transient 5xx.",
+    ("provider", "model", "code", "wildness")))
+QUOTA_ERRORS = register(Counter(
+    "nbt_provider_429_total", "Provider calls rejected with 429 (quota).",
+    ("provider", "model", "wildness")))
+JUDGE_FALLBACKS = register(Counter(
+    "nbt_judge_fallbacks_total", "Judge calls that fell back to the local heuristic.",
+    ("model", "wildness")))
+DEGRADED_RESULTS = register(Counter(
+    "nbt_degraded_results_total", "Served results with scoring_degraded=true.",
+    ("model", "wildness")))
+HEDGES_FIRED = register(Counter(
+    "nbt_hedges_fired_total", "Provider calls that outlived the hedge threshold and got "
+    "a duplicate.", ("provider", "model", "backup")))
+HEDGES_WON = register(Counter(
+    "nbt_hedges_won_total", "Hedged calls where the duplicate answered first.",
+    ("provider", "model", "backup")))
+CANCELLED_RUNS = register(Counter(
+    "nbt_cancelled_runs_total", "Pipeline runs cancelled because every client waiting "
+    "on them disconnected.", ("model", "wildness")))
+TOKENS_SAVED = register(Counter(
+    "nbt_cancelled_tokens_saved_total", "Estimated provider tokens not spent thanks to "
+    "cancelled runs (mean full-run cost minus what the run had spent).",
+    ("model", "wildness")))
+PROMPT_TOKENS_SAVED = register(Counter(
+    "nbt_prompt_cache_tokens_saved_total", "Input tokens served from a provider-side "
+    "prompt cache instead of being sent and billed in full.", ("provider", "model")))
+SALVAGED = register(Counter(
+    "nbt_salvaged_candidates_total", "Candidates recovered from a truncated or malformed "
+    "generator response.", ("model", "wildness")))
+TOP_UPS = register(Counter(
+    "nbt_top_up_calls_total", "Follow-up generator calls for the candidates a round came "
+    "back short of.", ("model", "wildness")))
+INVENTORY_SERVED = register(Counter(
+    "nbt_inventory_served_total", "\"Another one\" requests answered from the runner-up "
+    "inventory with no provider calls.", ("model", "wildness")))
+INVENTORY_REFILLS = register(Counter(
+    "nbt_inventory_refills_total", "Background runs started to restock a low runner-up "
+    "inventory.", ("model", "wildness")))
+BUDGET_STEP_DOWNS = register(Counter(
+    "nbt_budget_step_downs_total", "Requests served a cheaper plan because the usage budget "
+    "is running out, by step (fewer_candidates, single_round, cache_only).",
+    ("step", "wildness")))
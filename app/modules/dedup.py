@@ -0,0 +1,189 @@
+"""Near-duplicate suppression for served ideas (MinHash over word shingles + LSH).
+
+The generator is asked for novelty but has no memory, and neither does the judge,
+so the same paragraph can come back across rounds or across users. Every idea we
+serve is added to ``index``; before each judge call, candidates whose estimated
+Jaccard similarity to a recently served idea reaches ``NBT_DEDUP_THRESHOLD`` are
+pulled out and scored as repeats without spending judge tokens on them.
+
+Signatures are ``NBT_DEDUP_PERMS`` min-hashes computed in one vectorized NumPy pass
+(multiply-shift hashing over uint64, wrapping by design). LSH banding splits each
+signature into ``NBT_DEDUP_BANDS`` bands so a query only compares against ideas
+sharing at least one band. Memory is bounded to the ``NBT_DEDUP_SIZE`` most recent
+ideas; with ``NBT_DEDUP_PATH`` set, signatures persist to a ``.npz`` file.
+
+NumPy is imported, and the hash parameters and any saved signatures loaded, when the
+index is first used rather than at import, keeping it off the cold-start path.
+"""
+import re
+import threading
+import zlib
+from collections import deque
+from typing import TYPE_CHECKING
+
+from .. import config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = config.log.getChild("dedup")
+
+_SHINGLE = 3  # words per shingle
+
+
+def _shingles(text: str) -> "np.ndarray":
+    import numpy as np
+    words = re.findall(r"\w+", text.lower())
+    grams = {" ".join(words[i:i + _SHINGLE])
+             for i in range(max(1, len(words) - _SHINGLE + 1))}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64,
+                       count=len(grams))
+
+
+class NearDupIndex:
+    """Bounded MinHash/LSH index of recently served texts. Thread-safe."""
+
+    def __init__(self, max_size: int, threshold: float, perms: int = 64, bands: int = 16,
+                 path: str = "", seed: int = 7):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = perms // bands
+        self.path = path
+        self._perms = perms
+        self._seed = seed
+        self._a: "np.ndarray | None" = None           # built by _prepare on first use
+        self._b: "np.ndarray | None" = None
+        self._order: deque = deque()                 # ids, oldest first
+        self._sigs: dict[int, "np.ndarray"] = {}
+        self._buckets: dict[tuple[int, bytes], set[int]] = {}
+        self._next_id = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+
+    def _prepare(self) -> None:
+        """Build the hash parameters and load ``path``, once, on first use."""
+        if self._a is not None:
+            return
+        import numpy as np  # deferred: keeps NumPy off the cold-start path
+        with self._prepare_lock:
+            if self._a is not None:
+                return
+            rng = np.random.default_rng(self._seed)
+            a = rng.integers(1, 2 ** 63, size=self._perms, dtype=np.uint64) | np.uint64(1)
+            self._b = rng.integers(0, 2 ** 63, size=self._perms, dtype=np.uint64)
+            if self.path:
+                self._load()
+            self._a = a  # last: it marks the index ready
+
+    def signature(self, text: str) -> "np.ndarray":
+        import numpy as np
+        self._prepare()
+        x = _shingles(text)
+        # (perms × shingles) multiply-shift hashes; uint64 overflow is intended.
+        hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def _band_keys(self, sig: "np.ndarray"):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _similar(self, sig: "np.ndarray") -> float:
+        # Caller holds ``_lock``.
+        import numpy as np
+        ids = set()
+        for key in self._band_keys(sig):
+            ids |= self._buckets.get(key, set())
+        if not ids:
+            return 0.0
+        others = np.stack([self._sigs[i] for i in ids])
+        return float((others == sig).mean(axis=1).max())
+
+    def similarity(self, text: str, sig: "np.ndarray | None" = None) -> float:
+        """Highest estimated Jaccard similarity between ``text`` and any indexed text.
+        ``sig`` is ``text``'s signature when the caller already has it."""
+        if self.max_size <= 0:
+            return 0.0
+        sig = self.signature(text) if sig is None else sig
+        with self._lock:
+            return self._similar(sig)
+
+    def is_repeat(self, text: str, sig: "np.ndarray | None" = None) -> bool:
+        return self.similarity(text, sig) >= self.threshold
+
+    def add(self, text: str, sig: "np.ndarray | None" = None) -> None:
+        """Index ``text`` unless it is already a near-duplicate of an indexed text."""
+        if self.max_size <= 0:
+            return
+        sig = self.signature(text) if sig is None else sig
+        with self._lock:
+            # Checked under the lock, so two racing adds of one text index it once.
+            if self._similar(sig) >= self.threshold:
+                return
+            self._insert(sig)
+            self._unsaved += 1
+            due = bool(self.path) and self._unsaved >= 50
+            if due:
+                self._unsaved = 0  # claimed here, so one add of the fifty saves
+        if due:
+            self.save()
+
+    def _insert(self, sig: "np.ndarray") -> None:
+        # Caller holds ``_lock``.
+        idx = self._next_id
+        self._next_id += 1
+        self._sigs[idx] = sig
+        self._order.append(idx)
+        for key in self._band_keys(sig):
+            self._buckets.setdefault(key, set()).add(idx)
+        while len(self._order) > self.max_size:
+            old = self._order.popleft()
+            for key in self._band_keys(self._sigs.pop(old)):
+                bucket = self._buckets[key]
+                bucket.discard(old)
+                if not bucket:
+                    del self._buckets[key]
+
+    def save(self) -> None:
+        if not self.path or self._a is None:  # never used: the file is as loaded
+            return
+        import numpy as np
+        with self._lock:
+            sigs = [self._sigs[i] for i in self._order]
+            self._unsaved = 0
+        np.savez_compressed(self.path, sigs=np.array(sigs, dtype=np.uint64).reshape(
+            len(sigs), self.bands * self.rows))
+
+    def _load(self) -> None:
+        import numpy as np
+        try:
+            with np.load(self.path) as data:
+                sigs = data["sigs"]
+        except FileNotFoundError:
+            return
+        except Exception as exc:  # a corrupt file must never take the app down
+            log.warning("Ignoring unreadable dedup index %s: %s", self.path, exc)
+            return
+        if sigs.ndim != 2 or sigs.shape[1] != self.bands * self.rows:
+            log.warning("Ignoring dedup index %s with mismatched shape %s", self.path, sigs.shape)
+            return
+        with self._lock:
+            for sig in sigs[-self.max_size:] if self.max_size > 0 else []:
+                self._insert(sig)
+        log.info("Loaded %d served-idea signatures from %s", len(self._order), self.path)
+
+    def clear(self) -> None:
+        self._prepare()  # so a later first use doesn't reload what was cleared
+        with self._lock:
+            self._order.clear()
+            self._sigs.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        self._prepare()
+        return len(self._order)
+
+
+index = NearDupIndex(config.DEDUP_SIZE, config.DEDUP_THRESHOLD, perms=config.DEDUP_PERMS,
+                     bands=config.DEDUP_BANDS, path=config.DEDUP_PATH)
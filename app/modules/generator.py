@@ -6,13 +6,26 @@ the assumption it twists and the divergence move used. This replaces the old
 separate miner + per-candidate composer calls: far fewer API calls, lower latency,
 and the model can self-enforce variety across candidates. A downstream judge still
 selects the best of the N.
+
+``astream_candidates`` is the streaming variant: it feeds Gemini's streamed JSON
+through ``_ArrayStream`` and yields each candidate the moment its object closes.
+The same scanner salvages every complete object from a truncated or malformed
+response (common at high temperature) instead of failing the round; the pipeline
+then tops up the missing count with a smaller follow-up call.
+
+Each call runs in a ``generate`` tracing span (round, n, temperature); parsing the
+structured response gets its own ``generate.parse`` span.
 """
 import json
+import re
+from typing import TYPE_CHECKING
 
-from google.genai import types
 from pydantic import BaseModel
 
-from .. import config
+from .. import config, metrics, tracing
+
+if TYPE_CHECKING:
+    from google.genai import types
 
 log = config.log.getChild("generator")
 
@@ -72,53 +85,233 @@ class _Candidate(BaseModel):
     idea: str
 
 
-def generate_candidates(topic: str, wildness: int = 50, n: int | None = None,
-                        round_idx: int = 0) -> list[dict]:
-    """Mine + compose ``n`` candidate ideas in a single structured Gemini call."""
-    n = n or config.N_CANDIDATES
-    temp = config.wildness_to_temperature(wildness)
+class _BatchCandidate(_Candidate):
+    topic: int  # index into the batch's topic list
+
+
+def _gen_config(wildness: int, schema=_Candidate) -> "types.GenerateContentConfig":
+    from google.genai import types  # deferred: keeps the SDK off the cold-start path
+    return types.GenerateContentConfig(
+        system_instruction=SYSTEM_INSTRUCTION,
+        temperature=config.wildness_to_temperature(wildness),
+        top_p=0.95,
+        response_mime_type="application/json",
+        response_schema=list[schema],
+    )
+
+
+def _request(topic: str, wildness: int, n: int) -> tuple[str, "types.GenerateContentConfig"]:
+    """Prompt + structured-output config shared by the sync and async paths."""
     prompt = (
         f"Topic: {topic}\n"
         f"Wildness: {wildness}/100\n"
         f"Produce exactly {n} candidate ideas, each using a different divergence move."
     )
-    response = config.gemini_generate(
-        model=config.GEMINI_COMPOSER_MODEL,
-        contents=prompt,
-        gen_config=types.GenerateContentConfig(
-            system_instruction=SYSTEM_INSTRUCTION,
-            temperature=temp,
-            top_p=0.95,
-            response_mime_type="application/json",
-            response_schema=list[_Candidate],
-        ),
-    )
-    candidates = _extract(response)
+    return prompt, _gen_config(wildness)
+
+
+def _finish(response, round_idx: int, temp: float) -> list[dict]:
+    with tracing.span("generate.parse") as span:
+        candidates = _extract(response)
+        span.set(candidates=len(candidates))
     if not candidates:
         raise RuntimeError("Generator produced no candidates")
     log.info("Generated %d candidates (round %d, temp≈%.2f)", len(candidates), round_idx, temp)
     return candidates
 
 
-def _extract(response) -> list[dict]:
-    """Pull a clean list of candidate dicts from the structured response."""
+def generate_candidates(topic: str, wildness: int = 50, n: int | None = None,
+                        round_idx: int = 0) -> list[dict]:
+    """Mine + compose ``n`` candidate ideas in a single structured Gemini call."""
+    n = n or config.N_CANDIDATES
+    prompt, gen_config = _request(topic, wildness, n)
+    with tracing.span("generate", round=round_idx, n=n, temperature=gen_config.temperature):
+        response = config.gemini_generate(
+            model=config.GEMINI_COMPOSER_MODEL, contents=prompt, gen_config=gen_config,
+        )
+        return _finish(response, round_idx, gen_config.temperature)
+
+
+async def agenerate_candidates_batch(topics: list[str], wildness: int = 50,
+                                     n: int | None = None) -> list[list[dict]]:
+    """Mine + compose ``n`` candidates for EACH of several topics in one structured
+    call. Returns one candidate list per topic, in order; a topic the model skipped
+    gets an empty list rather than failing the whole batch."""
+    n = n or config.N_CANDIDATES
+    listing = "\n".join(f"[{i}] {t}" for i, t in enumerate(topics))
+    prompt = (
+        f"Topics:\n{listing}\n"
+        f"Wildness: {wildness}/100\n"
+        f"For EACH topic produce exactly {n} candidate ideas, each using a different "
+        f"divergence move. Set `topic` on every idea to its topic's index."
+    )
+    with tracing.span("generate.batch", topics=len(topics), n=n):
+        response = await config.agemini_generate(
+            model=config.GEMINI_COMPOSER_MODEL, contents=prompt,
+            gen_config=_gen_config(wildness, _BatchCandidate),
+        )
+    items = _items(response)
+    groups: list[list[dict]] = [[] for _ in topics]
+    for item in items:
+        idx = item.topic if isinstance(item, _BatchCandidate) else item.get("topic", -1)
+        cand = _normalize(item)
+        if cand and isinstance(idx, int) and 0 <= idx < len(topics):
+            groups[idx].append(cand)
+    log.info("Generated %d candidates for %d topics in one call",
+             sum(map(len, groups)), len(topics))
+    return groups
+
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _loads_object(text: str):
+    """``json.loads`` that forgives trailing commas; ``None`` if still unparseable."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r"\1", text))
+        except json.JSONDecodeError:
+            return None
+
+
+class _ArrayStream:
+    """Incremental parser for a streamed top-level JSON array of objects.
+
+    ``feed`` takes the next text chunk and returns every element object that closed
+    within it. State (depth, string/escape flags, scan position) carries across
+    chunks, so each character is scanned exactly once."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._start = -1
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        self._buf += chunk
+        out: list[dict] = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch in "[{":
+                self._depth += 1
+                if ch == "{" and self._depth == 2:
+                    self._start = i
+            elif ch in "]}":
+                self._depth -= 1
+                if ch == "}" and self._depth == 1 and self._start >= 0:
+                    item = _loads_object(buf[self._start:i + 1])
+                    if isinstance(item, dict):
+                        out.append(item)
+                    self._start = -1
+            i += 1
+        # Drop everything already consumed, keeping any object still being built.
+        keep = self._start if self._start >= 0 else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._start >= 0:
+            self._start = 0
+        return out
+
+
+async def astream_candidates(topic: str, wildness: int = 50, n: int | None = None,
+                             round_idx: int = 0):
+    """Yield candidate dicts one by one as Gemini streams the structured array."""
+    n = n or config.N_CANDIDATES
+    prompt, gen_config = _request(topic, wildness, n)
+    parser = _ArrayStream()
+    count = 0
+    with tracing.span("generate", round=round_idx, n=n, temperature=gen_config.temperature,
+                      stream=True) as span:
+        async for chunk in config.agemini_generate_stream(
+            model=config.GEMINI_COMPOSER_MODEL, contents=prompt, gen_config=gen_config,
+        ):
+            for item in parser.feed(chunk.text or ""):
+                cand = _normalize(item)
+                if cand:
+                    count += 1
+                    yield cand
+        span.set(candidates=count)
+    if not count:
+        raise RuntimeError("Generator produced no candidates")
+    log.info("Streamed %d candidates (round %d, temp≈%.2f)",
+             count, round_idx, gen_config.temperature)
+
+
+async def agenerate_candidates(topic: str, wildness: int = 50, n: int | None = None,
+                               round_idx: int = 0) -> list[dict]:
+    """Async ``generate_candidates`` on the genai async client."""
+    n = n or config.N_CANDIDATES
+    prompt, gen_config = _request(topic, wildness, n)
+    with tracing.span("generate", round=round_idx, n=n, temperature=gen_config.temperature):
+        response = await config.agemini_generate(
+            model=config.GEMINI_COMPOSER_MODEL, contents=prompt, gen_config=gen_config,
+        )
+        return _finish(response, round_idx, gen_config.temperature)
+
+
+def _normalize(item) -> dict | None:
+    """One parsed item (model or raw dict) → candidate dict, or ``None`` if empty."""
+    if isinstance(item, _Candidate):
+        idea, assumption, operator = item.idea, item.assumption, item.operator
+    else:
+        idea = item.get("idea", "")
+        assumption = item.get("assumption", "")
+        operator = item.get("operator", "")
+    idea = (idea or "").strip()
+    if not idea:
+        return None
+    return {
+        "text": idea,
+        "assumption": (assumption or "").strip().rstrip("."),
+        "operator": (operator or "").strip(),
+    }
+
+
+def _salvage(text: str) -> list[dict]:
+    """Every complete object in a truncated or malformed JSON array, in one pass
+    of ``_ArrayStream``. Objects that are cut off or unparseable are skipped."""
+    start = text.find("[")
+    items = _ArrayStream().feed(text[start:] if start >= 0 else "[" + text)
+    log.warning("Salvaged %d candidate object(s) from a malformed generator response",
+                len(items))
+    metrics.SALVAGED.inc(len(items), model=config.GEMINI_COMPOSER_MODEL,
+                         wildness=metrics.wildness_label.get())
+    return items
+
+
+def _items(response) -> list:
     parsed = getattr(response, "parsed", None)
     # Distinguish "not auto-parsed" (None) from "parsed but empty" ([]).
-    items = parsed if parsed is not None else json.loads((response.text or "").strip())
+    if parsed is not None:
+        return parsed
+    text = (response.text or "").strip()
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError:
+        items = None
+    if isinstance(items, list):
+        return items
+    with tracing.span("generate.salvage", response_chars=len(text)) as span:
+        items = _salvage(text)
+        span.set(recovered=len(items))
+    return items
 
-    out: list[dict] = []
-    for item in items:
-        if isinstance(item, _Candidate):
-            idea, assumption, operator = item.idea, item.assumption, item.operator
-        else:
-            idea = item.get("idea", "")
-            assumption = item.get("assumption", "")
-            operator = item.get("operator", "")
-        idea = (idea or "").strip()
-        if idea:
-            out.append({
-                "text": idea,
-                "assumption": (assumption or "").strip().rstrip("."),
-                "operator": (operator or "").strip(),
-            })
-    return out
+
+def _extract(response) -> list[dict]:
+    """Pull a clean list of candidate dicts from the structured response, salvaging
+    what it can from a damaged one."""
+    return [c for c in map(_normalize, _items(response)) if c]
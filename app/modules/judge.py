@@ -6,16 +6,31 @@ that scores every candidate on coherence / novelty / surprise and ranks them —
 comparative judgment is both cheaper and more reliable than absolute scoring.
 
 If Mistral is unreachable, it degrades to a transparent local heuristic and sets
-``scoring_degraded=True`` (no silent 0.5 that quietly passes a gate).
+``scoring_degraded=True`` (no silent 0.5 that quietly passes a gate). While the
+judge model's circuit breaker (``config.breaker``) is open that happens at once,
+without waiting on a call that is expected to fail.
+
+Candidates that near-duplicate a recently served idea (``dedup.index``) are kept out
+of the judge call and scored as repeats, so judge tokens aren't spent on them.
+Scores are also looked up in ``score_cache.store`` first; only misses go to Mistral.
+
+Large pools (more than ``NBT_JUDGE_SHARD_SIZE`` misses) are judged in concurrent
+shards instead of one long prompt. A few anchor candidates appear in every shard, and
+each shard's scores are shifted by how far its anchors strayed from their mean, so
+all shards share one scale; an optional knockout call then re-judges the winners.
 """
 import argparse
+import asyncio
+import contextvars
+import hashlib
 import json
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-
-from .. import config
+from .. import config, metrics, tracing
+from ..limits import CircuitOpen
+from . import dedup, score_cache
 
 log = config.log.getChild("judge")
 
@@ -39,6 +54,8 @@ SYSTEM_PROMPT = (
     '{"scores": [{"index": 0, "coherence": 0.0, "novelty": 0.0, "surprise": 0.0, '
     '"rationale": "short reason"}]}. Include one object per paragraph, by index.'
 )
+# Part of every score-cache key: editing the prompt invalidates old scores.
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
 
 
 def _quick_ok(text: str) -> bool:
@@ -60,12 +77,13 @@ def _heuristic_scores(text: str) -> dict:
             "rationale": "local heuristic (judge API unavailable)"}
 
 
-def _call_mistral(candidates: list[dict]) -> list[dict]:
+def _mistral_request(candidates: list[dict], model: str) -> tuple[dict, dict]:
+    """Payload + headers for one comparative scoring call."""
     body = "\n\n".join(
         f"[{i}]\n\"\"\"\n{c['text']}\n\"\"\"" for i, c in enumerate(candidates)
     )
     payload = {
-        "model": config.resolve_mistral_model(config.MISTRAL_MODEL),
+        "model": model,
         "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": f"Score these {len(candidates)} paragraphs as JSON:\n\n{body}"},
@@ -77,12 +95,77 @@ def _call_mistral(candidates: list[dict]) -> list[dict]:
         "Authorization": f"Bearer {config.MISTRAL_API_KEY}",
         "Content-Type": "application/json",
     }
-    resp = requests.post(config.MISTRAL_CHAT_URL, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    content = resp.json()["choices"][0]["message"]["content"]
+    return payload, headers
+
+
+def _parse_scores(data: dict) -> list[dict]:
+    content = data["choices"][0]["message"]["content"]
     return json.loads(content)["scores"]
 
 
+def _span_attrs(model: str, candidates: list[dict], payload: dict) -> dict:
+    return {"model": model, "candidates": len(candidates),
+            "prompt_chars": sum(len(m["content"]) for m in payload["messages"])}
+
+
+def _book(model: str, data: dict) -> dict:
+    """Charge and book a judge call's usage inside the call itself, so a hedged call
+    that loses the race (and runs to completion in its thread) is billed too."""
+    config.limiter("mistral", model).charge(data.get("usage", {}).get("total_tokens", 0))
+    config.count_usage("mistral", model, *config.mistral_usage(data))
+    return data
+
+
+def _post(model: str, candidates: list[dict]):
+    import requests  # deferred with the other provider clients (see config)
+    payload, headers = _mistral_request(candidates, model)
+    config.limiter("mistral", model).acquire_sync()
+    timeout = config.time_budget(config.MISTRAL_TIMEOUT)
+    with (config.breaker("mistral", model).guard(config.is_outage),
+          tracing.span("judge", **_span_attrs(model, candidates, payload)) as span,
+          metrics.JUDGE_SECONDS.time(model=model, wildness=metrics.wildness_label.get())):
+        resp = requests.post(config.MISTRAL_CHAT_URL, headers=headers, json=payload,
+                             timeout=timeout)
+        span.set(status=resp.status_code, response_chars=len(resp.content or b""))
+        if resp.status_code == 429:
+            metrics.QUOTA_ERRORS.inc(provider="mistral", model=model,
+                                     wildness=metrics.wildness_label.get())
+        resp.raise_for_status()
+    return _book(model, resp.json())
+
+
+async def _apost(model: str, candidates: list[dict]):
+    payload, headers = _mistral_request(candidates, model)
+    await config.limiter("mistral", model).acquire()
+    timeout = config.time_budget(config.MISTRAL_TIMEOUT)
+    with (config.breaker("mistral", model).guard(config.is_outage),
+          tracing.span("judge", **_span_attrs(model, candidates, payload)) as span,
+          metrics.JUDGE_SECONDS.time(model=model, wildness=metrics.wildness_label.get())):
+        resp = await config.mistral_http().post(config.MISTRAL_CHAT_URL, headers=headers,
+                                                json=payload, timeout=timeout)
+        span.set(status=resp.status_code, response_chars=len(resp.content or b""))
+        if resp.status_code == 429:
+            metrics.QUOTA_ERRORS.inc(provider="mistral", model=model,
+                                     wildness=metrics.wildness_label.get())
+        resp.raise_for_status()
+    return _book(model, resp.json())
+
+
+def _call_mistral(candidates: list[dict]) -> list[dict]:
+    model = config.resolve_mistral_model(config.MISTRAL_MODEL)
+    # Hedges (see config.hedger) go to the same model so cached scores stay keyed to it.
+    data = config.run_hedged("mistral", model, lambda m: _post(m, candidates))
+    return _parse_scores(data)
+
+
+async def _acall_mistral(candidates: list[dict]) -> list[dict]:
+    model = await config.aresolve_mistral_model(config.MISTRAL_MODEL)
+    data = await config.hedger.arun("mistral", model, lambda m: _apost(m, candidates),
+                                    on_hedge=config.hedge_counter("mistral", model),
+                                    on_cancel=config.book_cancelled("mistral"))
+    return _parse_scores(data)
+
+
 def _clamp(x) -> float:
     try:
         return max(0.0, min(1.0, float(x)))
@@ -97,42 +180,175 @@ def _composite(coherence: float, novelty: float, surprise: float) -> float:
     return round(score, 4)
 
 
-def judge_candidates(candidates: list[dict]) -> dict:
-    """Score and rank candidates. Returns
-    ``{"ranked": [candidate+scores...], "scoring_degraded": bool}`` with ``ranked``
-    sorted best-first."""
-    degraded = False
-    scores_by_index: dict[int, dict] = {}
+def _repeat_scores(text: str) -> dict:
+    return {**_heuristic_scores(text), "novelty": 0.0, "surprise": 0.0,
+            "rationale": "near-duplicate of a recently served idea"}
+
 
+def _screen(candidates: list[dict]) -> tuple[list[int], dict[int, dict]]:
+    """Split candidates into the indices worth a judge call and pre-scored repeats."""
+    repeats = {i: _repeat_scores(c["text"]) for i, c in enumerate(candidates)
+               if dedup.index.is_repeat(c["text"])}
+    if repeats:
+        log.info("Dropping %d near-duplicate candidate(s) before judging", len(repeats))
+    fresh = [i for i in range(len(candidates)) if i not in repeats]
     # Prefer candidates that clear the cheap local gate; if none do, judge them all.
-    eligible = [i for i, c in enumerate(candidates) if _quick_ok(c["text"])] or list(range(len(candidates)))
+    eligible = [i for i in fresh if _quick_ok(candidates[i]["text"])] or fresh
+    return eligible, repeats
+
+
+def _collect(raw: list[dict], eligible: list[int]) -> dict[int, dict]:
+    """Map judge output (indexed into ``eligible``) back onto candidate indices,
+    dropping any out-of-range index the model invents."""
+    scores_by_index: dict[int, dict] = {}
+    for entry in raw:
+        local_idx = int(entry.get("index", -1))
+        if 0 <= local_idx < len(eligible):
+            scores_by_index[eligible[local_idx]] = {
+                "coherence": _clamp(entry.get("coherence")),
+                "novelty": _clamp(entry.get("novelty")),
+                "surprise": _clamp(entry.get("surprise")),
+                "rationale": str(entry.get("rationale", "")).strip(),
+            }
+    return scores_by_index
+
+
+# ─── Sharded judging ─────────────────────────────────────────────────────────────
+_AXES = ("coherence", "novelty", "surprise")
+_shard_pool: ThreadPoolExecutor | None = None
+
+
+def _sharded(misses: list[int]) -> bool:
+    return 0 < config.JUDGE_SHARD_SIZE < len(misses)
+
+
+def _shards(misses: list[int]) -> tuple[list[int], list[list[int]]]:
+    """Anchors and shards for ``misses``: chunks of JUDGE_SHARD_SIZE whose first
+    JUDGE_ANCHORS candidates (the anchors) are also prepended to every later shard."""
+    size = config.JUDGE_SHARD_SIZE
+    chunks = [misses[i:i + size] for i in range(0, len(misses), size)]
+    anchors = chunks[0][:max(0, config.JUDGE_ANCHORS)]
+    log.info("Judging %d candidates in %d shards with %d anchor(s)",
+             len(misses), len(chunks), len(anchors))
+    return anchors, [chunks[0]] + [anchors + chunk for chunk in chunks[1:]]
+
+
+def _mean(values) -> float:
+    values = list(values)
+    return sum(values) / len(values) if values else 0.0
+
+
+def _shift(scores: dict, offsets: dict[str, float]) -> dict:
+    return {**scores, **{a: round(_clamp(scores[a] - offsets[a]), 4) for a in _AXES}}
+
+
+def _normalize(anchors: list[int], results: list[dict[int, dict]]) -> dict[int, dict]:
+    """Merge per-shard scores onto one scale. Each anchor scores the mean of its
+    shard scores; every other candidate is shifted, per axis, by how far its shard's
+    anchors sat from those means. Anchors a shard dropped just don't count there."""
+    merged: dict[int, dict] = {}
+    for a in anchors:
+        seen = [r[a] for r in results if a in r]
+        if seen:
+            merged[a] = {**seen[0], **{x: round(_mean(s[x] for s in seen), 4) for x in _AXES}}
+    for r in results:
+        linked = [a for a in anchors if a in r and a in merged]
+        offsets = {x: _mean(r[a][x] - merged[a][x] for a in linked) for x in _AXES}
+        for i, scores in r.items():
+            if i not in merged:
+                merged[i] = _shift(scores, offsets)
+    return merged
 
-    if config.MISTRAL_API_KEY:
+
+def _merge_shards(anchors: list[int], shards: list[list[int]],
+                  outcomes: list) -> tuple[dict[int, dict], list[int], bool]:
+    """Scores from the shards' judge outputs (exceptions for failed calls), the
+    shard winners, and whether any shard failed. Raises if every shard did."""
+    results, errors = [], []
+    for shard, raw in zip(shards, outcomes):
+        if isinstance(raw, BaseException):
+            errors.append(raw)
+        else:
+            results.append(_collect(raw, shard))
+    if not results:
+        raise errors[0]
+    if errors:
+        log.warning("%d of %d judge shards failed; their candidates fall back to the "
+                    "heuristic: %s", len(errors), len(shards), errors[0])
+    merged = _normalize(anchors, results)
+    winners = []
+    for k, shard in enumerate(shards):
+        own = [i for i in (shard if k == 0 else shard[len(anchors):]) if i in merged]
+        if own:
+            winners.append(max(own, key=lambda i: _composite(
+                *(merged[i][x] for x in _AXES))))
+    return merged, winners, bool(errors)
+
+
+def _knockout(merged: dict[int, dict], finalists: list[int], raw: list[dict]) -> None:
+    """Re-score the shard winners from a head-to-head call. The knockout decides
+    their order; their mean per axis stays where the shards put it."""
+    final = _collect(raw, finalists)
+    offsets = {x: _mean(final[i][x] - merged[i][x] for i in final) for x in _AXES}
+    for i, scores in final.items():
+        merged[i] = _shift(scores, offsets)
+    log.info("Knockout re-judged %d shard winners", len(final))
+
+
+def _judge(candidates: list[dict], misses: list[int]) -> tuple[dict[int, dict], bool]:
+    """Scores for ``misses`` from one judge call, or from concurrent shards when
+    there are too many; also whether a shard failed."""
+    if not _sharded(misses):
+        return _collect(_call_mistral([candidates[i] for i in misses]), misses), False
+    global _shard_pool
+    if _shard_pool is None:
+        _shard_pool = ThreadPoolExecutor(thread_name_prefix="nbt-judge")
+    anchors, shards = _shards(misses)
+    # Each shard runs in a copy of our context so deadline, spans and tally follow it.
+    futures = [_shard_pool.submit(contextvars.copy_context().run, _call_mistral,
+                                  [candidates[i] for i in shard]) for shard in shards]
+    outcomes = []
+    for future in futures:
         try:
-            raw = _call_mistral([candidates[i] for i in eligible])
-            for entry in raw:
-                local_idx = int(entry.get("index", -1))
-                if 0 <= local_idx < len(eligible):
-                    scores_by_index[eligible[local_idx]] = {
-                        "coherence": _clamp(entry.get("coherence")),
-                        "novelty": _clamp(entry.get("novelty")),
-                        "surprise": _clamp(entry.get("surprise")),
-                        "rationale": str(entry.get("rationale", "")).strip(),
-                    }
+            outcomes.append(future.result())
         except Exception as exc:
-            log.warning("Judge API failed, using local heuristic: %s", exc)
-            degraded = True
-    else:
-        log.warning("MISTRAL_API_KEY not set; judging with local heuristic")
-        degraded = True
+            outcomes.append(exc)
+    merged, winners, failed = _merge_shards(anchors, shards, outcomes)
+    if config.JUDGE_KNOCKOUT and len(winners) > 1:
+        try:
+            _knockout(merged, winners, _call_mistral([candidates[i] for i in winners]))
+        except Exception as exc:
+            log.warning("Judge knockout failed; keeping shard scores: %s", exc)
+    return merged, failed
+
+
+async def _ajudge(candidates: list[dict], misses: list[int]) -> tuple[dict[int, dict], bool]:
+    """Async ``_judge``: shards are concurrent calls on the pooled HTTP client."""
+    if not _sharded(misses):
+        return _collect(await _acall_mistral([candidates[i] for i in misses]), misses), False
+    anchors, shards = _shards(misses)
+    outcomes = await asyncio.gather(
+        *(_acall_mistral([candidates[i] for i in shard]) for shard in shards),
+        return_exceptions=True)
+    merged, winners, failed = _merge_shards(anchors, shards, outcomes)
+    if config.JUDGE_KNOCKOUT and len(winners) > 1:
+        try:
+            _knockout(merged, winners, await _acall_mistral([candidates[i] for i in winners]))
+        except Exception as exc:
+            log.warning("Judge knockout failed; keeping shard scores: %s", exc)
+    return merged, failed
+
 
+def _rank(candidates: list[dict], scores_by_index: dict[int, dict], failed: bool) -> dict:
+    """Attach scores (heuristic where missing) and sort best-first. Each candidate
+    carries its own ``scoring_degraded`` flag — set only when its score is a
+    fallback because the judge call failed — and the verdict is degraded if any is."""
     ranked = []
     for i, cand in enumerate(candidates):
         s = scores_by_index.get(i)
-        if s is None:
+        fallback = s is None
+        if fallback:
             s = _heuristic_scores(cand["text"])
-            if not config.MISTRAL_API_KEY or degraded:
-                degraded = True
         ranked.append({
             **cand,
             "coherence": s["coherence"],
@@ -140,14 +356,143 @@ def judge_candidates(candidates: list[dict]) -> dict:
             "surprise": s["surprise"],
             "rationale": s["rationale"],
             "composite": _composite(s["coherence"], s["novelty"], s["surprise"]),
+            "scoring_degraded": fallback and failed,
         })
 
     ranked.sort(key=lambda c: c["composite"], reverse=True)
+    degraded = any(c["scoring_degraded"] for c in ranked)
     log.info("Judged %d candidates; best composite=%.3f%s",
              len(ranked), ranked[0]["composite"], " (degraded)" if degraded else "")
     return {"ranked": ranked, "scoring_degraded": degraded}
 
 
+def _lookup(candidates: list[dict], eligible: list[int], scores_by_index: dict[int, dict],
+            model: str) -> list[int]:
+    """Fill ``scores_by_index`` from the score cache; return the indices still unscored."""
+    hits = score_cache.store.get_many([candidates[i]["text"] for i in eligible],
+                                      f"{model}:{PROMPT_VERSION}")
+    for i in eligible:
+        if candidates[i]["text"] in hits:
+            scores_by_index[i] = hits[candidates[i]["text"]]
+    if hits:
+        log.info("Reusing %d cached judge score(s)", len(hits))
+    return [i for i in eligible if i not in scores_by_index]
+
+
+def _remember(candidates: list[dict], fresh: dict[int, dict], model: str) -> None:
+    score_cache.store.put_many({candidates[i]["text"]: s for i, s in fresh.items()},
+                               f"{model}:{PROMPT_VERSION}")
+
+
+def _count_fallback() -> None:
+    metrics.JUDGE_FALLBACKS.inc(model=config.MISTRAL_MODEL, wildness=metrics.wildness_label.get())
+
+
+def _score(candidates: list[dict], eligible: list[int], scores_by_index: dict[int, dict]) -> bool:
+    """Judge the eligible candidates not already cached. Returns ``True`` if the judge
+    was unavailable, so whatever is still unscored falls back to the heuristic."""
+    if not eligible:
+        log.info("Every candidate is a near-duplicate; skipping the judge call")
+        return False
+    if not config.MISTRAL_API_KEY:
+        log.warning("MISTRAL_API_KEY not set; judging with local heuristic")
+        _count_fallback()
+        return True
+    try:
+        model = config.resolve_mistral_model(config.MISTRAL_MODEL)
+        misses = _lookup(candidates, eligible, scores_by_index, model)
+        if misses:
+            fresh, partial = _judge(candidates, misses)
+            _remember(candidates, fresh, model)
+            scores_by_index.update(fresh)
+            if partial:
+                _count_fallback()
+                return True
+    except config.DeadlineExceeded:
+        raise  # the request is out of time; the pipeline truncates, not degrades
+    except CircuitOpen as exc:
+        log.info("Judge skipped, using local heuristic: %s", exc)
+        _count_fallback()
+        return True
+    except Exception as exc:
+        log.warning("Judge API failed, using local heuristic: %s", exc)
+        _count_fallback()
+        return True
+    return False
+
+
+async def _ascore(candidates: list[dict], eligible: list[int],
+                  scores_by_index: dict[int, dict]) -> bool:
+    """Async ``_score`` over the pooled Mistral HTTP client."""
+    if not eligible:
+        log.info("Every candidate is a near-duplicate; skipping the judge call")
+        return False
+    if not config.MISTRAL_API_KEY:
+        log.warning("MISTRAL_API_KEY not set; judging with local heuristic")
+        _count_fallback()
+        return True
+    try:
+        model = await config.aresolve_mistral_model(config.MISTRAL_MODEL)
+        misses = _lookup(candidates, eligible, scores_by_index, model)
+        if misses:
+            fresh, partial = await _ajudge(candidates, misses)
+            _remember(candidates, fresh, model)
+            scores_by_index.update(fresh)
+            if partial:
+                _count_fallback()
+                return True
+    except config.DeadlineExceeded:
+        raise  # the request is out of time; the pipeline truncates, not degrades
+    except CircuitOpen as exc:
+        log.info("Judge skipped, using local heuristic: %s", exc)
+        _count_fallback()
+        return True
+    except Exception as exc:
+        log.warning("Judge API failed, using local heuristic: %s", exc)
+        _count_fallback()
+        return True
+    return False
+
+
+def judge_candidates(candidates: list[dict]) -> dict:
+    """Score and rank candidates. Returns
+    ``{"ranked": [candidate+scores...], "scoring_degraded": bool}`` with ``ranked``
+    sorted best-first."""
+    eligible, scores_by_index = _screen(candidates)
+    failed = _score(candidates, eligible, scores_by_index)
+    return _rank(candidates, scores_by_index, failed)
+
+
+async def ajudge_candidates(candidates: list[dict]) -> dict:
+    """Async ``judge_candidates`` over the pooled Mistral HTTP client."""
+    eligible, scores_by_index = _screen(candidates)
+    failed = await _ascore(candidates, eligible, scores_by_index)
+    return _rank(candidates, scores_by_index, failed)
+
+
+async def ajudge_candidates_batch(groups: list[list[dict]]) -> list[dict]:
+    """Judge several topics' candidate lists in ONE Mistral call. Candidates are
+    scored together but ranked within their own group; returns one
+    ``judge_candidates``-shaped verdict per group. Groups must be non-empty."""
+    scores_by_index: dict[int, dict] = {}
+    flat = [c for group in groups for c in group]
+    offsets, eligible, start = [], [], 0
+    for group in groups:
+        offsets.append(start)
+        local, repeats = _screen(group)
+        eligible.extend(start + i for i in local)
+        scores_by_index.update({start + i: s for i, s in repeats.items()})
+        start += len(group)
+
+    failed = await _ascore(flat, eligible, scores_by_index)
+
+    verdicts = []
+    for group, offset in zip(groups, offsets):
+        local = {i - offset: s for i, s in scores_by_index.items() if offset <= i < offset + len(group)}
+        verdicts.append(_rank(group, local, failed))
+    return verdicts
+
+
 # ─── CLI (manual testing) ────────────────────────────────────────────────────────
 def main():
     parser = argparse.ArgumentParser(description="Judge one or more paragraphs.")
@@ -0,0 +1,70 @@
+"""Content-addressed cache of judge scores, backed by SQLite.
+
+Rows are keyed by a hash of (namespace, normalized text), where the judge passes
+its resolved model plus a prompt version as the namespace — change either and old
+scores simply stop matching. Only real judge scores are stored, never heuristic
+fallbacks. ``NBT_SCORE_CACHE_PATH`` selects a file so scores survive restarts
+(benchmark replays, retries, the judge CLI); empty keeps them in memory.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from .. import config
+
+log = config.log.getChild("score_cache")
+
+
+def _key(text: str, namespace: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{namespace}\0{normalized}".encode()).hexdigest()
+
+
+class ScoreCache:
+    """Thread-safe SQLite score store, pruned to the newest ``max_rows`` rows."""
+
+    def __init__(self, path: str = "", max_rows: int = 100_000):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL" if path else "PRAGMA journal_mode=MEMORY")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scores "
+                         "(key TEXT PRIMARY KEY, scores TEXT NOT NULL, created REAL NOT NULL)")
+        self._db.commit()
+
+    def get_many(self, texts: list[str], namespace: str) -> dict[str, dict]:
+        """``{text: scores}`` for every text already scored under ``namespace``."""
+        if self.max_rows <= 0 or not texts:
+            return {}
+        keys = {_key(t, namespace): t for t in texts}
+        marks = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, scores FROM scores WHERE key IN ({marks})", list(keys)).fetchall()
+        return {keys[k]: json.loads(v) for k, v in rows}
+
+    def put_many(self, items: dict[str, dict], namespace: str) -> None:
+        if self.max_rows <= 0 or not items:
+            return
+        now = time.time()
+        rows = [(_key(t, namespace), json.dumps(s), now) for t, s in items.items()]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)", rows)
+            self._writes += len(rows)
+            if self._writes >= 1000:  # prune occasionally, not on every write
+                self._writes = 0
+                self._db.execute(
+                    "DELETE FROM scores WHERE key NOT IN "
+                    "(SELECT key FROM scores ORDER BY created DESC LIMIT ?)", (self.max_rows,))
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM scores")
+            self._db.commit()
+
+
+store = ScoreCache(config.SCORE_CACHE_PATH, config.SCORE_CACHE_MAX_ROWS)
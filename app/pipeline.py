@@ -6,10 +6,67 @@ If the best is below the quality bar (and scoring is reliable), try one more rou
 
 This replaces the old mine→compose-per-candidate→judge→polish pipeline: ~1 Gemini
 call per round instead of ~5, much lower latency, same best-of-N selection.
+
+With ``NBT_SPECULATIVE_ROUNDS`` on, the next round's generate call is started while
+the current round is being judged and dropped if the current round passes, so the
+slow path costs ~one round of latency at the price of extra tokens on the fast one.
+
+``agenerate_idea`` reports each candidate through ``candidate_callback`` as soon as
+it is known — per object while Gemini is still writing when ``NBT_STREAM_CANDIDATES``
+is on, otherwise right after the round's structured call returns. Judging stays one
+comparative call over the full round so scores remain comparable.
+
+How many candidates each round asks for, and how many rounds a request may take,
+come from ``adaptive.controller``: every judged round feeds its per-wildness pass
+statistics, and each request gets the cheapest plan expected to pass.
+
+Both entry points sit behind ``cache.ideas``: a fresh run stores its top few passing
+ideas for the (topic, wildness bucket), and repeat requests rotate through them with
+zero provider calls unless the caller asks for ``fresh=True``. The passing ideas a
+run did not serve also go to ``cache.inventory``; an "another one" request
+(``astream_idea(..., another=True)``) takes the best of them, again with zero
+provider calls, and a shelf running low is restocked by a background run.
+
+``astream_idea`` is what the web routes consume: it coalesces concurrent requests
+for the same (topic, wildness) onto one in-flight ``agenerate_idea`` run and fans its
+events out to every attached caller, replaying what a late joiner missed. When the
+last caller detaches (a closed browser tab), the run is cancelled: the in-flight
+provider calls are aborted and no further round or judge call starts.
+
+Every run has a time budget (``config.deadline_scope``): provider calls get only
+what is left of it, and a round is not started unless the slowest round so far would
+still fit — the run then returns its best idea so far with ``deadline_truncated``.
+
+Every run is traced (see ``app/tracing.py``) when tracing is on; with
+``NBT_DEBUG_TIMINGS`` the result carries the run's per-stage ``timings``.
+
+Every provider call is booked in ``config.ledger``, and the result carries the
+request's ``usage``. As a configured usage budget runs out, requests step down
+(``_plan``): fewer candidates, then a single round, then cached ideas only.
+
+``agenerate_ideas_batch`` serves bulk callers: it packs ``NBT_BATCH_TOPICS_PER_CALL``
+topics into each Gemini call and each judge call, and runs up to
+``NBT_BATCH_CONCURRENCY`` such packs at once.
+
+``admission`` (``NBT_MAX_INFLIGHT`` runs, ``NBT_MAX_QUEUE`` waiting) gates the async
+entry points the web routes use. The blocking ``generate_idea`` is exempt. Its only
+callers are scripts and the benchmark, which bound their own concurrency with their
+thread pools, and the queue is built on the event loop. Its provider calls are
+still paced by the per-model rate limiters and breakers.
 """
-from . import config
-from .modules.generator import generate_candidates
-from .modules.judge import judge_candidates
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import adaptive, cache, config, metrics, tracing
+from .ledger import BudgetExhausted, new_usage
+from .limits import Admission, Overloaded
+from .modules import dedup
+from .modules.generator import (agenerate_candidates, agenerate_candidates_batch,
+                                astream_candidates, generate_candidates)
+from .modules.judge import ajudge_candidates, ajudge_candidates_batch, judge_candidates
 
 log = config.log.getChild("pipeline")
 
@@ -19,33 +76,119 @@ def _passes_bar(candidate: dict) -> bool:
             and candidate["novelty"] >= config.MIN_NOVELTY)
 
 
-def generate_idea(topic: str, wildness: int = 50, status_callback=None) -> dict:
-    def status(msg: str):
-        if status_callback:
-            status_callback(msg)
+# Bounds concurrent async pipeline runs per worker (see limits.Admission).
+admission = Admission(config.MAX_INFLIGHT, config.MAX_QUEUE, config.MAX_QUEUE_WAIT)
 
-    best: dict | None = None
-    degraded = False
+metrics.register(metrics.Gauge(
+    "nbt_result_cache", "Result cache size and hit/miss/eviction counts.", ("stat",),
+    fn=lambda: {(k,): v for k, v in cache.ideas.stats().items()}))
+metrics.register(metrics.Gauge(
+    "nbt_inventory", "Runner-up inventory size (topics) and hit/miss/eviction counts.",
+    ("stat",), fn=lambda: {(k,): v for k, v in cache.inventory.stats().items()}))
+metrics.register(metrics.Gauge(
+    "nbt_admission", "Pipeline runs executing and queued.", ("state",),
+    fn=lambda: {("inflight",): admission.inflight, ("queued",): admission.queued}))
 
-    for round_idx in range(config.MAX_ROUNDS):
-        status(f"Imagining {config.N_CANDIDATES} never-before-thoughts..."
-               if round_idx == 0 else "Reaching for a wilder idea...")
-        candidates = generate_candidates(topic, wildness, round_idx=round_idx)
+# Speculative rounds on the sync path run here; threads can't be interrupted, so a
+# round that is no longer needed is simply left to finish and discarded.
+_speculator: ThreadPoolExecutor | None = None
 
-        status("Ranking candidates for novelty & coherence...")
-        verdict = judge_candidates(candidates)
-        degraded = verdict["scoring_degraded"]
-        top = verdict["ranked"][0]
 
-        if best is None or top["composite"] > best["composite"]:
-            best = top
+def _speculate(topic: str, wildness: int, n: int, round_idx: int) -> tuple[list[dict], dict]:
+    tally = {"tokens": 0}
+    config.token_tally.set(tally)  # this thread's own context
+    return generate_candidates(topic, wildness, n=n, round_idx=round_idx), tally
 
-        # Good enough, or scoring is unreliable (another round can't reliably help).
-        if _passes_bar(best) or degraded:
-            break
 
-    log.info("Returning idea: novelty=%.2f coherence=%.2f surprise=%.2f op=%s degraded=%s",
-             best["novelty"], best["coherence"], best["surprise"], best["operator"], degraded)
+async def _aspeculate(topic: str, wildness: int, n: int,
+                      round_idx: int) -> tuple[list[dict], dict]:
+    tally = {"tokens": 0}
+    config.token_tally.set(tally)  # the task runs in a copy of the caller's context
+    return await agenerate_candidates(topic, wildness, n=n, round_idx=round_idx), tally
+
+
+def _log_wasted(round_idx: int, pending) -> None:
+    if pending.cancelled():
+        log.info("Speculative round %d cancelled before it finished", round_idx)
+    elif pending.exception() is not None:
+        log.info("Speculative round %d discarded (it failed: %s)", round_idx, pending.exception())
+    else:
+        _, tally = pending.result()
+        log.info("Speculative round %d discarded; spent %d extra tokens",
+                 round_idx, tally["tokens"])
+
+
+def _discard(round_idx: int, pending) -> None:
+    """Drop an unneeded speculative round, logging what it cost once it settles."""
+    pending.cancel()
+    pending.add_done_callback(lambda p: _log_wasted(round_idx, p))
+
+
+async def _agenerate_round(topic: str, wildness: int, n: int, round_idx: int,
+                           emit) -> list[dict]:
+    if not config.STREAM_CANDIDATES:
+        candidates = await agenerate_candidates(topic, wildness, n=n, round_idx=round_idx)
+        for cand in candidates:
+            emit(round_idx, cand)
+        return candidates
+    candidates = []
+    async for cand in astream_candidates(topic, wildness, n=n, round_idx=round_idx):
+        candidates.append(cand)
+        emit(round_idx, cand)
+    return candidates
+
+
+def _shortfall(candidates: list[dict], n: int, round_idx: int) -> int:
+    missing = n - len(candidates)
+    if missing > 0:
+        log.info("Round %d came back with %d of %d candidates; topping up %d",
+                 round_idx, len(candidates), n, missing)
+        metrics.TOP_UPS.inc(model=config.GEMINI_COMPOSER_MODEL,
+                            wildness=metrics.wildness_label.get())
+    return missing
+
+
+def _top_up(topic: str, wildness: int, n: int, round_idx: int,
+            candidates: list[dict]) -> list[dict]:
+    """``candidates`` plus a follow-up call for just the ones missing from the ``n``
+    asked for (say, salvaged from a truncated response). If that call fails the
+    round goes ahead with what it has."""
+    missing = _shortfall(candidates, n, round_idx)
+    if missing <= 0:
+        return candidates
+    try:
+        extra = generate_candidates(topic, wildness, n=missing, round_idx=round_idx)
+    except Exception as exc:
+        log.warning("Top-up for round %d failed; judging %d candidates: %s",
+                    round_idx, len(candidates), exc)
+        return candidates
+    return candidates + extra[:missing]
+
+
+async def _atop_up(topic: str, wildness: int, n: int, round_idx: int,
+                   candidates: list[dict], emit) -> list[dict]:
+    """Async ``_top_up``; the extra candidates are emitted like the round's own."""
+    missing = _shortfall(candidates, n, round_idx)
+    if missing <= 0:
+        return candidates
+    try:
+        extra = await agenerate_candidates(topic, wildness, n=missing, round_idx=round_idx)
+    except Exception as exc:
+        log.warning("Top-up for round %d failed; judging %d candidates: %s",
+                    round_idx, len(candidates), exc)
+        return candidates
+    for cand in extra[:missing]:
+        emit(round_idx, cand)
+    return candidates + extra[:missing]
+
+
+def _round_message(round_idx: int, n: int) -> str:
+    return (f"Imagining {n} never-before-thoughts..."
+            if round_idx == 0 else "Reaching for a wilder idea...")
+
+
+def _as_result(best: dict, degraded: bool, cached: bool = False,
+               truncated: bool = False) -> dict:
     return {
         "idea": best["text"],
         "novelty": best["novelty"],
@@ -53,6 +196,628 @@ def generate_idea(topic: str, wildness: int = 50, status_callback=None) -> dict:
         "surprise": best["surprise"],
         "assumption": best["assumption"],
         "operator": best["operator"],
-        "scoring_degraded": degraded,
+        "scoring_degraded": best.get("scoring_degraded", degraded),
+        "cached": cached,
+        "deadline_truncated": truncated,
         "version": config.VERSION,
     }
+
+
+def _learn(wildness: int, verdict: dict) -> None:
+    # Heuristic fallback scores say nothing about how often real rounds pass.
+    if not verdict["scoring_degraded"]:
+        adaptive.controller.record(wildness, verdict["ranked"], _passes_bar)
+
+
+def _labels(wildness: int) -> dict:
+    return {"model": config.GEMINI_COMPOSER_MODEL,
+            "wildness": str(cache.wildness_bucket(wildness) * config.CACHE_WILDNESS_BUCKET)}
+
+
+def _observe(wildness: int) -> dict:
+    """Tag this task/thread's provider calls with the request's wildness bucket and
+    count the run; returns the labels for the request-level metrics."""
+    labels = _labels(wildness)
+    metrics.wildness_label.set(labels["wildness"])
+    metrics.REQUESTS.inc(**labels)
+    return labels
+
+
+def _plan(wildness: int) -> tuple[int, int, bool]:
+    """``(candidates per round, max rounds, speculate)``: ``adaptive.controller``'s
+    plan, stepped down once ``BUDGET_STEP_DOWN`` of the usage budget is spent (half
+    the candidates, no speculative rounds) and again at ``BUDGET_SINGLE_ROUND`` (one
+    round)."""
+    n, max_rounds = adaptive.controller.plan(wildness)
+    pressure = config.ledger.pressure()
+    if pressure < config.BUDGET_STEP_DOWN:
+        return n, max_rounds, config.SPECULATIVE_ROUNDS
+    step = "fewer_candidates"
+    n = max(min(n, config.ADAPTIVE_MIN_N), n // 2)
+    if pressure >= config.BUDGET_SINGLE_ROUND:
+        step, max_rounds = "single_round", 1
+    metrics.BUDGET_STEP_DOWNS.inc(step=step, wildness=metrics.wildness_label.get())
+    log.info("Usage budget %.0f%% spent; stepping down to %d candidates x %d round(s)",
+             pressure * 100, n, max_rounds)
+    return n, max_rounds, False
+
+
+def _budget_gate(topic: str) -> None:
+    """Refuse a run that would call the providers once the usage budget is spent."""
+    if config.ledger.pressure() < 1.0:
+        return
+    metrics.BUDGET_STEP_DOWNS.inc(step="cache_only", wildness=metrics.wildness_label.get())
+    log.warning("Usage budget spent; no cached idea for %r", topic)
+    raise BudgetExhausted("The usage budget is spent; only cached ideas are served until "
+                          "it frees up.", config.ledger.retry_after())
+
+
+def _out_of_time(round_idx: int, slowest: float) -> bool:
+    """Whether round ``round_idx`` should be skipped: the slowest round so far would
+    not fit in what is left of the request's deadline."""
+    left = config.remaining()
+    if left is None or left >= slowest:
+        return False
+    log.info("Stopping before round %d: %.1fs left, rounds take up to %.1fs",
+             round_idx, left, slowest)
+    return True
+
+
+def _result(best: dict, degraded: bool, truncated: bool = False) -> dict:
+    dedup.index.add(best["text"])
+    if best.get("scoring_degraded", degraded):
+        metrics.DEGRADED_RESULTS.inc(model=config.GEMINI_COMPOSER_MODEL,
+                                     wildness=metrics.wildness_label.get())
+    log.info("Returning idea: novelty=%.2f coherence=%.2f surprise=%.2f op=%s degraded=%s",
+             best["novelty"], best["coherence"], best["surprise"], best["operator"], degraded)
+    return _as_result(best, degraded, truncated=truncated)
+
+
+def _cache_lookup(topic: str, wildness: int, fresh: bool) -> dict | None:
+    # With the usage budget spent a cached idea beats none, even for ``fresh``.
+    if fresh and config.ledger.pressure() < 1.0:
+        return None
+    entry = cache.ideas.get(cache.topic_key(topic, wildness))
+    if entry is None:
+        return None
+    ideas = entry["ideas"]
+    result = ideas[entry["next"] % len(ideas)]
+    entry["next"] += 1
+    dedup.index.add(result["idea"])
+    log.info("Serving cached idea for %r (%d in rotation)", topic, len(ideas))
+    return {**result, "cached": True}
+
+
+def _cache_store(topic: str, wildness: int, best: dict, pool: list[dict],
+                 degraded: bool) -> None:
+    # Degraded scores are unreliable — better to retry the judge next time.
+    if degraded:
+        return
+    passing = sorted((c for c in pool if _passes_bar(c)),
+                     key=lambda c: c["composite"], reverse=True)
+    picks = [best] + [c for c in passing if c is not best]
+    ideas = [_as_result(c, degraded) for c in picks[:max(1, config.CACHE_IDEAS)]]
+    # The caller is being served ideas[0]; the next hit starts on the runner-up.
+    cache.ideas.put(cache.topic_key(topic, wildness), {"ideas": ideas, "next": 1})
+    _stock(topic, wildness, [c for c in passing if c is not best])
+
+
+# ─── Runner-up inventory ─────────────────────────────────────────────────────────
+# Background restocking runs, one per (topic, wildness bucket) at a time.
+_refills: dict[tuple[str, int], asyncio.Task] = {}
+
+
+def _stock(topic: str, wildness: int, passing: list[dict]) -> None:
+    """Shelve judged, passing candidates no one was served (best-first, bounded)."""
+    if not passing or config.INVENTORY_SIZE <= 0:
+        return
+    key = cache.topic_key(topic, wildness)
+    shelf = cache.inventory.peek(key) or []
+    texts = {c["text"] for c in shelf}
+    shelf = shelf + [c for c in passing if c["text"] not in texts]
+    shelf.sort(key=lambda c: c["composite"], reverse=True)
+    cache.inventory.put(key, shelf[:max(1, config.INVENTORY_PER_TOPIC)])
+
+
+def _take_another(topic: str, wildness: int) -> dict | None:
+    """The best shelved idea for "another one", or ``None`` if the shelf is empty.
+    Ideas served since they were shelved (say, by the result cache's rotation) are
+    skipped. A shelf left low is restocked in the background."""
+    shelf = cache.inventory.get(cache.topic_key(topic, wildness))
+    if shelf is None:
+        return None
+    best = sig = None
+    while shelf and best is None:
+        cand = shelf.pop(0)
+        sig = dedup.index.signature(cand["text"]) if dedup.index.max_size > 0 else None
+        if not dedup.index.is_repeat(cand["text"], sig):
+            best = cand
+    if best is None:
+        return None  # the caller's fresh run restocks it
+    if len(shelf) <= config.INVENTORY_LOW:
+        _refill_soon(topic, wildness)
+    dedup.index.add(best["text"], sig)
+    metrics.INVENTORY_SERVED.inc(**_labels(wildness))
+    log.info("Serving another idea for %r from inventory (%d left)", topic, len(shelf))
+    return {**_as_result(best, False, cached=True), "usage": new_usage()}
+
+
+def _refill_soon(topic: str, wildness: int) -> None:
+    key = cache.topic_key(topic, wildness)
+    if key in _refills or admission.inflight >= admission.max_inflight > 0:
+        return  # restocking never queues ahead of (or behind) real requests
+    if config.ledger.pressure() >= config.BUDGET_STEP_DOWN:
+        return  # what is left of the usage budget is for real requests
+    # A blank context: the refill is nobody's request (no deadline, trace or tally).
+    task = asyncio.create_task(_arefill(topic, wildness), context=contextvars.Context())
+    _refills[key] = task
+    task.add_done_callback(lambda _: _refills.pop(key, None))
+
+
+async def _arefill(topic: str, wildness: int) -> None:
+    """Restock the inventory: a full run whose passing ideas, best included, are all
+    shelved rather than served."""
+    labels = _observe(wildness)
+    metrics.INVENTORY_REFILLS.inc(**labels)
+    try:
+        with (config.deadline_scope(),
+              tracing.trace("refill", topic=topic, wildness=wildness)):
+            async with admission.slot():
+                _, degraded, pool, _ = await _arounds(topic, wildness, lambda m: None,
+                                                      lambda r, c: None)
+    except Exception as exc:
+        log.warning("Restocking the inventory for %r failed: %s", topic, exc)
+        return
+    if not degraded:
+        _stock(topic, wildness, [c for c in pool if _passes_bar(c)
+                                 and not dedup.index.is_repeat(c["text"])])
+    log.info("Restocked the inventory for %r", topic)
+
+
+def _finish(result: dict, trace, usage: dict) -> dict:
+    """``result`` plus the run's provider ``usage`` and, with ``NBT_DEBUG_TIMINGS``,
+    its per-stage ``timings``."""
+    result = {**result, "usage": config.ledger.settle(usage)}
+    if trace is not None and config.DEBUG_TIMINGS:
+        result["timings"] = trace.breakdown()
+    return result
+
+
+def generate_idea(topic: str, wildness: int = 50, status_callback=None,
+                  fresh: bool = False, deadline: float | None = None) -> dict:
+    """``deadline`` is the run's time budget in seconds (default ``NBT_DEADLINE``).
+    Not gated by ``admission``; see the module docstring."""
+    with (config.deadline_scope(deadline), config.usage_scope() as usage,
+          tracing.trace("pipeline", topic=topic, wildness=wildness, fresh=fresh) as trace):
+        return _finish(_generate_idea(topic, wildness, status_callback, fresh), trace, usage)
+
+
+def _generate_idea(topic: str, wildness: int, status_callback, fresh: bool) -> dict:
+    global _speculator
+
+    if (hit := _cache_lookup(topic, wildness, fresh)) is not None:
+        return hit
+    labels = _observe(wildness)
+    _budget_gate(topic)
+    started = time.perf_counter()
+
+    def status(msg: str):
+        if status_callback:
+            status_callback(msg)
+
+    best: dict | None = None
+    degraded = False
+    pool: list[dict] = []
+    pending: Future | None = None  # next round's candidates, when speculating
+    truncated = False
+    slowest = 0.0
+    n, max_rounds, speculate = _plan(wildness)
+
+    try:
+        for round_idx in range(max_rounds):
+            if best is not None and _out_of_time(round_idx, slowest):
+                truncated = True
+                break
+            round_started = time.perf_counter()
+            metrics.ROUNDS.inc(model=config.GEMINI_COMPOSER_MODEL,
+                               wildness=metrics.wildness_label.get())
+            status(_round_message(round_idx, n))
+            try:
+                if pending is not None:
+                    with tracing.span("speculation.wait", round=round_idx):
+                        candidates, _ = pending.result()
+                    pending = None
+                else:
+                    candidates = generate_candidates(topic, wildness, n=n,
+                                                     round_idx=round_idx)
+                candidates = _top_up(topic, wildness, n, round_idx, candidates)
+            except config.DeadlineExceeded:
+                if best is None:
+                    raise
+                truncated = True
+                break
+
+            if speculate and round_idx + 1 < max_rounds:
+                if _speculator is None:
+                    _speculator = ThreadPoolExecutor(thread_name_prefix="nbt-speculate")
+                # Run in a copy of our context so its spans and metric labels follow it.
+                pending = _speculator.submit(contextvars.copy_context().run,
+                                             _speculate, topic, wildness, n, round_idx + 1)
+
+            status("Ranking candidates for novelty & coherence...")
+            try:
+                verdict = judge_candidates(candidates)
+            except config.DeadlineExceeded:
+                if best is None:
+                    raise
+                truncated = True
+                break
+            _learn(wildness, verdict)
+            degraded = verdict["scoring_degraded"]
+            pool.extend(verdict["ranked"])
+            top = verdict["ranked"][0]
+
+            if best is None or top["composite"] > best["composite"]:
+                best = top
+            slowest = max(slowest, time.perf_counter() - round_started)
+
+            # Good enough, or scoring is unreliable (another round can't reliably help).
+            if _passes_bar(best) or degraded:
+                break
+    finally:
+        if pending is not None:
+            _discard(round_idx + 1, pending)
+
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+    # A truncated run's best is not what a full run would have served.
+    if not truncated:
+        _cache_store(topic, wildness, best, pool, degraded)
+    return _result(best, degraded, truncated)
+
+
+async def _arounds(topic: str, wildness: int, status,
+                   emit) -> tuple[dict, bool, list[dict], bool]:
+    """The async round loop; returns ``(best, degraded, every judged candidate,
+    deadline_truncated)``."""
+    best: dict | None = None
+    degraded = False
+    pool: list[dict] = []
+    pending: asyncio.Task | None = None
+    truncated = False
+    slowest = 0.0
+    n, max_rounds, speculate = _plan(wildness)
+
+    try:
+        for round_idx in range(max_rounds):
+            if best is not None and _out_of_time(round_idx, slowest):
+                truncated = True
+                break
+            round_started = time.perf_counter()
+            metrics.ROUNDS.inc(model=config.GEMINI_COMPOSER_MODEL,
+                               wildness=metrics.wildness_label.get())
+            status(_round_message(round_idx, n))
+            try:
+                if pending is not None:
+                    with tracing.span("speculation.wait", round=round_idx):
+                        candidates, _ = await pending
+                    pending = None
+                    for cand in candidates:
+                        emit(round_idx, cand)
+                else:
+                    candidates = await _agenerate_round(topic, wildness, n, round_idx, emit)
+                candidates = await _atop_up(topic, wildness, n, round_idx, candidates, emit)
+            except config.DeadlineExceeded:
+                if best is None:
+                    raise
+                truncated = True
+                break
+
+            if speculate and round_idx + 1 < max_rounds:
+                pending = asyncio.create_task(_aspeculate(topic, wildness, n, round_idx + 1))
+
+            status("Ranking candidates for novelty & coherence...")
+            try:
+                verdict = await ajudge_candidates(candidates)
+            except config.DeadlineExceeded:
+                if best is None:
+                    raise
+                truncated = True
+                break
+            _learn(wildness, verdict)
+            degraded = verdict["scoring_degraded"]
+            pool.extend(verdict["ranked"])
+            top = verdict["ranked"][0]
+
+            if best is None or top["composite"] > best["composite"]:
+                best = top
+            slowest = max(slowest, time.perf_counter() - round_started)
+
+            if _passes_bar(best) or degraded:
+                break
+    finally:
+        if pending is not None:
+            _discard(round_idx + 1, pending)
+
+    return best, degraded, pool, truncated
+
+
+async def agenerate_idea(topic: str, wildness: int = 50, status_callback=None,
+                         candidate_callback=None, fresh: bool = False,
+                         deadline: float | None = None) -> dict:
+    """Async ``generate_idea``: every provider call is awaited on the event loop,
+    so a worker holds no thread while a generation is in flight. ``status_callback``
+    and ``candidate_callback(round_idx, candidate)`` are plain callables invoked on
+    the loop. Cache misses wait for an ``admission`` slot first and raise
+    ``limits.Overloaded`` if none frees up in time (``ledger.BudgetExhausted`` if the
+    usage budget is spent). The ``deadline`` budget includes that wait."""
+    with (config.deadline_scope(deadline), config.usage_scope() as usage,
+          tracing.trace("pipeline", topic=topic, wildness=wildness, fresh=fresh) as trace):
+        result = await _agenerate_idea(topic, wildness, status_callback,
+                                       candidate_callback, fresh)
+        return _finish(result, trace, usage)
+
+
+async def _agenerate_idea(topic: str, wildness: int, status_callback, candidate_callback,
+                          fresh: bool) -> dict:
+    if (hit := _cache_lookup(topic, wildness, fresh)) is not None:
+        return hit
+
+    def status(msg: str):
+        if status_callback:
+            status_callback(msg)
+
+    def emit(round_idx: int, cand: dict):
+        if candidate_callback:
+            candidate_callback(round_idx, cand)
+
+    def queued(position: int):
+        status(f"Waiting for a free slot (#{position} in line)...")
+
+    labels = _observe(wildness)
+    _budget_gate(topic)
+    with metrics.REQUEST_SECONDS.time(**labels):
+        async with admission.slot(on_position=queued):
+            with tracing.span("rounds"):  # the time before this span is queueing
+                best, degraded, pool, truncated = await _arounds(topic, wildness,
+                                                                 status, emit)
+
+    if not truncated:
+        _cache_store(topic, wildness, best, pool, degraded)
+    return _result(best, degraded, truncated)
+
+
+# ─── Batch API ───────────────────────────────────────────────────────────────────
+async def _arun_batch(topics: list[str], wildness: int) -> list[dict]:
+    """Run the round loop for one pack of topics: each round is one packed generate
+    call and one packed judge call covering every topic still below the bar."""
+    best: list[dict | None] = [None] * len(topics)
+    pools: list[list[dict]] = [[] for _ in topics]
+    degraded = [False] * len(topics)
+    todo = list(range(len(topics)))
+    truncated = False
+    _observe(wildness)
+    n, max_rounds, _ = _plan(wildness)
+
+    for round_idx in range(max_rounds):
+        metrics.ROUNDS.inc(model=config.GEMINI_COMPOSER_MODEL,
+                           wildness=metrics.wildness_label.get())
+        try:
+            groups = await agenerate_candidates_batch([topics[i] for i in todo], wildness, n=n)
+        except config.DeadlineExceeded:
+            truncated = True
+            break
+        live = [(i, g) for i, g in zip(todo, groups) if g]
+        # Topics the model skipped this round simply get another go next round.
+        todo = [i for i, g in zip(todo, groups) if not g]
+        if live:
+            try:
+                verdicts = await ajudge_candidates_batch([g for _, g in live])
+            except config.DeadlineExceeded:
+                todo += [i for i, _ in live]
+                truncated = True
+                break
+            for (i, _), verdict in zip(live, verdicts):
+                _learn(wildness, verdict)
+                degraded[i] = verdict["scoring_degraded"]
+                pools[i].extend(verdict["ranked"])
+                top = verdict["ranked"][0]
+                if best[i] is None or top["composite"] > best[i]["composite"]:
+                    best[i] = top
+                if not (_passes_bar(best[i]) or degraded[i]):
+                    todo.append(i)
+        if not todo:
+            break
+
+    results = []
+    for i, topic in enumerate(topics):
+        if best[i] is None:
+            results.append({"error": "Ran out of time before any idea was ready." if truncated
+                            else "Generator produced no candidates"})
+            continue
+        # Only a topic the deadline cut short is truncated; one that already passed
+        # the bar (or degraded) was finished and is cached as usual.
+        cut = truncated and i in todo
+        if not cut:
+            _cache_store(topic, wildness, best[i], pools[i], degraded[i])
+        results.append(_result(best[i], degraded[i], cut))
+    return results
+
+
+async def agenerate_ideas_batch(topics: list[str], wildness: int = 50,
+                                fresh: bool = False) -> list[dict]:
+    """Generate one idea per topic. Returns a list aligned with ``topics`` of
+    ``generate_idea``-shaped dicts, or ``{"error": message}`` for a topic that
+    could not be generated. Each pack gets the default DEADLINE, counted from
+    when it starts waiting for its admission slot."""
+    results: list[dict | None] = [None] * len(topics)
+    misses = []
+    for i, topic in enumerate(topics):
+        results[i] = _cache_lookup(topic, wildness, fresh)
+        if results[i] is None:
+            misses.append(i)
+
+    size = max(1, config.BATCH_TOPICS_PER_CALL)
+    packs = [misses[k:k + size] for k in range(0, len(misses), size)]
+    gate = asyncio.Semaphore(max(1, config.BATCH_CONCURRENCY))
+
+    async def run(pack: list[int]):
+        async with gate:
+            try:
+                _budget_gate(", ".join(topics[i] for i in pack))
+                with config.deadline_scope():
+                    async with admission.slot():
+                        out = await _arun_batch([topics[i] for i in pack], wildness)
+            except Exception as exc:
+                log.exception("batch generation failed")
+                out = [{"error": str(exc)}] * len(pack)
+        for i, result in zip(pack, out):
+            results[i] = result
+
+    await asyncio.gather(*(run(pack) for pack in packs))
+    log.info("Batch of %d topics: %d cached, %d packed calls",
+             len(topics), len(topics) - len(misses), len(packs))
+    return results
+
+
+def generate_ideas_batch(topics: list[str], wildness: int = 50, fresh: bool = False) -> list[dict]:
+    """Blocking ``agenerate_ideas_batch`` for scripts and the CLI."""
+    return asyncio.run(agenerate_ideas_batch(topics, wildness, fresh))
+
+
+# ─── Request coalescing ──────────────────────────────────────────────────────────
+class _Flight:
+    """One in-flight ``agenerate_idea`` run shared by every caller with its key.
+    Events are kept so a caller that attaches late still sees all of them."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.listeners: set[asyncio.Queue] = set()
+        self.task: asyncio.Task | None = None
+        self.finished = False
+
+    def publish(self, event: dict) -> None:
+        self.finished = event["type"] in ("result", "error")
+        self.events.append(event)
+        for queue in self.listeners:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        self.listeners.add(queue)
+        return queue
+
+
+_flights: dict[tuple[str, int], _Flight] = {}
+
+# Token cost of recent complete runs, to estimate what a cancelled run saved.
+_run_tokens: deque = deque(maxlen=100)
+
+
+def _detach(key: tuple[str, int], flight: _Flight) -> None:
+    # A cancelled run's key may already belong to a newer run.
+    if _flights.get(key) is flight:
+        del _flights[key]
+
+
+def _count_cancelled(spent: int) -> None:
+    labels = {"model": config.GEMINI_COMPOSER_MODEL, "wildness": metrics.wildness_label.get()}
+    metrics.CANCELLED_RUNS.inc(**labels)
+    if _run_tokens:
+        saved = sum(_run_tokens) / len(_run_tokens) - spent
+        metrics.TOKENS_SAVED.inc(max(0.0, saved), **labels)
+
+
+async def _fly(key: tuple[str, int], flight: _Flight, topic: str, wildness: int,
+               fresh: bool, deadline: float | None) -> None:
+    tally = {"tokens": 0}
+    config.token_tally.set(tally)  # this task's own context
+    try:
+        result = await agenerate_idea(
+            topic, wildness,
+            status_callback=lambda m: flight.publish({"type": "status", "message": m}),
+            candidate_callback=lambda r, c: flight.publish(
+                {"type": "candidate", "round": r, "data": c}),
+            fresh=fresh, deadline=deadline,
+        )
+        terminal = {"type": "result", "data": result}
+        if not result.get("cached"):
+            _run_tokens.append(tally["tokens"])
+    except asyncio.CancelledError:
+        log.info("Cancelled the run for %r after %d tokens: nobody is listening",
+                 topic, tally["tokens"])
+        _detach(key, flight)
+        _count_cancelled(tally["tokens"])
+        raise
+    except Overloaded as exc:
+        log.warning("Rejected %r: %s", topic, exc)
+        terminal = {"type": "error", "message": str(exc), "retry_after": exc.retry_after}
+    except config.DeadlineExceeded as exc:
+        log.warning("Gave up on %r: %s", topic, exc)
+        terminal = {"type": "error", "message": "Ran out of time before any idea was ready.",
+                    "deadline_exceeded": True}
+    except Exception as exc:
+        log.exception("generation failed")
+        terminal = {"type": "error", "message": str(exc)}
+    # Detach before the final event so later requests start a new run (or hit cache).
+    _detach(key, flight)
+    flight.publish(terminal)
+
+
+async def astream_idea(topic: str, wildness: int = 50, fresh: bool = False,
+                      deadline: float | None = None, heartbeat: float | None = None,
+                      another: bool = False, poll: float | None = None):
+    """Yield pipeline events — ``status``, ``candidate``, then one ``result`` or
+    ``error`` — as ``{"type": ...}`` dicts, plus a ``heartbeat`` event after every
+    ``heartbeat`` seconds without one and a ``tick`` event every ``poll`` seconds
+    in between (a cue for the caller to check on its client). Concurrent calls for the same normalized
+    topic and wildness attach to one run (which keeps the first caller's
+    ``deadline``); a caller that stops iterating detaches, and the run carries on
+    for everyone else — or is cancelled if nobody else is attached. A ``fresh`` call
+    asked not to be shown what others are, so it always gets a run of its own.
+
+    ``another=True`` asks for a different idea than last time: the best unserved
+    runner-up from the inventory when there is one (a lone ``result`` event),
+    otherwise a ``fresh`` run."""
+    if another:
+        if (hit := _take_another(topic, wildness)) is not None:
+            yield {"type": "result", "data": hit}
+            return
+        fresh = True
+    key = (cache.normalize_topic(topic), int(wildness))
+    flight = None if fresh else _flights.get(key)
+    if flight is None:
+        flight = _Flight()
+        if not fresh:
+            _flights[key] = flight
+        flight.task = asyncio.create_task(_fly(key, flight, topic, wildness, fresh,
+                                               deadline))
+    else:
+        log.info("Coalesced request for %r onto in-flight run (%d attached)",
+                 topic, len(flight.listeners) + 1)
+    queue = flight.subscribe()
+    loop = asyncio.get_running_loop()
+    try:
+        quiet_since = loop.time()
+        while True:
+            wait = min(filter(None, (poll, heartbeat)), default=None)
+            try:
+                async with asyncio.timeout(wait):
+                    event = await queue.get()
+            except TimeoutError:
+                if heartbeat and loop.time() - quiet_since >= heartbeat:
+                    quiet_since = loop.time()
+                    yield {"type": "heartbeat"}
+                else:
+                    yield {"type": "tick"}
+                continue
+            quiet_since = loop.time()
+            yield event
+            if event["type"] in ("result", "error"):
+                return
+    finally:
+        flight.listeners.discard(queue)
+        if not flight.listeners and not flight.finished:
+            _detach(key, flight)
+            flight.task.cancel()
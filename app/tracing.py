@@ -0,0 +1,232 @@
+"""Lightweight per-request tracing, plus an opt-in sampling profiler.
+
+A ``Trace`` collects timed ``Span`` records (name, start/end, attributes such as
+model, temperature, candidate count, prompt/response sizes and attempt number). The
+current trace lives in a context variable, so spans opened in provider code, worker
+threads and speculative tasks all land in the request that started them; when no
+trace is active ``span()`` costs one context-variable lookup.
+
+Traces are only recorded when ``configure()`` enabled them (``NBT_DEBUG_TIMINGS`` /
+``NBT_TRACE_DIR``) or the request was picked for profiling (``NBT_PROFILE_SAMPLE``).
+A finished trace can be dumped as Chrome trace-event JSON (open it in
+``chrome://tracing`` or Perfetto) and summarised with ``breakdown()``.
+
+The profiler samples the request's thread — the event loop, for async requests — so
+it sees every coroutine sharing that loop, which is what you want when hunting CPU
+hotspots under load. Samples are written as folded stacks (flamegraph.pl/speedscope).
+
+Kept free of ``config`` imports, like ``metrics``; ``config`` calls ``configure()``.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+log = logging.getLogger("nbtgen.tracing")
+
+_settings = {"enabled": False, "out_dir": "", "profile_rate": 0.0, "interval": 0.005}
+
+
+def configure(enabled: bool = False, out_dir: str = "", profile_rate: float = 0.0,
+              interval_ms: float = 5.0) -> None:
+    _settings.update(enabled=enabled or bool(out_dir), out_dir=out_dir,
+                     profile_rate=profile_rate, interval=interval_ms / 1000.0)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "tid")
+
+    def __init__(self, name: str, attrs: dict, tid: int):
+        self.name, self.attrs, self.tid = name, attrs, tid
+        self.start = time.perf_counter()
+        self.end: float | None = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL = _NullSpan()
+
+
+def _lane() -> int:
+    """Stable id for the running task (or thread), so overlapping spans from
+    concurrent tasks get separate rows in the trace viewer."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Trace:
+    def __init__(self, name: str, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans: list[Span] = []
+        self.profile: Counter | None = None
+        self._lock = threading.Lock()
+        self.root = self.open(name, attrs)
+
+    def open(self, name: str, attrs: dict) -> Span:
+        span = Span(name, attrs, _lane())
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_chrome(self) -> dict:
+        """Chrome trace-event JSON: one complete ("X") event per finished span."""
+        origin = self.root.start
+        lanes: dict[int, int] = {}
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.end is None:
+                continue
+            events.append({
+                "name": span.name, "cat": "nbt", "ph": "X", "pid": os.getpid(),
+                "tid": lanes.setdefault(span.tid, len(lanes) + 1),
+                "ts": round((span.start - origin) * 1e6, 1),
+                "dur": round((span.end - span.start) * 1e6, 1),
+                "args": span.attrs,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"trace_id": self.id, "started_at": self.started_at}}
+
+    def breakdown(self) -> dict:
+        """``{"total_ms": ..., "stages": {name: {"ms": summed, "count": n}}}`` over
+        finished spans; concurrent spans (speculation) each count in full."""
+        stages: dict[str, dict] = {}
+        with self._lock:
+            spans = [s for s in self.spans if s.end is not None and s is not self.root]
+        for span in spans:
+            stage = stages.setdefault(span.name, {"ms": 0.0, "count": 0})
+            stage["ms"] += (span.end - span.start) * 1000
+            stage["count"] += 1
+        for stage in stages.values():
+            stage["ms"] = round(stage["ms"], 1)
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return {"total_ms": round((end - self.root.start) * 1000, 1), "stages": stages}
+
+    def save(self, out_dir: str) -> str:
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{int(self.started_at)}-{self.id}.trace.json")
+        with open(path, "w") as fh:
+            json.dump(self.to_chrome(), fh)
+        if self.profile:
+            with open(path[:-len(".trace.json")] + ".folded", "w") as fh:
+                fh.writelines(f"{stack} {n}\n" for stack, n in self.profile.most_common())
+        return path
+
+
+current: ContextVar[Trace | None] = ContextVar("nbt_trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child span of the current trace; yields the span so the
+    block can ``set()`` attributes learned along the way (e.g. response size)."""
+    trace = current.get()
+    if trace is None:
+        yield _NULL
+        return
+    record = trace.open(name, attrs)
+    try:
+        yield record
+    except BaseException as exc:
+        record.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        record.end = time.perf_counter()
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Start a trace for one request (yields it, or ``None`` when tracing is off).
+    Nested under an active trace this is just a span, and yields the outer trace."""
+    outer = current.get()
+    if outer is not None:
+        with span(name, **attrs):
+            yield outer
+        return
+    sampled = _settings["profile_rate"] > 0 and random.random() < _settings["profile_rate"]
+    if not (_settings["enabled"] or sampled):
+        yield None
+        return
+    active = Trace(name, **attrs)
+    token = current.set(active)
+    sampler = Sampler(threading.get_ident(), _settings["interval"]) if sampled else None
+    try:
+        yield active
+    except BaseException as exc:
+        active.root.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        active.root.end = time.perf_counter()
+        try:
+            current.reset(token)
+        except ValueError:  # an abandoned async generator finalised in another context
+            pass
+        if sampler is not None:
+            active.profile = sampler.stop()
+            _report_profile(active)
+        if _settings["out_dir"]:
+            try:
+                active.save(_settings["out_dir"])
+            except OSError as exc:
+                log.warning("Could not write trace %s: %s", active.id, exc)
+
+
+class Sampler:
+    """Background thread that snapshots one thread's Python stack every
+    ``interval`` seconds and counts the folded stacks it sees."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="nbt-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+def _report_profile(active: Trace) -> None:
+    """Log the frames that were on top of the stack most often (self time)."""
+    tops: Counter = Counter()
+    for stack, n in active.profile.items():
+        tops[stack.rsplit(";", 1)[-1]] += n
+    total = sum(tops.values())
+    if total:
+        hot = ", ".join(f"{frame} {n / total:.0%}" for frame, n in tops.most_common(5))
+        log.info("Profile %s (%d samples): %s", active.id, total, hot)
@@ -0,0 +1 @@
+"""Offline benchmarks: fake providers (``fakes``) and the load driver (``run``)."""
@@ -0,0 +1,249 @@
+"""Local stand-ins for the Gemini and Mistral HTTP APIs, for offline benchmarks.
+
+Each fake is a small FastAPI app speaking just enough of the real wire format for
+the google-genai SDK and the judge's HTTP client:
+
+- Gemini: ``POST /v1beta/models/{model}:generateContent`` and
+  ``:streamGenerateContent?alt=sse``, answering with a JSON array of candidates
+  sized from the prompt ("exactly N" / the batch topic listing), plus the
+  ``GET /v1beta/models/{model}`` metadata read the app's startup prewarm makes.
+- Mistral: ``POST /v1/chat/completions`` with a ``{"scores": [...]}`` body sized from
+  the paragraphs in the user message, plus ``GET /v1/models``.
+
+``Behavior`` controls each fake: a latency distribution, and the fraction of calls
+answered with a 5xx, a 429 or malformed JSON. Both count their calls so the driver
+can report provider calls per idea.
+"""
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORDS = ("tide lantern basalt orbit fungus ledger moth glacier cipher choir copper "
+          "spindle marrow comet archive pollen reef signal vault ember static lichen "
+          "prism drift anchor quarry hive mirror thread beacon").split()
+_OPERATORS = ("invert", "merge", "rescale", "reverse_causality", "substrate_swap")
+
+
+@dataclass
+class Latency:
+    """Seconds per call, drawn from ``kind``: ``fixed:s``, ``uniform:lo,hi``,
+    ``normal:mean,sd`` or ``lognormal:median,sigma`` (the default shape for LLMs:
+    a long right tail)."""
+    kind: str = "fixed"
+    args: tuple = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, rest = spec.partition(":")
+        args = tuple(float(a) for a in rest.split(",") if a) or (0.0,)
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec!r}")
+        return cls(kind, args)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(*self.args[:2])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.args[:2]))
+        if self.kind == "lognormal":
+            median, sigma = self.args[:2]
+            return median * rng.lognormvariate(0.0, sigma)
+        return self.args[0]
+
+
+@dataclass
+class Behavior:
+    latency: Latency = field(default_factory=Latency)
+    error_rate: float = 0.0       # answered 503
+    quota_rate: float = 0.0       # answered 429
+    malformed_rate: float = 0.0   # 200 with a truncated JSON body
+    seed: int = 0
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.calls = 0
+        self.faults = {"5xx": 0, "429": 0, "malformed": 0}
+
+    def roll(self) -> str | None:
+        """Count the call and pick its fault, if any."""
+        self.calls += 1
+        x = self.rng.random()
+        for fault, rate in (("5xx", self.error_rate), ("429", self.quota_rate),
+                            ("malformed", self.malformed_rate)):
+            if x < rate:
+                self.faults[fault] += 1
+                return fault
+            x -= rate
+        return None
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "faults": dict(self.faults)}
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.sample(_WORDS, 12)
+    return f"What if the {words[0]} were really a {words[1]}? " + " ".join(words[2:]) + "."
+
+
+def _candidates(rng: random.Random, n: int, topic: int | None = None) -> list[dict]:
+    out = []
+    for i in range(n):
+        item = {"idea": _sentence(rng), "assumption": _sentence(rng),
+                "operator": _OPERATORS[i % len(_OPERATORS)]}
+        if topic is not None:
+            item["topic"] = topic
+        out.append(item)
+    return out
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"code": status, "message": message,
+                                   "status": "UNAVAILABLE" if status >= 500
+                                   else "RESOURCE_EXHAUSTED"}}, status_code=status)
+
+
+def _gemini_body(text: str, prompt_chars: int) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                        "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_chars // 4,
+                          "candidatesTokenCount": len(text) // 4,
+                          "totalTokenCount": (prompt_chars + len(text)) // 4},
+    }
+
+
+def gemini_app(behavior: Behavior) -> FastAPI:
+    app = FastAPI()
+
+    def answer(body: dict) -> tuple[str, int]:
+        prompt = " ".join(p.get("text", "") for c in body.get("contents", [])
+                          for p in c.get("parts", []))
+        n = int(m.group(1)) if (m := re.search(r"exactly (\d+)", prompt)) else 5
+        topics = re.findall(r"^\[(\d+)\] ", prompt, re.M)
+        if topics:
+            items = [c for t in topics for c in _candidates(behavior.rng, n, int(t))]
+        else:
+            items = _candidates(behavior.rng, n)
+        return json.dumps(items), len(prompt)
+
+    @app.get("/v1beta/models/{model}")
+    async def model_info(model: str):
+        return {"name": f"models/{model}", "supportedGenerationMethods": ["generateContent"]}
+
+    @app.post("/v1beta/cachedContents")
+    async def cache_prompt(request: Request):
+        body = await request.json()
+        text = " ".join(p.get("text", "") for p in
+                        body.get("systemInstruction", {}).get("parts", []))
+        return {"name": f"cachedContents/{behavior.rng.getrandbits(32):08x}",
+                "model": body.get("model"), "usageMetadata": {"totalTokenCount": len(text) // 4}}
+
+    @app.patch("/v1beta/cachedContents/{name}")
+    async def renew_prompt(name: str):
+        return {"name": f"cachedContents/{name}"}
+
+    @app.post("/v1beta/models/{call}")
+    async def generate(call: str, request: Request):
+        fault = behavior.roll()
+        await asyncio.sleep(behavior.latency.sample(behavior.rng))
+        if fault == "5xx":
+            return _error(503, "The model is overloaded.")
+        if fault == "429":
+            return _error(429, "Quota exceeded.")
+        text, prompt_chars = answer(await request.json())
+        if fault == "malformed":
+            text = text[:len(text) // 2]
+        if call.endswith(":generateContent"):
+            return _gemini_body(text, prompt_chars)
+
+        async def chunks():
+            step = max(1, len(text) // 8)
+            for i in range(0, len(text), step):
+                body = _gemini_body(text[i:i + step], prompt_chars)
+                yield f"data: {json.dumps(body)}\r\n\r\n"
+                await asyncio.sleep(0)
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+def mistral_app(behavior: Behavior) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [
+            {"id": "mistral-small-latest", "capabilities": {"completion_chat": True}}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        fault = behavior.roll()
+        await asyncio.sleep(behavior.latency.sample(behavior.rng))
+        if fault == "5xx":
+            return _error(503, "Service unavailable.")
+        if fault == "429":
+            return _error(429, "Rate limit exceeded.")
+        body = await request.json()
+        user = body["messages"][-1]["content"]
+        n = len(re.findall(r"^\[\d+\]$", user, re.M))
+        rng = behavior.rng
+        scores = [{"index": i, "coherence": round(rng.uniform(0.4, 0.95), 2),
+                   "novelty": round(rng.uniform(0.3, 0.95), 2),
+                   "surprise": round(rng.uniform(0.3, 0.9), 2), "rationale": "fake"}
+                  for i in range(n)]
+        content = json.dumps({"scores": scores})
+        if fault == "malformed":
+            content = content[:len(content) // 2]
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(user) // 4,
+                          "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(user) + len(content)) // 4}}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """Run an ASGI app under uvicorn on its own thread and event loop."""
+
+    def __init__(self, app, port: int | None = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.loop = asyncio.new_event_loop()
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning",
+            loop="asyncio", lifespan="on", timeout_keep_alive=30))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._server.serve())
+
+    def __enter__(self) -> "Server":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
@@ -0,0 +1,285 @@
+"""Offline load/latency benchmark for NBT-Gen against local fake providers.
+
+    python -m bench.run --requests 200 --concurrency 32
+    python -m bench.run --mode stream --gemini-latency lognormal:0.8,0.5 \\
+        --error-rate 0.05 --quota-rate 0.02 --malformed-rate 0.02 --out before.json
+
+Starts the fake Gemini and Mistral servers (``bench/fakes.py``), points the real app
+at them through ``NBT_GEMINI_BASE_URL`` / ``NBT_MISTRAL_BASE_URL``, serves the real
+FastAPI app under uvicorn and drives it with concurrent clients:
+
+- ``stream``: SSE clients on ``GET /generate-stream``
+- ``form``:   ``POST /generate`` (the no-JS route)
+- ``sync``:   ``pipeline.generate_idea`` on a thread pool of ``--concurrency`` workers
+
+Each mode reports req/s, p50/p95/p99 latency, thread usage (peak threads, and for
+``sync`` how often every worker was busy), event-loop lag of the app's loop, and
+provider calls per idea. The report is written as JSON so runs can be diffed across
+versions. Every request uses a distinct topic with ``fresh=1`` unless ``--cache``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from .fakes import Behavior, Latency, Server, gemini_app, mistral_app
+
+MODES = ("stream", "form", "sync")
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+            "max": round(ordered[-1], 1)}
+
+
+class _Monitor:
+    """Samples thread count, busy pool workers and the app loop's scheduling lag."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None, interval: float = 0.05):
+        self.loop = loop
+        self.interval = interval
+        self.busy = 0                 # sync-mode workers currently inside generate_idea
+        self.threads: list[int] = []
+        self.busy_samples: list[int] = []
+        self.lag_ms: list[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _probe(self) -> None:
+        sent = time.perf_counter()
+        self.loop.call_soon_threadsafe(
+            lambda: self.lag_ms.append((time.perf_counter() - sent) * 1000))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.threads.append(threading.active_count())
+            self.busy_samples.append(self.busy)
+            if self.loop is not None:
+                self._probe()
+
+    def __enter__(self) -> "_Monitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def report(self, workers: int | None = None) -> dict:
+        out = {"threads_peak": max(self.threads, default=0),
+               "threads_mean": round(sum(self.threads) / max(1, len(self.threads)), 1)}
+        if workers:
+            out["executor_workers"] = workers
+            out["executor_peak_busy"] = max(self.busy_samples, default=0)
+            out["executor_saturation"] = round(
+                sum(b >= workers for b in self.busy_samples) / max(1, len(self.busy_samples)), 3)
+        if self.loop is not None:
+            out["loop_lag_ms"] = _percentiles(self.lag_ms)
+        return out
+
+
+async def _stream_once(client: httpx.AsyncClient, topic: str, wildness: int,
+                       fresh: bool) -> tuple[bool, float | None]:
+    """One SSE request; returns (ok, ms to the first candidate event)."""
+    started = time.perf_counter()
+    first = None
+    params = {"topic": topic, "wildness": wildness, "fresh": int(fresh)}
+    async with client.stream("GET", "/generate-stream", params=params) as resp:
+        if resp.status_code != 200:
+            return False, None
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["type"] == "candidate" and first is None:
+                first = (time.perf_counter() - started) * 1000
+            if event["type"] in ("result", "error"):
+                return event["type"] == "result", first
+    return False, first
+
+
+async def _form_once(client: httpx.AsyncClient, topic: str, wildness: int,
+                     fresh: bool) -> tuple[bool, None]:
+    data = {"topic": topic, "wildness": wildness}
+    if fresh:
+        data["fresh"] = "true"
+    resp = await client.post("/generate", data=data)
+    return resp.status_code == 200, None
+
+
+async def _drive_http(mode: str, base_url: str, topics: list[str], wildness: int,
+                      concurrency: int, fresh: bool) -> dict:
+    once = _stream_once if mode == "stream" else _form_once
+    latencies, firsts, failures = [], [], 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for topic in topics:
+        queue.put_nowait(topic)
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal failures
+        while not queue.empty():
+            topic = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                ok, first = await once(client, topic, wildness, fresh)
+            except httpx.HTTPError:
+                ok, first = False, None
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000)
+                if first is not None:
+                    firsts.append(first)
+            else:
+                failures += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    out = {"latency_ms": _percentiles(latencies), "ok": len(latencies), "errors": failures}
+    if mode == "stream":
+        out["first_candidate_ms"] = _percentiles(firsts)
+    return out
+
+
+def _drive_sync(monitor: _Monitor, topics: list[str], wildness: int, concurrency: int,
+                fresh: bool) -> dict:
+    from app import pipeline
+
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def one(topic: str):
+        nonlocal failures
+        with lock:
+            monitor.busy += 1
+        started = time.perf_counter()
+        try:
+            pipeline.generate_idea(topic, wildness, fresh=fresh)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+        except Exception:
+            with lock:
+                failures += 1
+        finally:
+            with lock:
+                monitor.busy -= 1
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        list(pool.map(one, topics))
+    return {"latency_ms": _percentiles(latencies), "ok": len(latencies), "errors": failures}
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    gemini = Behavior(Latency.parse(args.gemini_latency), args.error_rate, args.quota_rate,
+                      args.malformed_rate, seed=args.seed)
+    mistral = Behavior(Latency.parse(args.mistral_latency), args.error_rate, args.quota_rate,
+                       args.malformed_rate, seed=args.seed + 1)
+    with Server(gemini_app(gemini)) as fake_gemini, Server(mistral_app(mistral)) as fake_mistral:
+        # config reads these at import time, so the app must not be imported before.
+        os.environ.update({
+            "NBT_GEMINI_BASE_URL": fake_gemini.url,
+            "NBT_MISTRAL_BASE_URL": f"{fake_mistral.url}/v1",
+        })
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ.setdefault("GEMINI_API_KEY", "bench")
+        os.environ.setdefault("MISTRAL_API_KEY", "bench")
+        from app import config, main
+
+        report = {
+            "version": config.VERSION, "git": _git_rev(), "started_at": time.time(),
+            "scenario": {k: v for k, v in vars(args).items() if k != "out"},
+            "settings": {"n_candidates": config.N_CANDIDATES, "max_rounds": config.MAX_ROUNDS,
+                         "speculative_rounds": config.SPECULATIVE_ROUNDS,
+                         "stream_candidates": config.STREAM_CANDIDATES},
+            "modes": {},
+        }
+        with Server(main.app) as app_server:
+            for mode in args.mode:
+                topics = [f"benchmark topic {mode} {i}" if not args.cache
+                          else f"benchmark topic {i % 10}" for i in range(args.requests)]
+                before = (gemini.calls, mistral.calls)
+                started = time.perf_counter()
+                loop = None if mode == "sync" else app_server.loop
+                with _Monitor(loop) as monitor:
+                    if mode == "sync":
+                        result = _drive_sync(monitor, topics, args.wildness,
+                                             args.concurrency, not args.cache)
+                    else:
+                        result = asyncio.run(_drive_http(mode, app_server.url, topics,
+                                                         args.wildness, args.concurrency,
+                                                         not args.cache))
+                duration = time.perf_counter() - started
+                ideas = max(1, result["ok"])
+                result.update({
+                    "duration_s": round(duration, 2),
+                    "req_per_s": round(result["ok"] / duration, 2),
+                    "provider_calls_per_idea": {
+                        "gemini": round((gemini.calls - before[0]) / ideas, 2),
+                        "mistral": round((mistral.calls - before[1]) / ideas, 2),
+                    },
+                    **monitor.report(args.concurrency if mode == "sync" else None),
+                })
+                report["modes"][mode] = result
+                print(f"{mode:>6}: {result['req_per_s']} req/s  "
+                      f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+                      f"p99={result['latency_ms']['p99']}ms  errors={result['errors']}",
+                      file=sys.stderr)
+        report["faults"] = {"gemini": gemini.stats(), "mistral": mistral.stats()}
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=100, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--wildness", type=int, default=50)
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse 10 topics and let the result cache serve repeats")
+    parser.add_argument("--gemini-latency", default="lognormal:0.6,0.4",
+                        help="fixed:s | uniform:lo,hi | normal:mean,sd | lognormal:median,sigma")
+    parser.add_argument("--mistral-latency", default="lognormal:0.3,0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 503")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fraction answered with truncated JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="report path (default bench/results/<version>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    out = args.out or os.path.join(
+        os.path.dirname(__file__), "results",
+        f"{report['version']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
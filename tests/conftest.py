@@ -4,3 +4,24 @@ import os
 
 os.environ.setdefault("GEMINI_API_KEY", "test-key")
 os.environ.setdefault("MISTRAL_API_KEY", "test-key")
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _empty_result_cache():
+    """Tests reuse topics and texts; never let one test's cached or served ideas
+    (or the pass rates they taught the adaptive controller) leak into another's."""
+    from app import adaptive, cache, config, metrics
+    from app.modules import dedup, score_cache
+    stores = (cache.ideas, cache.inventory, dedup.index, score_cache.store, adaptive.controller,
+              config.ledger)
+    for store in stores:
+        store.clear()
+    metrics.reset()
+    config._breakers.clear()
+    config._prompt_caches.clear()
+    yield
+    for store in stores:
+        store.clear()
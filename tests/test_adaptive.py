@@ -0,0 +1,78 @@
+import pytest
+
+from app import adaptive, config, pipeline
+from tests.test_pipeline import _stub
+
+
+def _ranked(passing, failing):
+    good = {"coherence": 0.9, "novelty": 0.9, "composite": 0.85}
+    bad = {"coherence": 0.9, "novelty": 0.1, "composite": 0.3}
+    return [dict(good) for _ in range(passing)] + [dict(bad) for _ in range(failing)]
+
+
+def test_easy_buckets_get_fewer_candidates_and_rounds():
+    assert adaptive.choose(0.8) == (2, 1)            # 1 - 0.2^2 = 0.96 ≥ 0.9
+    n, rounds = adaptive.choose(0.15)
+    assert n * rounds > 3                            # a hard bucket spends more
+    assert adaptive.choose(0.001) == (config.ADAPTIVE_MAX_N, config.ADAPTIVE_MAX_ROUNDS)
+
+
+def test_plan_never_exceeds_the_fixed_plan_by_default():
+    assert (config.ADAPTIVE_MAX_N, config.ADAPTIVE_MAX_ROUNDS) == (config.N_CANDIDATES,
+                                                                   config.MAX_ROUNDS)
+    for p in (0.001, 0.05, 0.2, 0.5, 0.9):
+        n, rounds = adaptive.choose(p)
+        assert n <= config.N_CANDIDATES and rounds <= config.MAX_ROUNDS
+
+
+def test_plan_uses_fixed_values_until_enough_samples(monkeypatch):
+    controller = adaptive.Controller()
+    monkeypatch.setattr(config, "ADAPTIVE_MIN_SAMPLES", 20)
+    controller.record(90, _ranked(5, 5), pipeline._passes_bar)
+    assert controller.plan(90) == (config.N_CANDIDATES, config.MAX_ROUNDS)
+
+    controller.record(95, _ranked(9, 1), pipeline._passes_bar)    # same bucket as 90
+    assert controller.pass_rate(90) == pytest.approx(15 / 22)
+    assert controller.plan(90) == adaptive.choose(15 / 22)
+    assert controller.plan(10) == (config.N_CANDIDATES, config.MAX_ROUNDS)
+
+    monkeypatch.setattr(config, "ADAPTIVE", False)                # fixed override
+    assert controller.plan(90) == (config.N_CANDIDATES, config.MAX_ROUNDS)
+
+
+def test_stats_persist_across_restarts(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ADAPTIVE_MIN_SAMPLES", 1)
+    path = str(tmp_path / "adaptive.json")
+    controller = adaptive.Controller(path)
+    controller.record(30, _ranked(2, 2), pipeline._passes_bar)
+    controller.save()
+
+    restored = adaptive.Controller(path)
+    snap = restored.snapshot()["buckets"]["30"]
+    assert snap["candidates"] == 4 and snap["passing"] == 2
+    assert sum(snap["composites"]) == 4
+    assert snap["composites"][int(0.85 * adaptive._BINS)] == 2
+    assert snap["plan"] == dict(zip(("n_candidates", "max_rounds"), adaptive.choose(3 / 6)))
+
+
+def test_pipeline_asks_for_the_planned_candidate_count(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    seen = []
+    original = pipeline.generate_candidates
+    monkeypatch.setattr(pipeline, "generate_candidates",
+                        lambda topic, wildness, n=None, round_idx=0:
+                        seen.append(n) or original(topic, wildness, n=n, round_idx=round_idx))
+    monkeypatch.setattr(adaptive.controller, "plan", lambda wildness: (3, 1))
+
+    pipeline.generate_idea("topic", 50)
+
+    assert seen == [3]
+    assert counters["judge"] == 1
+    assert adaptive.controller.snapshot()["buckets"]["50"]["rounds"] == 1
+
+
+def test_stats_saved_without_the_histogram_still_load(tmp_path):
+    path = tmp_path / "adaptive.json"
+    path.write_text('{"3": {"rounds": 2, "candidates": 10, "passing": 4}}')
+    snap = adaptive.Controller(str(path)).snapshot()["buckets"]["30"]
+    assert snap["candidates"] == 10 and snap["composites"] == [0] * adaptive._BINS
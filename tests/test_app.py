@@ -1,6 +1,11 @@
+import json
+import os
+import subprocess
+import sys
+
 from fastapi.testclient import TestClient
 
-from app import main
+from app import config, main, pipeline
 
 client = TestClient(main.app)
 
@@ -16,13 +21,205 @@ def test_generate_rejects_empty_topic():
     assert resp.status_code == 422
 
 
+_RESULT = {
+    "idea": "a polished thought", "novelty": 0.8, "coherence": 0.9,
+    "surprise": 0.7, "assumption": "the sky is blue", "operator": "invert",
+    "scoring_degraded": False, "version": "0.3.0",
+}
+
+
 def test_generate_renders_result(monkeypatch):
-    monkeypatch.setattr(main, "generate_idea", lambda topic, wildness=50: {
-        "idea": "a polished thought", "novelty": 0.8, "coherence": 0.9,
-        "surprise": 0.7, "assumption": "the sky is blue", "operator": "invert",
-        "scoring_degraded": False, "version": "0.3.0",
-    })
+    async def fake(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        return _RESULT
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
     resp = client.post("/generate", data={"topic": "the sky", "wildness": "50"})
     assert resp.status_code == 200
     assert "a polished thought" in resp.text
     assert "the sky is blue" in resp.text
+
+
+def test_stream_emits_status_candidates_then_result(monkeypatch):
+    async def fake(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        status_callback("working...")
+        candidate_callback(0, {"text": "a draft", "assumption": "", "operator": "invert"})
+        return _RESULT
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
+    resp = client.get("/generate-stream", params={"topic": "the sky", "wildness": 50})
+    events = [json.loads(line[len("data: "):]) for line in resp.text.splitlines()
+              if line.startswith("data: ")]
+    assert [e["type"] for e in events] == ["status", "candidate", "result"]
+    assert events[1]["data"]["text"] == "a draft"
+    assert events[2]["data"]["idea"] == "a polished thought"
+
+
+def test_stream_passes_fresh_flag(monkeypatch):
+    seen = {}
+
+    async def fake(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        seen["fresh"] = fresh
+        return _RESULT
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
+    client.get("/generate-stream", params={"topic": "the sky", "fresh": 1})
+    assert seen["fresh"] is True
+
+
+def test_generate_surfaces_pipeline_error(monkeypatch):
+    async def boom(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        raise RuntimeError("Generator produced no candidates")
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", boom)
+    resp = client.post("/generate", data={"topic": "the sky", "wildness": "50"})
+    assert resp.status_code == 500
+
+
+def test_generate_batch_returns_results_in_order(monkeypatch):
+    async def fake_batch(topics, wildness=50, fresh=False):
+        return [{**_RESULT, "idea": t} for t in topics[:-1]] + [{"error": "nope"}]
+
+    monkeypatch.setattr(main, "agenerate_ideas_batch", fake_batch)
+    resp = client.post("/generate-batch", json={"topics": ["a", "b", "c"], "wildness": 10})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["topic"] for r in results] == ["a", "b", "c"]
+    assert results[0]["idea"] == "a" and results[2]["error"] == "nope"
+
+
+def test_generate_batch_rejects_empty():
+    assert client.post("/generate-batch", json={"topics": []}).status_code == 422
+
+
+def test_stream_returns_503_with_retry_after_when_queue_full(monkeypatch):
+    monkeypatch.setattr(pipeline.admission, "full", lambda: True)
+    resp = client.get("/generate-stream", params={"topic": "the sky"})
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "# TYPE nbt_generate_seconds histogram" in resp.text
+
+
+def test_healthz_reports_open_breakers():
+    import time
+    from app import config
+    assert client.get("/healthz").json()["status"] == "ok"
+
+    config.breaker("mistral", "m")._opened_at = time.monotonic()
+    body = client.get("/healthz").json()
+    assert body["status"] == "degraded"
+    assert body["breakers"]["mistral:m"]["state"] == "open"
+
+
+def test_deadline_param_is_capped_and_passed_through(monkeypatch):
+    seen = []
+
+    async def fake(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        seen.append(deadline)
+        return _RESULT
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
+    client.get("/generate-stream", params={"topic": "a", "deadline": 5})
+    client.get("/generate-stream", params={"topic": "b", "deadline": 1e6})
+    client.post("/generate", data={"topic": "c"})
+    assert seen == [5, config.MAX_DEADLINE, None]
+
+
+# Budget for app.*'s own import time (dependencies excluded) in a cold interpreter;
+# ~45 ms today. Raise it deliberately, not to make a regression pass. Heavy
+# dependencies are kept out of it by asserting they are not imported at all.
+_IMPORT_BUDGET_MS = 250
+_DEFERRED = ("google.genai", "requests", "httpx", "numpy")
+
+
+def test_cold_import_skips_provider_sdks_and_stays_in_budget():
+    code = ("import sys, app.main; "
+            f"print([m for m in {_DEFERRED!r} if m in sys.modules])")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root,
+                          capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == "[]"            # loaded on first generation only
+
+    own_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if name.strip().split(".")[0] == "app":
+            own_us += int(self_us)
+    assert own_us / 1000 < _IMPORT_BUDGET_MS
+
+
+def test_stream_sends_keep_alive_comments(monkeypatch):
+    import asyncio
+
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        await asyncio.sleep(0.05)
+        return _RESULT
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+    monkeypatch.setattr(config, "SSE_HEARTBEAT", 0.01)
+    resp = client.get("/generate-stream", params={"topic": "slow sky"})
+    assert ": keep-alive" in resp.text
+    assert resp.text.rstrip().splitlines()[-1].startswith("data: ")
+
+
+def test_stream_notices_a_gone_client_before_the_heartbeat(monkeypatch):
+    import asyncio
+    state = {"cancelled": False}
+
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    class Gone:
+        async def is_disconnected(self):
+            return True
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+    monkeypatch.setattr(config, "SSE_HEARTBEAT", 60)
+    monkeypatch.setattr(config, "SSE_DISCONNECT_POLL", 0.01)
+
+    async def run():
+        resp = await main.generate_stream(Gone(), "gone sky")
+        sent = [chunk async for chunk in resp.body_iterator]
+        await asyncio.sleep(0)
+        return sent
+
+    assert asyncio.run(asyncio.wait_for(run(), 2)) == []
+    assert state["cancelled"]
+
+
+def test_another_one_is_served_from_the_inventory(monkeypatch):
+    async def boom(*args, **kwargs):
+        raise AssertionError("should not run the pipeline")
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", boom)
+    monkeypatch.setattr(config, "INVENTORY_LOW", 0)
+    pipeline._stock("the sky", 50, [{"text": "a shelved runner-up", "assumption": "",
+                                     "operator": "merge", "novelty": 0.8, "coherence": 0.9,
+                                     "surprise": 0.7, "composite": 0.8}])
+    resp = client.post("/generate", data={"topic": "the sky", "wildness": "50", "another": "1"})
+    assert resp.status_code == 200 and "a shelved runner-up" in resp.text
+
+
+def test_usage_endpoint_reports_the_ledger():
+    config.ledger.record("mistral", "m", 30, 12)
+    body = client.get("/usage").json()
+    assert body["budget"]["spent_tokens"] == 42
+    assert next(iter(body["days"].values()))["mistral:m"]["calls"] == 1
@@ -0,0 +1,41 @@
+import json
+import random
+
+import httpx
+import pytest
+
+from bench import fakes, run
+
+
+def test_latency_specs_parse_and_sample_in_range():
+    rng = random.Random(1)
+    assert fakes.Latency.parse("fixed:0.25").sample(rng) == 0.25
+    assert 0.1 <= fakes.Latency.parse("uniform:0.1,0.2").sample(rng) <= 0.2
+    assert fakes.Latency.parse("lognormal:0.5,0.3").sample(rng) > 0
+    with pytest.raises(ValueError):
+        fakes.Latency.parse("pareto:1")
+
+
+def test_fault_injection_rates_are_roughly_honoured():
+    behavior = fakes.Behavior(error_rate=0.2, quota_rate=0.1, malformed_rate=0.1, seed=3)
+    for _ in range(2000):
+        behavior.roll()
+    faults = behavior.stats()["faults"]
+    assert behavior.calls == 2000
+    assert 300 < faults["5xx"] < 500 and 120 < faults["429"] < 280
+    assert 120 < faults["malformed"] < 280
+
+
+def test_fake_mistral_scores_every_paragraph():
+    with fakes.Server(fakes.mistral_app(fakes.Behavior())) as server:
+        user = 'Score these 2 paragraphs as JSON:\n\n[0]\n"""\na\n"""\n\n[1]\n"""\nb\n"""'
+        resp = httpx.post(f"{server.url}/v1/chat/completions",
+                          json={"messages": [{"role": "user", "content": user}]})
+    content = resp.json()["choices"][0]["message"]["content"]
+    assert [s["index"] for s in json.loads(content)["scores"]] == [0, 1]
+
+
+def test_percentiles_use_nearest_rank():
+    stats = run._percentiles([float(i) for i in range(1, 101)])
+    assert stats == {"p50": 51.0, "p95": 96.0, "p99": 100.0, "max": 100.0}
+    assert run._percentiles([])["p99"] is None
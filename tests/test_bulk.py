@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from app import bulk, pipeline
+
+
+def test_read_rows_accepts_objects_and_bare_strings():
+    rows = bulk._read_rows(['{"topic": "tides", "wildness": 80}', "", '"black holes"'], 50)
+    assert rows == [{"id": "tides@80", "topic": "tides", "wildness": 80},
+                    {"id": "black holes@50", "topic": "black holes", "wildness": 50}]
+
+
+def test_unreadable_rows_get_an_error_record_and_the_rest_still_run(monkeypatch, tmp_path):
+    async def fake(topic, wildness=50, fresh=False):
+        return {"idea": f"{topic}!"}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
+    rows = bulk._read_rows(["42", '["a"]', '{"topic": "t", "wildness": "high"}', '"ok"'], 50)
+    assert [r.get("error", "").split(":")[0] for r in rows] == ["line 1", "line 2", "line 3", ""]
+
+    out = tmp_path / "out.jsonl"
+    assert asyncio.run(bulk.run(rows, str(out), workers=2)) == {"ok": 1, "error": 3}
+    assert "wildness must be an integer" in out.read_text()
+
+
+def test_run_streams_results_and_resumes(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake(topic, wildness=50, fresh=False):
+        calls.append(topic)
+        if topic == "bad":
+            raise RuntimeError("boom")
+        return {"idea": f"{topic}!", "novelty": 0.9}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", fake)
+    rows = bulk._read_rows(['"a"', '"b"', '"bad"'], 50)
+    out = tmp_path / "out.jsonl"
+
+    counts = asyncio.run(bulk.run(rows, str(out), workers=2))
+    assert counts == {"ok": 2, "error": 1}
+    written = [json.loads(line) for line in out.read_text().splitlines()]
+    assert {r["idea"] for r in written if "idea" in r} == {"a!", "b!"}
+
+    calls.clear()
+    asyncio.run(bulk.run(rows, str(out), workers=2))
+    assert calls == ["bad"]                   # finished rows are not regenerated
+
+    calls.clear()
+    rows = bulk._read_rows(['"new"', '"a"', '"b"', '"bad"'], 50)   # a line inserted on top
+    asyncio.run(bulk.run(rows, str(out), workers=2))
+    assert sorted(calls) == ["bad", "new"]
@@ -0,0 +1,32 @@
+from app import cache
+
+
+def test_topic_key_normalizes_case_whitespace_and_punctuation():
+    assert cache.topic_key("  Black   Holes! ", 42) == cache.topic_key("black holes", 47)
+    assert cache.topic_key("black holes", 42) != cache.topic_key("black holes", 55)
+
+
+def test_lru_evicts_least_recently_used():
+    c = cache.TTLCache(max_size=2, ttl=60)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1                    # "a" is now most recent
+    c.put("c", 3)
+    assert c.get("b") is None
+    assert c.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = cache.TTLCache(max_size=4, ttl=10)
+    c.put("a", 1)
+    now[0] += 11
+    assert c.get("a") is None
+    assert c.stats() == {"size": 0, "max_size": 4, "hits": 0, "misses": 1, "evictions": 1}
+
+
+def test_zero_size_disables():
+    c = cache.TTLCache(max_size=0, ttl=10)
+    c.put("a", 1)
+    assert c.get("a") is None
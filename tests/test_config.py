@@ -1,4 +1,10 @@
-from app import config
+import asyncio
+
+import pytest
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+from app import config, metrics
 
 
 def test_wildness_endpoints_map_to_temp_bounds():
@@ -19,3 +25,242 @@ def test_wildness_midpoint_between_bounds():
 def test_temperature_cap_is_sane():
     # Past ~1.4 Gemini degrades; the cap must stay well under the API max of 2.0.
     assert config.TEMP_MAX <= 1.4
+
+
+class _FlakyModels:
+    def __init__(self, codes):
+        self.codes = list(codes)
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        if self.codes:
+            raise genai_errors.APIError(self.codes.pop(0), {"error": {"message": "x"}})
+        return "ok"
+
+
+def _fake_client(models):
+    return type("C", (), {"aio": type("A", (), {"models": models})()})()
+
+
+def test_agemini_generate_retries_5xx_without_blocking(monkeypatch):
+    models = _FlakyModels([503])
+    slept = []
+
+    async def fake_sleep(s):
+        slept.append(s)
+
+    async def run():
+        metrics.wildness_label.set("40")
+        return await config.agemini_generate("m", "hi", None)
+
+    monkeypatch.setattr(config, "gemini_client", _fake_client(models))
+    monkeypatch.setattr(config.asyncio, "sleep", fake_sleep)
+    retries = metrics.RETRIES.value(provider="gemini", model="m", code=503, wildness="40")
+    assert asyncio.run(run()) == "ok"
+    assert models.calls == 2 and slept == [1.5]
+    assert metrics.RETRIES.value(provider="gemini", model="m", code=503,
+                                 wildness="40") == retries + 1
+
+
+def test_agemini_generate_does_not_retry_quota(monkeypatch):
+    models = _FlakyModels([429])
+
+    async def run():
+        metrics.wildness_label.set("40")
+        return await config.agemini_generate("m", "hi", None)
+
+    monkeypatch.setattr(config, "gemini_client", _fake_client(models))
+    quota = metrics.QUOTA_ERRORS.value(provider="gemini", model="m", wildness="40")
+    with pytest.raises(genai_errors.APIError):
+        asyncio.run(run())
+    assert models.calls == 1
+    assert metrics.QUOTA_ERRORS.value(provider="gemini", model="m", wildness="40") == quota + 1
+
+
+def test_open_breaker_fails_over_to_the_failover_model(monkeypatch):
+    import time
+    seen = []
+
+    class Models:
+        async def generate_content(self, model, contents, config):
+            seen.append(model)
+            return "ok"
+
+    monkeypatch.setattr(config, "gemini_client", _fake_client(Models()))
+    monkeypatch.setattr(config, "GEMINI_FAILOVER_MODEL", "gemini-backup")
+    config.breaker("gemini", "gemini-main")._opened_at = time.monotonic()
+
+    assert asyncio.run(config.agemini_generate("gemini-main", "p", None)) == "ok"
+    assert seen == ["gemini-backup"]
+
+    monkeypatch.setattr(config, "GEMINI_FAILOVER_MODEL", "")
+    with pytest.raises(config.CircuitOpen):            # no failover: fail fast
+        asyncio.run(config.agemini_generate("gemini-main", "p", None))
+
+
+def test_slow_successes_alone_do_not_open_the_gemini_breaker(monkeypatch):
+    from app import limits
+    now = [0.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    breaker = config.breaker("gemini", "gemini-slow")     # default config
+    for _ in range(config.BREAKER_WINDOW):
+        with breaker.guard(is_failure=config.is_outage):
+            now[0] += 60                                    # a long composer call
+    assert breaker.state == "closed" and breaker.failure_rate() == 0
+
+
+def test_deadline_scope_keeps_the_earlier_deadline():
+    assert config.remaining() is None
+    with config.deadline_scope(5):
+        with config.deadline_scope(100):           # a nested scope can't extend it
+            assert config.remaining() <= 5
+        with config.deadline_scope(1):
+            assert config.remaining() <= 1
+    assert config.remaining() is None
+    with config.deadline_scope(1e6):
+        assert config.remaining() <= config.MAX_DEADLINE
+
+
+def test_agemini_generate_stops_at_the_deadline(monkeypatch):
+    class Slow:
+        async def generate_content(self, model, contents, config):
+            await asyncio.sleep(5)
+
+    async def run():
+        with config.deadline_scope(0.05):
+            await config.agemini_generate("m", "hi", None)
+
+    monkeypatch.setattr(config, "gemini_client", _fake_client(Slow()))
+    with pytest.raises(config.DeadlineExceeded):
+        asyncio.run(run())
+    assert config.breaker("gemini", "m").failure_rate() == 0   # our budget, not an outage
+
+
+def test_gemini_generate_turns_the_http_timeout_into_deadline_exceeded(monkeypatch):
+    import time
+
+    import httpx
+
+    class Slow:
+        def generate_content(self, model, contents, config):
+            time.sleep(config.http_options.timeout / 1000)   # the SDK's own timeout
+            raise httpx.ReadTimeout("timed out")
+
+    monkeypatch.setattr(config, "gemini_client", type("C", (), {"models": Slow()})())
+    with pytest.raises(config.DeadlineExceeded):
+        with config.deadline_scope(0.05):
+            config.gemini_generate("m", "hi", genai_types.GenerateContentConfig())
+    assert config.breaker("gemini", "m").failure_rate() == 0   # our budget, not an outage
+
+
+def test_retry_skipped_when_the_backoff_outlives_the_deadline(monkeypatch):
+    models = _FlakyModels([503])
+
+    async def run():
+        with config.deadline_scope(1):
+            await config.agemini_generate("m", "hi", None)
+
+    monkeypatch.setattr(config, "gemini_client", _fake_client(models))
+    with pytest.raises(genai_errors.APIError):
+        asyncio.run(run())
+    assert models.calls == 1
+
+
+class _CachingClient:
+    """Fake async client with a ``caches`` API; records the config of every call."""
+
+    def __init__(self, create_error=None, generate_errors=()):
+        self.created, self.configs = [], []
+        self.create_error, self.generate_errors = create_error, list(generate_errors)
+        client = self
+
+        class Caches:
+            async def create(self, model, config):
+                client.created.append(model)
+                if client.create_error:
+                    raise client.create_error
+                usage = type("U", (), {"total_token_count": 600})()
+                return type("H", (), {"name": f"cachedContents/{len(client.created)}",
+                                      "usage_metadata": usage})()
+
+        class Models:
+            async def generate_content(self, model, contents, config):
+                client.configs.append(config)
+                if client.generate_errors:
+                    raise client.generate_errors.pop(0)
+                usage = type("U", (), {"total_token_count": 700,
+                                       "cached_content_token_count": None})()
+                return type("R", (), {"text": "ok", "usage_metadata": usage})()
+
+        self.aio = type("A", (), {"caches": Caches(), "models": Models()})()
+
+
+_INSTRUCTION = "Be novel. " * 500   # ~1250 tokens, over the cacheable minimum
+
+
+def _instructed(instruction=_INSTRUCTION):
+    return genai_types.GenerateContentConfig(system_instruction=instruction, temperature=1.0)
+
+
+def test_system_instruction_is_sent_as_a_cached_handle(monkeypatch):
+    client = _CachingClient()
+    monkeypatch.setattr(config, "PROMPT_CACHE", True)
+    monkeypatch.setattr(config, "gemini_client", client)
+
+    async def run():
+        for _ in range(3):
+            await config.agemini_generate("m", "hi", _instructed())
+
+    asyncio.run(run())
+    assert client.created == ["m"]                       # created once, then reused
+    assert all(c.cached_content == "cachedContents/1" and c.system_instruction is None
+               for c in client.configs)
+    assert metrics.PROMPT_TOKENS_SAVED.value(provider="gemini", model="m") == 1800
+
+
+def test_prompt_cache_falls_back_inline_when_the_model_refuses(monkeypatch):
+    client = _CachingClient(create_error=genai_errors.APIError(
+        400, {"error": {"message": "Cached content is too small"}}))
+    monkeypatch.setattr(config, "PROMPT_CACHE", True)
+    monkeypatch.setattr(config, "gemini_client", client)
+
+    async def run():
+        for _ in range(2):
+            await config.agemini_generate("m", "hi", _instructed())
+
+    asyncio.run(run())
+    assert client.created == ["m"]                       # a 4xx isn't asked again
+    assert [c.system_instruction for c in client.configs] == [_INSTRUCTION, _INSTRUCTION]
+
+
+def test_instruction_below_the_cacheable_minimum_is_never_uploaded(monkeypatch):
+    client = _CachingClient()
+    monkeypatch.setattr(config, "PROMPT_CACHE", True)
+    monkeypatch.setattr(config, "gemini_client", client)
+
+    asyncio.run(config.agemini_generate("m", "hi", _instructed("be novel")))
+    assert client.created == []
+    assert client.configs[0].system_instruction == "be novel"
+
+
+def test_generator_instruction_is_sent_inline_by_default(monkeypatch):
+    from app.modules import generator
+    gen_config = generator._gen_config(50)
+    assert config._cacheable(gen_config) is None               # off by default
+
+    monkeypatch.setattr(config, "PROMPT_CACHE", True)
+    assert config._cacheable(gen_config) is None               # ~560 tokens, under 1024
+    monkeypatch.setattr(config, "PROMPT_CACHE_MIN_TOKENS", 512)
+    assert config._cacheable(gen_config) == generator.SYSTEM_INSTRUCTION
+
+
+def test_stale_cached_handle_is_recreated(monkeypatch):
+    client = _CachingClient(generate_errors=[genai_errors.APIError(
+        404, {"error": {"message": "CachedContent not found"}})])
+    monkeypatch.setattr(config, "PROMPT_CACHE", True)
+    monkeypatch.setattr(config, "gemini_client", client)
+
+    assert asyncio.run(config.agemini_generate("m", "hi", _instructed())).text == "ok"
+    assert client.created == ["m", "m"]
+    assert client.configs[-1].cached_content == "cachedContents/2"
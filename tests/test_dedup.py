@@ -0,0 +1,54 @@
+import pytest
+
+from app.modules import dedup
+
+_IDEA = ("Continents drift because the mantle remembers every earthquake, storing "
+         "strain like a diary and releasing it slowly as the plates wander apart.")
+_REWORDED = _IDEA.replace("slowly", "gradually")
+_OTHER = ("Photosynthesis could run backwards at night, with leaves exhaling sugar "
+          "into the soil so fungi can trade it for minerals before dawn arrives.")
+
+
+def test_flags_near_duplicates_but_not_distinct_ideas():
+    index = dedup.NearDupIndex(max_size=10, threshold=0.6)
+    index.add(_IDEA)
+    assert index.is_repeat(_REWORDED)
+    assert not index.is_repeat(_OTHER)
+
+
+def test_memory_is_bounded_to_most_recent():
+    index = dedup.NearDupIndex(max_size=1, threshold=0.6)
+    index.add(_IDEA)
+    index.add(_OTHER)
+    assert len(index) == 1
+    assert not index.is_repeat(_IDEA) and index.is_repeat(_OTHER)
+
+
+def test_persists_signatures(tmp_path):
+    path = str(tmp_path / "served.npz")
+    index = dedup.NearDupIndex(max_size=10, threshold=0.6, path=path)
+    index.add(_IDEA)
+    index.save()
+    reloaded = dedup.NearDupIndex(max_size=10, threshold=0.6, path=path)
+    assert len(reloaded) == 1 and reloaded.is_repeat(_REWORDED)
+
+
+def test_add_reuses_a_precomputed_signature(monkeypatch):
+    index = dedup.NearDupIndex(max_size=10, threshold=0.6)
+    sig = index.signature(_IDEA)
+    assert not index.is_repeat(_IDEA, sig)
+    monkeypatch.setattr(index, "signature", lambda text: pytest.fail("recomputed"))
+    index.add(_IDEA, sig)
+    index.add(_REWORDED, sig)                     # a repeat: not indexed twice
+    assert len(index._order) == 1 and index._unsaved == 1
+
+
+def test_concurrent_adds_save_once_per_fifty(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    index = dedup.NearDupIndex(max_size=200, threshold=0.99, path=str(tmp_path / "s.npz"))
+    saves = []
+    monkeypatch.setattr(index, "save", lambda: saves.append(1))
+    texts = [f"idea number {i} about tides {i * 7} and moons {i * 13} drifting" for i in range(100)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(index.add, texts))
+    assert len(index) == 100 and len(saves) == 2
@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import pytest
@@ -26,6 +27,17 @@ def test_extract_falls_back_to_raw_json():
     assert out == [{"text": "Big idea.", "assumption": "Y", "operator": "rescale"}]
 
 
+def test_extract_salvages_complete_objects_from_a_damaged_array():
+    from app import metrics
+    good = {"assumption": "Y", "operator": "rescale", "idea": "Big idea."}
+    text = ("```json\n[" + json.dumps(good) + ', {"assumption": "Z", "operator": "merge", '
+            '"idea": "Trailing comma.",}, {"assumption": "W", "operator": "inv')  # cut off
+    out = generator._extract(_FakeResp(text=text))
+    assert [c["text"] for c in out] == ["Big idea.", "Trailing comma."]
+    assert metrics.SALVAGED.value(model=generator.config.GEMINI_COMPOSER_MODEL,
+                                  wildness=metrics.wildness_label.get()) == 2
+
+
 def test_generate_candidates_uses_one_call(monkeypatch):
     calls = {"n": 0}
 
@@ -46,3 +58,58 @@ def test_generate_candidates_raises_when_empty(monkeypatch):
                         lambda model, contents, gen_config: _FakeResp(parsed=[]))
     with pytest.raises(RuntimeError):
         generator.generate_candidates("topic", 50, n=3)
+
+
+def test_agenerate_candidates_awaits_async_client(monkeypatch):
+    async def fake_agen(model, contents, gen_config):
+        return _FakeResp(parsed=[generator._Candidate(assumption="a", operator="invert",
+                                                      idea="Idea.")])
+
+    monkeypatch.setattr(generator.config, "agemini_generate", fake_agen)
+    cands = asyncio.run(generator.agenerate_candidates("topic", 50, n=1))
+    assert cands == [{"text": "Idea.", "assumption": "a", "operator": "invert"}]
+
+
+def test_array_stream_yields_objects_as_they_close():
+    text = json.dumps([
+        {"assumption": "braces {in} strings", "operator": "merge", "idea": 'A "quoted" idea.'},
+        {"assumption": "b", "operator": "invert", "idea": "Second idea."},
+    ])
+    parser = generator._ArrayStream()
+    seen = []
+    for i in range(0, len(text), 7):          # arbitrary chunk boundaries
+        seen.extend(parser.feed(text[i:i + 7]))
+    assert [s["idea"] for s in seen] == ['A "quoted" idea.', "Second idea."]
+    assert seen[0]["assumption"] == "braces {in} strings"
+
+
+def test_astream_candidates_yields_each_candidate(monkeypatch):
+    text = json.dumps([{"assumption": f"a{i}", "operator": "invert", "idea": f"Idea {i}."}
+                       for i in range(3)])
+
+    async def fake_stream(model, contents, gen_config):
+        for i in range(0, len(text), 10):
+            yield _FakeResp(text=text[i:i + 10])
+
+    monkeypatch.setattr(generator.config, "agemini_generate_stream", fake_stream)
+
+    async def collect():
+        return [c async for c in generator.astream_candidates("topic", 50, n=3)]
+
+    cands = asyncio.run(collect())
+    assert [c["text"] for c in cands] == ["Idea 0.", "Idea 1.", "Idea 2."]
+
+
+def test_batch_groups_candidates_by_topic_index(monkeypatch):
+    async def fake_agen(model, contents, gen_config):
+        assert "[1] tides" in contents
+        parsed = [
+            generator._BatchCandidate(topic=1, assumption="a", operator="invert", idea="Tide idea."),
+            generator._BatchCandidate(topic=0, assumption="b", operator="merge", idea="Sky idea."),
+            generator._BatchCandidate(topic=9, assumption="c", operator="merge", idea="Stray."),
+        ]
+        return _FakeResp(parsed=parsed)
+
+    monkeypatch.setattr(generator.config, "agemini_generate", fake_agen)
+    groups = asyncio.run(generator.agenerate_candidates_batch(["sky", "tides", "rocks"], 50, n=1))
+    assert [[c["text"] for c in g] for g in groups] == [["Sky idea."], ["Tide idea."], []]
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import config, metrics
+from app.hedging import Hedger
+
+
+def _warm(hedger, seconds=0.01, n=20, provider="gemini", model="m"):
+    for _ in range(n):
+        hedger.observe(provider, model, seconds)
+
+
+def test_threshold_waits_for_samples_then_tracks_p90_with_clamps():
+    hedger = Hedger(enabled=True, min_delay=0.05, max_delay=1.0, min_samples=10)
+    for i in range(9):
+        hedger.observe("gemini", "m", 0.1 * (i + 1))
+    assert hedger.threshold("gemini", "m") is None
+    hedger.observe("gemini", "m", 1.0)
+    assert hedger.threshold("gemini", "m") == pytest.approx(0.9)
+    _warm(hedger, 5.0, n=200)
+    assert hedger.threshold("gemini", "m") == 1.0          # clamped to max_delay
+
+
+def test_slow_call_is_hedged_to_secondary_and_loser_cancelled():
+    hedger = Hedger(enabled=True, budget=1.0, min_delay=0.01)
+    _warm(hedger)
+    events, cancelled = [], []
+
+    async def call(model):
+        try:
+            await asyncio.sleep(1.0 if model == "m" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    async def main():
+        result = await hedger.arun("gemini", "m", call, secondary="backup",
+                                   on_hedge=lambda e, m: events.append((e, m)))
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "backup"
+    assert events == [("fired", "backup"), ("won", "backup")]
+    assert cancelled == ["m"]
+
+
+def test_cancelled_loser_is_reported_and_backup_latency_excludes_the_delay():
+    hedger = Hedger(enabled=True, budget=1.0, min_delay=0.1, min_samples=1)
+    hedger.observe("gemini", "m", 0.1)
+    booked = []
+
+    async def call(model):
+        await asyncio.sleep(1.0 if model == "m" else 0.01)
+        return {"usage": model}
+
+    result = asyncio.run(hedger.arun("gemini", "m", call, secondary="b",
+                                     on_cancel=lambda m, winner: booked.append((m, winner))))
+    assert booked == [("m", result)]
+    assert list(hedger._latency["gemini", "b"])[0] < 0.1   # not the 0.1 s wait first
+
+
+def test_agemini_generate_books_an_estimate_for_the_cancelled_racer(monkeypatch):
+    class Usage:
+        prompt_token_count = 100
+        total_token_count = 130
+        cached_content_token_count = None
+
+    class Models:
+        async def generate_content(self, model, contents, config):
+            await asyncio.sleep(1.0 if model == "gemini-slow" else 0.01)
+            return type("R", (), {"usage_metadata": Usage()})()
+
+    client = type("C", (), {"aio": type("A", (), {"models": Models()})()})()
+    monkeypatch.setattr(config, "gemini_client", client)
+    monkeypatch.setattr(config, "HEDGE_GEMINI_MODEL", "gemini-fast")
+    monkeypatch.setattr(config, "hedger", Hedger(enabled=True, budget=1.0, min_delay=0.01))
+    _warm(config.hedger, model="gemini-slow")
+
+    with config.usage_scope() as usage:
+        asyncio.run(config.agemini_generate("gemini-slow", "prompt", None))
+    assert usage["models"]["gemini:gemini-fast"]["tokens"] == 130
+    assert usage["models"]["gemini:gemini-slow"]["tokens"] == 130    # the estimate
+
+
+def test_failed_racer_falls_back_to_the_other():
+    hedger = Hedger(enabled=True, budget=1.0, min_delay=0.01)
+    _warm(hedger)
+
+    async def call(model):
+        if model == "m":
+            await asyncio.sleep(0.05)
+            raise RuntimeError("primary broke")
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert asyncio.run(hedger.arun("gemini", "m", call, secondary="b")) == "ok"
+
+
+def test_budget_caps_hedges():
+    hedger = Hedger(enabled=True, budget=0.0, min_delay=0.01)
+    _warm(hedger)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        await asyncio.sleep(0.05)
+        return model
+
+    assert asyncio.run(hedger.arun("gemini", "m", call, secondary="b")) == "m"
+    assert calls == ["m"]
+
+
+def test_sync_hedge_returns_first_finisher():
+    hedger = Hedger(enabled=True, budget=1.0, min_delay=0.01)
+    _warm(hedger)
+
+    def call(model):
+        time.sleep(0.3 if model == "m" else 0.01)
+        return model
+
+    assert hedger.run("gemini", "m", call, secondary="b") == "b"
+
+
+def test_sync_hedge_loser_finishing_late_books_to_the_ledger_only(monkeypatch):
+    monkeypatch.setattr(config, "hedger", Hedger(enabled=True, budget=1.0, min_delay=0.01))
+    _warm(config.hedger, provider="mistral")
+    loser_done = threading.Event()
+
+    def call(model):
+        time.sleep(0.2 if model == "m" else 0.02)
+        config.count_usage("mistral", model, 100, 30)
+        if model == "m":
+            loser_done.set()
+        return model
+
+    with config.usage_scope() as usage:
+        assert config.run_hedged("mistral", "m", call, secondary="b") == "b"
+        settled = config.ledger.settle(usage)
+    assert loser_done.wait(2)
+    assert usage == settled and set(usage["models"]) == {"mistral:b"}
+    day = next(iter(config.ledger.snapshot()["days"].values()))
+    assert day["mistral:m"]["tokens"] == day["mistral:b"]["tokens"] == 130
+
+
+class _SlowPrimary:
+    def __init__(self):
+        self.models = []
+
+    async def generate_content(self, model, contents, config):
+        self.models.append(model)
+        await asyncio.sleep(1.0 if model == "gemini-slow" else 0.01)
+        return f"from {model}"
+
+
+def test_agemini_generate_hedges_to_secondary_model(monkeypatch):
+    models = _SlowPrimary()
+    client = type("C", (), {"aio": type("A", (), {"models": models})()})()
+    monkeypatch.setattr(config, "gemini_client", client)
+    monkeypatch.setattr(config, "HEDGE_GEMINI_MODEL", "gemini-fast")
+    monkeypatch.setattr(config, "hedger", Hedger(enabled=True, budget=1.0, min_delay=0.01))
+    _warm(config.hedger, model="gemini-slow")
+
+    result = asyncio.run(config.agemini_generate("gemini-slow", "prompt", None))
+
+    assert result == "from gemini-fast"
+    assert models.models == ["gemini-slow", "gemini-fast"]
+    labels = {"provider": "gemini", "model": "gemini-slow", "backup": "gemini-fast"}
+    assert metrics.HEDGES_FIRED.value(**labels) == 1
+    assert metrics.HEDGES_WON.value(**labels) == 1
@@ -1,3 +1,7 @@
+import asyncio
+
+import pytest
+
 from app import config
 from app.modules import judge
 
@@ -55,3 +59,190 @@ def test_judge_degrades_on_api_error(monkeypatch):
     monkeypatch.setattr(judge, "_call_mistral", boom)
     verdict = judge.judge_candidates([_cand(_GOOD)])
     assert verdict["scoring_degraded"] is True
+
+
+def test_judge_lets_a_deadline_through_instead_of_degrading(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+
+    def late(subset):
+        raise config.DeadlineExceeded("Request deadline exceeded")
+
+    monkeypatch.setattr(judge, "_call_mistral", late)
+    with pytest.raises(config.DeadlineExceeded):
+        judge.judge_candidates([_cand(_GOOD)])
+
+
+def test_async_judge_maps_indices_and_ignores_out_of_range(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    cands = [_cand(_GOOD, "a"), _cand(_GOOD, "b")]
+
+    async def fake_acall(subset):
+        return [
+            {"index": 1, "coherence": 0.9, "novelty": 0.9, "surprise": 0.9, "rationale": "ok"},
+            {"index": 7, "coherence": 1.0, "novelty": 1.0, "surprise": 1.0, "rationale": "bogus"},
+        ]
+
+    monkeypatch.setattr(judge, "_acall_mistral", fake_acall)
+    verdict = asyncio.run(judge.ajudge_candidates(cands))
+    assert verdict["ranked"][0]["assumption"] == "b"
+    assert verdict["scoring_degraded"] is False
+
+
+def test_batch_judge_scores_in_one_call_and_ranks_per_group(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    calls = []
+
+    async def fake_acall(subset):
+        calls.append(len(subset))
+        # flat indices: group 0 → 0, 1; group 1 → 2
+        return [{"index": i, "coherence": 0.9, "novelty": nov, "surprise": 0.5, "rationale": ""}
+                for i, nov in enumerate([0.2, 0.8, 0.6])]
+
+    monkeypatch.setattr(judge, "_acall_mistral", fake_acall)
+    verdicts = asyncio.run(judge.ajudge_candidates_batch(
+        [[_cand(_GOOD, "a0"), _cand(_GOOD, "a1")], [_cand(_GOOD, "b0")]]))
+    assert calls == [3]
+    assert [c["assumption"] for c in verdicts[0]["ranked"]] == ["a1", "a0"]
+    assert verdicts[1]["ranked"][0]["novelty"] == 0.6
+
+
+def test_near_duplicates_skip_the_judge_call(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    served = "A tide that rises inward toward the planet's core would drain every ocean overnight."
+    fresh = "Clouds could be libraries where each raindrop carries a sentence from older storms."
+    judge.dedup.index.add(served)
+    sent = []
+
+    def fake_call(subset):
+        sent.extend(c["text"] for c in subset)
+        return [{"index": 0, "coherence": 0.9, "novelty": 0.8, "surprise": 0.8, "rationale": ""}]
+
+    monkeypatch.setattr(judge, "_call_mistral", fake_call)
+    verdict = judge.judge_candidates([_cand(served, "old"), _cand(fresh, "new")])
+    assert sent == [fresh]
+    assert verdict["ranked"][0]["assumption"] == "new"
+    assert verdict["ranked"][1]["novelty"] == 0.0
+    assert verdict["scoring_degraded"] is False
+
+
+def test_score_cache_sends_only_misses_and_flags_only_failures(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    monkeypatch.setattr(config, "MISTRAL_MODEL", "mistral-small-latest")
+    seen = "The moon could be a seed that the Earth planted long ago, still slowly sprouting."
+    new = "Rivers might be the planet's handwriting, and deltas the places it signs its name."
+    sent = []
+
+    def ok_call(subset):
+        sent.append([c["text"] for c in subset])
+        return [{"index": 0, "coherence": 0.9, "novelty": 0.9, "surprise": 0.9, "rationale": "r"}]
+
+    monkeypatch.setattr(judge, "_call_mistral", ok_call)
+    judge.judge_candidates([_cand(seen, "seen")])
+
+    def boom(subset):
+        sent.append([c["text"] for c in subset])
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(judge, "_call_mistral", boom)
+    verdict = judge.judge_candidates([_cand(seen, "seen"), _cand(new, "new")])
+
+    assert sent == [[seen], [new]]            # the cached text was not re-sent
+    by_tag = {c["assumption"]: c for c in verdict["ranked"]}
+    assert by_tag["seen"]["scoring_degraded"] is False and by_tag["seen"]["novelty"] == 0.9
+    assert by_tag["new"]["scoring_degraded"] is True
+    assert verdict["scoring_degraded"] is True
+
+
+def test_score_cache_key_includes_model_and_whitespace_normalization():
+    store = judge.score_cache.ScoreCache()
+    store.put_many({"An  idea.\n": {"novelty": 0.7}}, "model-a:v1")
+    assert store.get_many(["An idea."], "model-a:v1") == {"An idea.": {"novelty": 0.7}}
+    assert store.get_many(["An idea."], "model-b:v1") == {}
+
+
+def test_open_breaker_skips_the_judge_call(monkeypatch):
+    import time
+
+    import requests
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    posts = []
+    monkeypatch.setattr(requests, "post", lambda *a, **k: posts.append(a))
+    config.breaker("mistral", config.MISTRAL_MODEL)._opened_at = time.monotonic()
+
+    verdict = judge.judge_candidates([_cand(_GOOD)])
+
+    assert verdict["scoring_degraded"] is True
+    assert posts == []                                 # no 30 s wait on a dead judge
+
+
+def _pool(novelty):
+    """Distinct quick-ok candidates tagged by index, with the judge's 'true' novelty."""
+    cands = [_cand(f"Idea number {k} is comfortably long enough and ends properly here.", k)
+             for k in range(len(novelty))]
+    return cands, {c["text"]: nov for c, nov in zip(cands, novelty)}
+
+
+def _scores(subset, truth, bias=0.0):
+    return [{"index": i, "coherence": 0.9, "novelty": truth[c["text"]] + bias,
+             "surprise": 0.5, "rationale": ""} for i, c in enumerate(subset)]
+
+
+def test_sharded_judge_puts_shards_on_the_anchor_scale(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    monkeypatch.setattr(config, "JUDGE_SHARD_SIZE", 2)
+    monkeypatch.setattr(config, "JUDGE_ANCHORS", 1)
+    cands, truth = _pool([0.5, 0.6, 0.7, 0.55, 0.65])
+    shards = []
+
+    async def fake_acall(subset):
+        shards.append([c["assumption"] for c in subset])
+        lenient = any(c["assumption"] == 2 for c in subset)   # this shard scores 0.3 high
+        return _scores(subset, truth, 0.3 if lenient else 0.0) + [
+            {"index": 9, "coherence": 1.0, "novelty": 1.0, "surprise": 1.0}]
+
+    monkeypatch.setattr(judge, "_acall_mistral", fake_acall)
+    verdict = asyncio.run(judge.ajudge_candidates(cands))
+    novelty = {c["assumption"]: c["novelty"] for c in verdict["ranked"]}
+
+    assert sorted(shards) == [[0, 1], [0, 2, 3], [0, 4]]     # anchor 0 in every shard
+    assert novelty[4] > novelty[3]                           # raw: 0.65 vs 0.85
+    assert novelty == {0: 0.6, 1: 0.7, 2: 0.8, 3: 0.65, 4: 0.75}
+    assert verdict["scoring_degraded"] is False
+
+
+def test_failed_shard_falls_back_only_for_its_candidates(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    monkeypatch.setattr(config, "JUDGE_SHARD_SIZE", 2)
+    cands, truth = _pool([0.5, 0.6, 0.7, 0.55])
+
+    def fake_call(subset):
+        if any(c["assumption"] == 3 for c in subset):
+            raise RuntimeError("network down")
+        return _scores(subset, truth)
+
+    monkeypatch.setattr(judge, "_call_mistral", fake_call)
+    verdict = judge.judge_candidates(cands)
+    degraded = {c["assumption"]: c["scoring_degraded"] for c in verdict["ranked"]}
+    assert degraded == {0: False, 1: False, 2: True, 3: True}
+    assert verdict["scoring_degraded"] is True
+
+
+def test_knockout_reorders_shard_winners_at_their_level(monkeypatch):
+    monkeypatch.setattr(config, "MISTRAL_API_KEY", "key")
+    monkeypatch.setattr(config, "JUDGE_SHARD_SIZE", 2)
+    monkeypatch.setattr(config, "JUDGE_ANCHORS", 1)
+    monkeypatch.setattr(config, "JUDGE_KNOCKOUT", True)
+    cands, truth = _pool([0.5, 0.6, 0.7, 0.4, 0.65])
+    rematch = {cands[1]["text"]: 0.9, cands[2]["text"]: 0.5, cands[4]["text"]: 0.7}
+    calls = []
+
+    async def fake_acall(subset):
+        calls.append([c["assumption"] for c in subset])
+        return _scores(subset, rematch if len(calls) == 4 else truth)
+
+    monkeypatch.setattr(judge, "_acall_mistral", fake_acall)
+    verdict = asyncio.run(judge.ajudge_candidates(cands))
+    assert calls[-1] == [1, 2, 4]                            # one winner per shard
+    novelty = {c["assumption"]: c["novelty"] for c in verdict["ranked"]}
+    assert verdict["ranked"][0]["assumption"] == 1
+    assert novelty == {0: 0.5, 1: 0.85, 2: 0.45, 3: 0.4, 4: 0.65}
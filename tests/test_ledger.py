@@ -0,0 +1,67 @@
+import json
+import time
+
+import pytest
+
+from app import config, ledger
+
+
+def test_calls_are_booked_per_model_per_day_and_per_request():
+    book = ledger.Ledger(prices={"gemini-x": [1.0, 4.0]})
+    usage = ledger.new_usage()
+    book.record("gemini", "gemini-x", 1_000, 500, usage)
+    book.record("mistral", "mistral-y", 300, 100)           # no price: tokens only
+
+    day = book.snapshot()["days"][ledger._today()]
+    assert day["gemini:gemini-x"]["cost_usd"] == pytest.approx(0.003)
+    assert day["mistral:mistral-y"] == {"calls": 1, "input_tokens": 300, "output_tokens": 100,
+                                        "tokens": 400, "cost_usd": 0.0}
+    assert usage["tokens"] == 1_500 and list(usage["models"]) == ["gemini:gemini-x"]
+    assert book.spent() == (1_900, pytest.approx(0.003))
+
+
+def test_pressure_is_the_tightest_budget():
+    book = ledger.Ledger(budget_tokens=1_000, budget_cost=0.01, prices={"m": [10.0, 10.0]})
+    assert book.pressure() == 0
+    book.record("gemini", "m", 200, 0)                      # 20% of tokens, 20% of cost
+    book.record("gemini", "other", 300, 0)                  # 50% of tokens, no cost
+    assert book.pressure() == pytest.approx(0.5)
+    assert ledger.Ledger().pressure() == 0                  # no budgets, no pressure
+
+
+def test_rolling_window_forgets_old_calls(monkeypatch):
+    book = ledger.Ledger(budget_tokens=100, window=60)
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    book.record("gemini", "m", 80, 0)
+    now[0] += 30
+    book.record("gemini", "m", 10, 0)
+    assert book.pressure() == pytest.approx(0.9)
+    assert book.retry_after() == 31                         # when the 80 ages out
+    now[0] += 31
+    assert book.pressure() == pytest.approx(0.1)
+
+
+def test_daily_totals_survive_a_restart(tmp_path):
+    path = str(tmp_path / "ledger.json")
+    book = ledger.Ledger(path=path)
+    book.record("gemini", "m", 10, 5)
+    book.save()
+    assert json.load(open(path))[ledger._today()]["gemini:m"]["tokens"] == 15
+    assert ledger.Ledger(path=path).spent()[0] == 15
+
+
+def test_provider_usage_is_booked_through_config():
+    class Usage:
+        prompt_token_count = 120
+        total_token_count = 150
+        cached_content_token_count = None
+
+    class Response:
+        usage_metadata = Usage()
+
+    with config.usage_scope() as usage:
+        config._record_usage("gemini-x", Response())
+    assert (usage["input_tokens"], usage["output_tokens"]) == (120, 30)
+    assert config.ledger.spent()[0] == 150
+    assert config.request_usage.get() is None
@@ -0,0 +1,118 @@
+import asyncio
+from contextlib import nullcontext
+
+import pytest
+
+from app import limits
+
+
+def test_token_bucket_paces_after_burst(monkeypatch):
+    monkeypatch.setattr(limits.time, "monotonic", lambda: 100.0)
+    bucket = limits.TokenBucket(per_minute=60)          # 1/s, burst 60
+    assert all(bucket.reserve() == 0 for _ in range(60))
+    assert bucket.reserve() == pytest.approx(1.0)       # 61st waits one refill
+    assert bucket.reserve() == pytest.approx(2.0)       # FIFO: next waits longer
+
+
+def test_token_debt_delays_next_request(monkeypatch):
+    monkeypatch.setattr(limits.time, "monotonic", lambda: 100.0)
+    limiter = limits.ProviderLimiter(rpm=0, tpm=600)    # 10 tokens/s
+    assert limiter._delay() == 0
+    limiter.charge(700)                                 # usage arrives after the call
+    assert limiter._delay() == pytest.approx(10.0)
+
+
+def test_admission_queues_reports_position_and_rejects_when_full():
+    gate = limits.Admission(max_inflight=1, max_queue=1, max_wait=5)
+    positions = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with gate.slot():
+                await release.wait()
+
+        async def waiter():
+            async with gate.slot(on_position=positions.append):
+                return "ran"
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert gate.full()
+        with pytest.raises(limits.Overloaded) as exc:
+            async with gate.slot():
+                pass
+        assert exc.value.retry_after >= 1
+        release.set()
+        await first
+        return await second
+
+    assert asyncio.run(main()) == "ran"
+    assert positions == [1] and gate.inflight == 0
+
+
+def test_admission_wait_is_bounded():
+    gate = limits.Admission(max_inflight=1, max_queue=5, max_wait=0.01)
+
+    async def main():
+        async with gate.slot():
+            with pytest.raises(limits.Overloaded):
+                async with gate.slot():
+                    pass
+
+    asyncio.run(main())
+    assert gate.inflight == 0 and not gate._waiters
+
+
+def test_breaker_opens_on_error_rate_then_half_open_probe_closes_it(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    breaker = limits.CircuitBreaker("mistral:m", error_rate=0.5, window=4, min_calls=4,
+                                    cooldown=30)
+
+    def call(fail):
+        with breaker.guard():
+            if fail:
+                raise RuntimeError("down")
+
+    for fail in (False, True, True, True):
+        with pytest.raises(RuntimeError) if fail else nullcontext():
+            call(fail)
+    assert breaker.state == "open"
+    with pytest.raises(limits.CircuitOpen) as exc_info:
+        call(False)                                    # fails fast, never attempted
+    assert exc_info.value.retry_after == 30
+
+    now[0] += 30                                       # cooldown over → one probe
+    assert breaker.state == "half_open"
+    call(False)
+    assert breaker.state == "closed" and breaker.failure_rate() == 0
+
+
+def test_breaker_counts_slow_calls_and_reopens_on_failed_probe(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    breaker = limits.CircuitBreaker("gemini:g", slow_call=10, window=2, min_calls=2,
+                                    cooldown=5)
+    for _ in range(2):
+        with breaker.guard():
+            now[0] += 12                               # answered, but too slowly
+    assert breaker.state == "open"
+
+    now[0] += 5
+    with pytest.raises(RuntimeError):
+        with breaker.guard():                          # the probe fails…
+            raise RuntimeError("still down")
+    assert breaker.state == "open"                     # …so it's another cooldown
+
+
+def test_breaker_ignores_errors_that_are_not_outages():
+    breaker = limits.CircuitBreaker("mistral:m", window=2, min_calls=2)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            with breaker.guard(is_failure=lambda exc: False):
+                raise ValueError("bad request")
+    assert breaker.state == "closed"
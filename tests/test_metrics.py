@@ -0,0 +1,38 @@
+from app import metrics
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    hist = metrics.Histogram("t_seconds", "test", ("model",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 3.0):
+        hist.observe(value, model="m")
+    lines = hist.render()
+
+    assert 't_seconds_bucket{model="m",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{model="m",le="1"} 2' in lines
+    assert 't_seconds_bucket{model="m",le="+Inf"} 3' in lines
+    assert 't_seconds_count{model="m"} 3' in lines
+    assert hist.count(model="m") == 3
+
+
+def test_counter_keys_by_label_values_and_escapes_them():
+    counter = metrics.Counter("t_total", "test", ("code",))
+    counter.inc(code="429")
+    counter.inc(2, code="429")
+    counter.inc(code='a"b')
+
+    assert counter.value(code="429") == 3
+    assert 't_total{code="a\\"b"} 1' in counter.render()
+
+
+def test_pipeline_run_records_request_rounds_and_latency(monkeypatch):
+    from tests.test_pipeline import _stub
+    from app import pipeline
+
+    _stub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    pipeline.generate_idea("topic", 50)
+
+    labels = {"model": pipeline.config.GEMINI_COMPOSER_MODEL, "wildness": "50"}
+    assert metrics.REQUESTS.value(**labels) == 1
+    assert metrics.ROUNDS.value(**labels) == 2
+    assert metrics.REQUEST_SECONDS.count(**labels) == 1
+    assert "nbt_result_cache" in metrics.render()
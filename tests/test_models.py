@@ -1,3 +1,6 @@
+import asyncio
+import json
+
 from app import config
 
 
@@ -38,3 +41,61 @@ def test_pick_mistral_chat_prefers_most_capable_tier():
 def test_resolve_passes_through_explicit_model():
     assert config.resolve_gemini_model("gemini-flash-latest") == "gemini-flash-latest"
     assert config.resolve_mistral_model("mistral-large-latest") == "mistral-large-latest"
+
+
+def _discovery(monkeypatch, tmp_path, picks):
+    calls = []
+
+    def discover():
+        calls.append(1)
+        pick = picks.pop(0)
+        if isinstance(pick, Exception):
+            raise pick
+        return pick
+
+    monkeypatch.setattr(config, "_resolved", {})
+    monkeypatch.setattr(config, "MODEL_CACHE_PATH", str(tmp_path / "models.json"))
+    monkeypatch.setitem(config._DISCOVER, "mistral", discover)
+    return calls
+
+
+def test_resolved_model_is_shared_through_the_disk_cache(monkeypatch, tmp_path):
+    calls = _discovery(monkeypatch, tmp_path, ["mistral-large-latest"])
+    assert config.resolve_mistral_model("auto") == "mistral-large-latest"
+    monkeypatch.setattr(config, "_resolved", {})      # a sibling worker
+    assert config.resolve_mistral_model("auto") == "mistral-large-latest"
+    assert len(calls) == 1
+
+
+def test_stale_disk_entry_is_rediscovered(monkeypatch, tmp_path):
+    calls = _discovery(monkeypatch, tmp_path, ["mistral-medium-latest"])
+    (tmp_path / "models.json").write_text(
+        json.dumps({"mistral": {"model": "mistral-small-latest", "at": 0}}))
+    monkeypatch.setattr(config, "MODEL_REFRESH", 60)
+    assert config.resolve_mistral_model("auto") == "mistral-medium-latest"
+    assert len(calls) == 1
+
+
+def test_refresh_keeps_the_current_model_when_discovery_fails(monkeypatch, tmp_path):
+    _discovery(monkeypatch, tmp_path, [RuntimeError("down"), "mistral-large-latest"])
+    monkeypatch.setattr(config, "MISTRAL_MODEL", "auto")
+    monkeypatch.setattr(config, "MODEL_CACHE_PATH", "")
+    config._resolved["mistral"] = "mistral-small-latest"
+    config.refresh_models()
+    assert config._resolved["mistral"] == "mistral-small-latest"
+    config.refresh_models()
+    assert config._resolved["mistral"] == "mistral-large-latest"
+
+
+def test_prewarm_reports_failures_without_raising(monkeypatch):
+    async def broken():
+        raise RuntimeError("API key not valid")
+
+    async def fine():
+        return "mistral-small-latest"
+
+    monkeypatch.setattr(config, "_warm_gemini", broken)
+    monkeypatch.setattr(config, "_warm_mistral", fine)
+    status = asyncio.run(config.prewarm())
+    assert status["gemini"] == {"ok": False, "error": "API key not valid"}
+    assert status["mistral"]["ok"] and status["mistral"]["model"] == "mistral-small-latest"
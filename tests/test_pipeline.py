@@ -1,3 +1,7 @@
+import asyncio
+
+import pytest
+
 from app import config, pipeline
 
 
@@ -51,3 +55,450 @@ def test_degraded_scoring_short_circuits(monkeypatch):
 
     assert counters["generate"] == 1          # no point re-rolling when scores are unreliable
     assert result["scoring_degraded"] is True
+
+
+def test_short_round_is_topped_up_with_only_the_missing_count(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    asked = []
+
+    def salvaged(topic, wildness, n=None, round_idx=0):
+        asked.append(n)
+        return _candidates(2 if len(asked) == 1 else n)   # first response was truncated
+
+    monkeypatch.setattr(pipeline, "generate_candidates", salvaged)
+    pipeline.generate_idea("topic", 50)
+    assert asked == [config.N_CANDIDATES, config.N_CANDIDATES - 2]
+    assert counters["judge"] == 1
+
+
+def _astub(monkeypatch, *, novelty_by_round, degraded=False):
+    counters = _stub(monkeypatch, novelty_by_round=novelty_by_round, degraded=degraded)
+
+    async def agenerate(topic, wildness, n=None, round_idx=0):
+        return pipeline.generate_candidates(topic, wildness, n=n, round_idx=round_idx)
+
+    async def ajudge(cands):
+        return pipeline.judge_candidates(cands)
+
+    monkeypatch.setattr(pipeline, "agenerate_candidates", agenerate)
+    monkeypatch.setattr(pipeline, "ajudge_candidates", ajudge)
+    return counters
+
+
+def test_async_pipeline_matches_sync_rounds(monkeypatch):
+    counters = _astub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    statuses = []
+    result = asyncio.run(pipeline.agenerate_idea("topic", 50, statuses.append))
+
+    assert counters["generate"] == 2 and counters["judge"] == 2
+    assert result["novelty"] == 0.92
+    assert len(statuses) == 4                 # two rounds × (imagining, ranking)
+
+
+def test_speculative_round_is_discarded_when_first_passes(monkeypatch):
+    monkeypatch.setattr(config, "SPECULATIVE_ROUNDS", True)
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    result = pipeline.generate_idea("topic", 50)
+
+    assert counters["judge"] == 1             # the speculative round is never judged
+    assert result["novelty"] == 0.9
+
+
+def test_speculative_round_is_used_when_first_is_tame(monkeypatch):
+    monkeypatch.setattr(config, "SPECULATIVE_ROUNDS", True)
+    counters = _astub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    result = asyncio.run(pipeline.agenerate_idea("topic", 50))
+
+    assert counters["generate"] == 2          # round 2 came from the speculative call
+    assert counters["judge"] == 2
+    assert result["novelty"] == 0.92
+
+
+def test_async_speculative_round_is_cancelled_when_first_passes(monkeypatch):
+    monkeypatch.setattr(config, "SPECULATIVE_ROUNDS", True)
+    _astub(monkeypatch, novelty_by_round=[0.9])
+    started = []
+
+    async def agenerate(topic, wildness, n=None, round_idx=0):
+        started.append(round_idx)
+        if round_idx:
+            await asyncio.sleep(60)           # still in flight when round 1 passes
+        return _candidates(config.N_CANDIDATES)
+
+    async def ajudge(cands):
+        await asyncio.sleep(0)                # judging yields to the loop like real I/O
+        return pipeline.judge_candidates(cands)
+
+    monkeypatch.setattr(pipeline, "agenerate_candidates", agenerate)
+    monkeypatch.setattr(pipeline, "ajudge_candidates", ajudge)
+
+    async def run():
+        result = await pipeline.agenerate_idea("topic", 50)
+        await asyncio.sleep(0)                # let the cancellation settle
+        return result
+
+    result = asyncio.run(asyncio.wait_for(run(), 5))
+    assert started == [0, 1]
+    assert result["novelty"] == 0.9
+
+
+def test_streaming_mode_forwards_each_candidate(monkeypatch):
+    monkeypatch.setattr(config, "STREAM_CANDIDATES", True)
+    monkeypatch.setattr(config, "N_CANDIDATES", 3)
+    counters = _astub(monkeypatch, novelty_by_round=[0.9])
+
+    async def astream(topic, wildness, n=None, round_idx=0):
+        counters["generate"] += 1
+        for cand in _candidates(3):
+            yield cand
+
+    monkeypatch.setattr(pipeline, "astream_candidates", astream)
+    seen = []
+    result = asyncio.run(pipeline.agenerate_idea(
+        "topic", 50, candidate_callback=lambda r, c: seen.append((r, c["text"]))))
+
+    assert seen == [(0, "Candidate 0."), (0, "Candidate 1."), (0, "Candidate 2.")]
+    assert counters["generate"] == 1 and result["idea"] == "Candidate 0."
+
+
+def test_repeat_topic_rotates_through_cached_ideas(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    first = pipeline.generate_idea("Black holes", 50)
+    second = pipeline.generate_idea("black holes!", 52)
+    third = pipeline.generate_idea("black holes", 55)
+
+    assert counters["generate"] == 1          # repeats never touch the providers
+    assert first["cached"] is False and second["cached"] is True
+    assert len({first["idea"], second["idea"], third["idea"]}) == 3
+
+
+def test_fresh_bypasses_cache(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    pipeline.generate_idea("topic", 50)
+    pipeline.generate_idea("topic", 50, fresh=True)
+    assert counters["generate"] == 2
+
+
+def test_degraded_results_are_not_cached(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9], degraded=True)
+    pipeline.generate_idea("topic", 50)
+    pipeline.generate_idea("topic", 50)
+    assert counters["generate"] == 2
+
+
+def test_concurrent_identical_requests_share_one_run(monkeypatch):
+    runs = []
+
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        runs.append(topic)
+        status_callback("working...")
+        await asyncio.sleep(0.01)
+        return {"idea": "shared"}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+
+    async def client(topic, leave_early=False):
+        events = []
+        async for event in pipeline.astream_idea(topic, 50):
+            events.append(event)
+            if leave_early:
+                break                         # a client disconnecting mid-run
+        return events
+
+    async def main():
+        return await asyncio.gather(client("Black holes"), client("black  holes"),
+                                    client("black holes", leave_early=True))
+
+    a, b, quitter = asyncio.run(main())
+    assert runs == ["Black holes"]            # one pipeline run for all three
+    for events in (a, b):
+        assert [e["type"] for e in events] == ["status", "result"]
+        assert events[-1]["data"] == {"idea": "shared"}
+    assert len(quitter) == 1 and not pipeline._flights
+
+
+def test_fresh_requests_never_join_an_in_flight_run(monkeypatch):
+    runs = []
+
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        runs.append(fresh)
+        await asyncio.sleep(0.01)
+        return {"idea": "fresh" if fresh else "cached"}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+
+    async def client(**kwargs):
+        return [e async for e in pipeline.astream_idea("topic", 50, **kwargs)][-1]["data"]
+
+    async def main():
+        return await asyncio.gather(client(), client(fresh=True), client(another=True))
+
+    plain, fresh, another = asyncio.run(main())
+    assert sorted(runs) == [False, True, True]     # the shelf was empty: another runs fresh
+    assert plain["idea"] == "cached"
+    assert fresh["idea"] == another["idea"] == "fresh"
+    assert not pipeline._flights
+
+
+def _batch_stub(monkeypatch, novelty_by_topic):
+    calls = {"generate": [], "judge": 0}
+
+    async def agen_batch(topics, wildness, n=None):
+        calls["generate"].append(list(topics))
+        return [[{"text": f"{t} idea.", "assumption": t, "operator": "invert"}] for t in topics]
+
+    async def ajudge_batch(groups):
+        calls["judge"] += 1
+        return [{"ranked": [{**g[0], "coherence": 0.9, "novelty": novelty_by_topic[g[0]["assumption"]],
+                             "surprise": 0.5, "rationale": "", "composite": 0.5}],
+                 "scoring_degraded": False} for g in groups]
+
+    monkeypatch.setattr(pipeline, "agenerate_candidates_batch", agen_batch)
+    monkeypatch.setattr(pipeline, "ajudge_candidates_batch", ajudge_batch)
+    return calls
+
+
+def test_batch_packs_topics_and_rerolls_only_tame_ones(monkeypatch):
+    monkeypatch.setattr(config, "BATCH_TOPICS_PER_CALL", 3)
+    topics = ["t0", "t1", "t2", "t3"]
+    calls = _batch_stub(monkeypatch, {"t0": 0.9, "t1": 0.1, "t2": 0.9, "t3": 0.9})
+    results = pipeline.generate_ideas_batch(topics, 50)
+
+    assert [r["idea"] for r in results] == ["t0 idea.", "t1 idea.", "t2 idea.", "t3 idea."]
+    assert sorted(map(len, calls["generate"])) == [1, 1, 3]   # two packs, then t1 alone
+    assert ["t1"] in calls["generate"]
+    assert set(results[0]) >= {"idea", "novelty", "coherence", "scoring_degraded", "version"}
+
+
+def test_deadline_truncates_rounds_and_skips_the_cache(monkeypatch):
+    import time
+    counters = _stub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    judge = pipeline.judge_candidates
+
+    def slow_judge(cands):
+        time.sleep(0.05)
+        return judge(cands)
+
+    monkeypatch.setattr(pipeline, "judge_candidates", slow_judge)
+    result = pipeline.generate_idea("topic", 50, deadline=0.08)
+
+    assert counters["generate"] == 1          # a second round would not have fit
+    assert result["deadline_truncated"] is True
+    assert result["novelty"] == 0.30          # best so far
+    assert pipeline.generate_idea("topic", 50)["deadline_truncated"] is False
+    assert counters["generate"] == 2          # the truncated run was not cached
+
+
+def test_sync_round_cut_off_by_the_deadline_returns_the_best_so_far(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    generate = pipeline.generate_candidates
+
+    def late(topic, wildness, n=None, round_idx=0):
+        if round_idx:
+            raise config.DeadlineExceeded("Gemini call outlived the request deadline")
+        return generate(topic, wildness, n=n, round_idx=round_idx)
+
+    monkeypatch.setattr(pipeline, "generate_candidates", late)
+    result = pipeline.generate_idea("topic", 50, deadline=10)
+    assert result["deadline_truncated"] is True and result["novelty"] == 0.30
+    assert counters["judge"] == 1
+
+
+def test_judge_deadline_truncates_instead_of_degrading(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    judge = pipeline.judge_candidates
+
+    def late(cands):
+        if counters["judge"]:
+            raise config.DeadlineExceeded("Request deadline exceeded")
+        return judge(cands)
+
+    monkeypatch.setattr(pipeline, "judge_candidates", late)
+    result = pipeline.generate_idea("topic", 50, deadline=10)
+    assert result["deadline_truncated"] is True and result["scoring_degraded"] is False
+    assert result["novelty"] == 0.30
+
+
+def test_batch_runs_under_the_default_deadline(monkeypatch):
+    monkeypatch.setattr(config, "DEADLINE", 10)
+    seen = []
+    calls = _batch_stub(monkeypatch, {"t0": 0.9, "t1": 0.1})
+    judge = pipeline.ajudge_candidates_batch
+
+    async def late(groups):
+        seen.append(config.remaining())
+        if len(seen) > 1:
+            raise config.DeadlineExceeded("Request deadline exceeded")
+        return await judge(groups)
+
+    monkeypatch.setattr(pipeline, "ajudge_candidates_batch", late)
+    results = pipeline.generate_ideas_batch(["t0", "t1"], 50)
+
+    assert seen[0] is not None and 0 < seen[0] <= 10
+    assert results[0]["deadline_truncated"] is False          # passed the bar in round one
+    assert results[1]["deadline_truncated"] is True           # cut off while re-rolling
+    assert results[1]["novelty"] == 0.1
+    assert len(calls["generate"]) == 2
+    results = pipeline.generate_ideas_batch(["t0", "t1"], 50)
+    assert calls["generate"][2:] == [["t1"]]                  # only t0 was cached
+
+
+def test_last_listener_leaving_cancels_the_run(monkeypatch):
+    from app import metrics
+    state = {"finished": False}
+
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        config.count_tokens(40)
+        status_callback("working...")
+        await asyncio.sleep(5)
+        state["finished"] = True
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+    monkeypatch.setattr(pipeline, "_run_tokens", pipeline.deque([100]))
+
+    async def main():
+        metrics.wildness_label.set("-")      # earlier sync tests may have set it here
+        events = pipeline.astream_idea("Black holes", 50)
+        assert (await anext(events))["type"] == "status"
+        flight = pipeline._flights[("black holes", 50)]
+        await events.aclose()                 # the only client disconnects
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(main())
+    assert flight.task.cancelled() and not state["finished"]
+    assert pipeline._flights == {}
+    assert metrics.CANCELLED_RUNS.value(model=config.GEMINI_COMPOSER_MODEL, wildness="-") == 1
+    assert metrics.TOKENS_SAVED.value(model=config.GEMINI_COMPOSER_MODEL, wildness="-") == 60
+
+
+def test_quiet_runs_emit_heartbeats(monkeypatch):
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        await asyncio.sleep(0.05)
+        return {"idea": "late"}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+
+    async def main():
+        return [e["type"] async for e in pipeline.astream_idea("topic", 50, heartbeat=0.01)]
+
+    types = asyncio.run(main())
+    assert types[-1] == "result" and types.count("heartbeat") >= 2
+
+
+def test_polling_ticks_between_heartbeats(monkeypatch):
+    async def slow(topic, wildness=50, status_callback=None, candidate_callback=None, fresh=False,
+                   deadline=None):
+        await asyncio.sleep(0.1)
+        return {"idea": "late"}
+
+    monkeypatch.setattr(pipeline, "agenerate_idea", slow)
+
+    async def main():
+        return [e["type"] async for e in pipeline.astream_idea("topic", 50, heartbeat=5,
+                                                               poll=0.01)]
+
+    types = asyncio.run(main())
+    assert types[-1] == "result" and types.count("tick") >= 3
+    assert "heartbeat" not in types
+
+
+async def _another(topic, wildness=50):
+    return [e async for e in pipeline.astream_idea(topic, wildness, another=True)]
+
+
+def test_another_one_serves_unserved_runner_ups_without_provider_calls(monkeypatch):
+    monkeypatch.setattr(config, "INVENTORY_LOW", 0)
+    counters = _astub(monkeypatch, novelty_by_round=[0.9])
+
+    async def main():
+        first = await pipeline.agenerate_idea("topic", 50)
+        return first, await _another("Topic!", 52), await _another("topic")
+
+    first, second, third = asyncio.run(main())
+    assert counters["generate"] == 1
+    assert [e["type"] for e in second] == ["result"]
+    ideas = [first["idea"], second[0]["data"]["idea"], third[0]["data"]["idea"]]
+    assert ideas == ["Candidate 0.", "Candidate 1.", "Candidate 2."]
+    assert second[0]["data"]["cached"] is True
+
+
+def test_another_one_restocks_a_low_shelf_in_the_background(monkeypatch):
+    monkeypatch.setattr(config, "N_CANDIDATES", 2)
+    counters = _astub(monkeypatch, novelty_by_round=[0.9])
+
+    def generate(topic, wildness, n=None, round_idx=0):
+        counters["generate"] += 1
+        return [{**c, "text": f"Run {counters['generate']} {c['text']}"} for c in _candidates(n)]
+
+    monkeypatch.setattr(pipeline, "generate_candidates", generate)
+
+    async def main():
+        await pipeline.agenerate_idea("topic", 50)
+        served = await _another("topic")                 # takes the only runner-up
+        await asyncio.gather(*pipeline._refills.values())
+        return served
+
+    served = asyncio.run(main())
+    assert served[0]["data"]["idea"] == "Run 1 Candidate 1."
+    assert counters["generate"] == 2                      # the refill run
+    shelf = pipeline.cache.inventory.peek(pipeline.cache.topic_key("topic", 50))
+    assert [c["text"] for c in shelf] == ["Run 2 Candidate 0.", "Run 2 Candidate 1."]
+
+
+def test_another_one_with_an_empty_shelf_runs_fresh(monkeypatch):
+    counters = _astub(monkeypatch, novelty_by_round=[0.9])
+    events = asyncio.run(_another("untouched topic"))
+    assert events[-1]["type"] == "result" and events[-1]["data"]["cached"] is False
+    assert counters["generate"] == 1
+
+
+def _spend(monkeypatch, fraction):
+    monkeypatch.setattr(config.ledger, "budget_tokens", 1_000)
+    config.ledger.record("gemini", "m", int(fraction * 1_000), 0)
+
+
+def test_results_carry_the_requests_usage(monkeypatch):
+    _stub(monkeypatch, novelty_by_round=[0.9])
+    generate = pipeline.generate_candidates
+
+    def metered(topic, wildness, n=None, round_idx=0):
+        config.count_usage("gemini", "g", 100, 20)
+        return generate(topic, wildness, n=n, round_idx=round_idx)
+
+    monkeypatch.setattr(pipeline, "generate_candidates", metered)
+    result = pipeline.generate_idea("topic", 50)
+    assert result["usage"]["tokens"] == 120
+    assert result["usage"]["models"]["gemini:g"]["calls"] == 1
+    assert pipeline.generate_idea("topic", 50)["usage"]["tokens"] == 0    # cache hit
+
+
+def test_budget_pressure_steps_down_to_fewer_candidates_then_one_round(monkeypatch):
+    monkeypatch.setattr(config, "ADAPTIVE", False)
+    monkeypatch.setattr(config, "N_CANDIDATES", 6)
+    monkeypatch.setattr(config, "MAX_ROUNDS", 3)
+    assert pipeline._plan(50)[:2] == (6, 3)
+    _spend(monkeypatch, 0.85)
+    assert pipeline._plan(50) == (3, 3, False)
+    _spend(monkeypatch, 0.05)
+    assert pipeline._plan(50) == (3, 1, False)
+
+    counters = _stub(monkeypatch, novelty_by_round=[0.30, 0.92])
+    pipeline.generate_idea("topic", 50)
+    assert counters["generate"] == 1          # a tame round is not re-rolled
+
+
+def test_spent_budget_serves_cached_ideas_only(monkeypatch):
+    counters = _stub(monkeypatch, novelty_by_round=[0.9])
+    pipeline.generate_idea("topic", 50)
+    _spend(monkeypatch, 1.0)
+
+    assert pipeline.generate_idea("topic", 50, fresh=True)["cached"] is True
+    with pytest.raises(pipeline.BudgetExhausted) as err:
+        asyncio.run(pipeline.agenerate_idea("another topic", 50))
+    assert err.value.retry_after >= 1
+    assert counters["generate"] == 1
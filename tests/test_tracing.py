@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app import config, pipeline, tracing
+from tests.test_pipeline import _astub, _stub
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setitem(tracing._settings, "enabled", True)
+    monkeypatch.setattr(config, "DEBUG_TIMINGS", True)
+
+
+def test_span_is_a_no_op_without_a_trace():
+    with tracing.span("anything", model="m") as span:
+        span.set(response_chars=3)
+    assert tracing.current.get() is None
+
+
+def test_trace_records_nested_spans_and_dumps_chrome_json(traced, tmp_path):
+    with tracing.trace("request", topic="t") as trace:
+        with tracing.span("generate", n=5) as span:
+            time.sleep(0.002)
+            span.set(candidates=5)
+        with tracing.trace("pipeline"):           # nested trace → just a span
+            pass
+
+    assert tracing.current.get() is None
+    events = trace.to_chrome()["traceEvents"]
+    assert [e["name"] for e in events] == ["request", "generate", "pipeline"]
+    assert events[1]["ph"] == "X" and events[1]["dur"] >= 2000
+    assert events[1]["args"] == {"n": 5, "candidates": 5}
+
+    breakdown = trace.breakdown()
+    assert breakdown["stages"]["generate"]["count"] == 1
+    assert breakdown["total_ms"] >= breakdown["stages"]["generate"]["ms"]
+
+    path = trace.save(str(tmp_path))
+    assert json.load(open(path))["traceEvents"][0]["name"] == "request"
+
+
+def test_span_records_the_exception_type(traced):
+    with tracing.trace("request") as trace:
+        with pytest.raises(ValueError):
+            with tracing.span("judge"):
+                raise ValueError("boom")
+    assert trace.spans[1].attrs["error"] == "ValueError"
+
+
+def test_debug_timings_attach_breakdown_to_result(traced, monkeypatch):
+    _stub(monkeypatch, novelty_by_round=[0.9])
+    result = pipeline.generate_idea("topic", 50)
+
+    assert result["timings"]["total_ms"] >= 0
+    cached = pipeline.cache.ideas.get(pipeline.cache.topic_key("topic", 50))
+    assert "timings" not in cached["ideas"][0]          # never cached with the result
+
+
+def test_async_result_has_timings_only_when_enabled(monkeypatch):
+    _astub(monkeypatch, novelty_by_round=[0.9])
+
+    assert "timings" not in asyncio.run(pipeline.agenerate_idea("topic", 50, fresh=True))
+    monkeypatch.setitem(tracing._settings, "enabled", True)
+    monkeypatch.setattr(config, "DEBUG_TIMINGS", True)
+    result = asyncio.run(pipeline.agenerate_idea("topic", 50, fresh=True))
+    assert "rounds" in result["timings"]["stages"]
+
+
+def test_sampler_counts_folded_stacks_of_the_target_thread():
+    sampler = tracing.Sampler(threading.get_ident(), interval=0.001)
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    counts = sampler.stop()
+
+    assert counts
+    assert any("test_sampler_counts_folded_stacks" in stack for stack in counts)